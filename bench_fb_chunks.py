@@ -0,0 +1,63 @@
+import argparse
+import configparser
+import os
+import time
+from typing import List
+
+from firebird_client import FirebirdClient
+
+
+def sample_codes(fb: FirebirdClient, n: int) -> List[str]:
+    sig = fb._discover_product_table()
+    if not sig:
+        raise SystemExit("Não foi possível descobrir a tabela de produtos.")
+    table, mapping = sig
+    with fb._connect() as con:
+        cur = con.cursor()
+        cur.execute(f"SELECT FIRST {int(n)} {mapping['codigo']} FROM {table}")
+        return [r[0] for r in cur.fetchall()]
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description="Mede fetch_full_by_codes variando o tamanho do bloco do IN."
+    )
+    p.add_argument(
+        "--codes", type=int, default=1000, help="Qtde de códigos (padrão: 1000)"
+    )
+    p.add_argument(
+        "--chunks",
+        default="50,100,200,500,1000,1500",
+        help="Tamanhos de bloco separados por vírgula",
+    )
+    p.add_argument("--workers", default="1,4", help="Paralelismo a testar (ex.: 1,4)")
+    p.add_argument("--repeat", type=int, default=3, help="Repetições por cenário")
+    args = p.parse_args()
+
+    base = os.path.dirname(os.path.abspath(__file__))
+    cfg = configparser.ConfigParser()
+    cfg.read(os.path.join(base, "config.ini"), encoding="utf-8")
+    fb = FirebirdClient(cfg)
+    codes = sample_codes(fb, args.codes)
+    print(f"{len(codes)} códigos de amostra")
+    print(f"{'bloco':>6} {'workers':>7} {'ms':>9} {'linhas/s':>10}")
+
+    fb.fetch_full_by_codes(codes[:10])  # aquece pool e descoberta
+    for workers in [int(w) for w in args.workers.split(",")]:
+        for size in [int(c) for c in args.chunks.split(",")]:
+            fb._in_chunk_size = min(1500, max(1, size))
+            fb._in_workers = workers
+            best = None
+            rows = 0
+            for _ in range(max(1, args.repeat)):
+                t0 = time.perf_counter()
+                rows = len(fb.fetch_full_by_codes(codes))
+                dt = time.perf_counter() - t0
+                best = dt if best is None else min(best, dt)
+            rate = rows / best if best else 0.0
+            print(f"{size:>6} {workers:>7} {best * 1000:>9.1f} {rate:>10.0f}")
+    fb.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from bench_sqlite_repo import populate
+from hot_catalog import HotCatalog
+from sqlite_repo import SqliteRepo
+
+QUERIES = ["filtro", "fil oleo", "bateria 42", "P00012", "7890000012", "corr"]
+
+
+def timed(fn, queries: int) -> float:
+    rnd = random.Random(3)
+    t0 = time.perf_counter()
+    for _ in range(queries):
+        fn(rnd.choice(QUERIES))
+    return (time.perf_counter() - t0) * 1e6 / queries
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description="Consumo de memória e latência do catálogo em memória "
+        "comparado à busca no SQLite."
+    )
+    p.add_argument("--products", type=int, default=200000, help="Itens no cache")
+    p.add_argument("--queries", type=int, default=2000, help="Consultas por cenário")
+    p.add_argument("--limit", type=int, default=50, help="Limite por consulta")
+    p.add_argument("--db", help="Banco existente (padrão: temporário gerado)")
+    args = p.parse_args()
+
+    path = args.db
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        print(f"Gerando {args.products} produtos em {path} ...")
+        populate(path, args.products)
+
+    with SqliteRepo(path) as repo:
+        t0 = time.perf_counter()
+        catalog = HotCatalog().load(repo)
+        print(f"Carga: {len(catalog)} itens em {time.perf_counter() - t0:.2f}s")
+        print(f"{'estrutura':<12} {'MB':>8}")
+        for k, v in catalog.memory_report().items():
+            if k != "items":
+                print(f"{k:<12} {v / 1024 / 1024:>8.1f}")
+        print(f"{'cenário':<12} {'µs/consulta':>12}")
+        print(
+            f"{'SQLite':<12} "
+            f"{timed(lambda q: repo.search_products_cache(q, args.limit), args.queries):>12.0f}"
+        )
+        print(
+            f"{'memória':<12} "
+            f"{timed(lambda q: catalog.search(q, args.limit), args.queries):>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
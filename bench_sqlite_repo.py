@@ -0,0 +1,82 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from sqlite_repo import SqliteRepo
+
+
+class PerCallRepo(SqliteRepo):
+    """Comportamento antigo: uma conexão nova, sem PRAGMAs, a cada chamada."""
+
+    def _conn(self):
+        con = sqlite3.connect(self.db_path)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def _reader(self):
+        return self._conn()
+
+
+def populate(path: str, n: int) -> None:
+    words = ["FILTRO", "OLEO", "AR", "BATERIA", "PASTILHA", "FREIO", "CORREIA"]
+    with SqliteRepo(path) as repo:
+        repo.init_schema()
+        rnd = random.Random(1)
+        items = [
+            {
+                "codigo": f"P{i:07d}",
+                "descricao": " ".join(rnd.sample(words, 3)) + f" {i % 97}",
+                "barras": f"789{i:010d}",
+            }
+            for i in range(n)
+        ]
+        for start in range(0, n, 10000):
+            repo.upsert_products(items[start : start + 10000])
+        for i in range(0, min(n, 2000)):
+            vid = repo.upsert_vehicle("VW", f"Modelo {i % 50}", 2000, 2010, "1.6")
+            repo.add_application(f"P{i:07d}", vid)
+
+
+def run(repo: SqliteRepo, queries: int) -> float:
+    rnd = random.Random(2)
+    t0 = time.perf_counter()
+    for i in range(queries):
+        if i % 3 == 0:
+            repo.search_products_cache("filtro oleo", limit=50)
+        elif i % 3 == 1:
+            repo.get_products_by_codes([f"P{rnd.randrange(1000):07d}"])
+        else:
+            repo.search_applications(f"Modelo {rnd.randrange(50)}")
+    return (time.perf_counter() - t0) * 1000 / queries
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description="Compara o custo por consulta do SqliteRepo: conexão por "
+        "chamada x conexão persistente com PRAGMAs."
+    )
+    p.add_argument("--products", type=int, default=50000, help="Itens no cache")
+    p.add_argument("--queries", type=int, default=3000, help="Consultas por cenário")
+    p.add_argument("--db", help="Banco existente (padrão: temporário gerado)")
+    args = p.parse_args()
+
+    tmp = None
+    path = args.db
+    if not path:
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, "bench.db")
+        print(f"Gerando {args.products} produtos em {path} ...")
+        populate(path, args.products)
+
+    print(f"{'cenário':<28} {'ms/consulta':>12}")
+    old = PerCallRepo(path)
+    print(f"{'conexão por chamada':<28} {run(old, args.queries):>12.3f}")
+    with SqliteRepo(path) as repo:
+        print(f"{'conexão persistente':<28} {run(repo, args.queries):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
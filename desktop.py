@@ -1,9 +1,12 @@
 import configparser
 import os
+import queue
 from tkinter import StringVar, Tk, ttk
 
 from firebird_client import FirebirdClient
-from search_service import SearchService
+from hot_catalog import load_hot_catalog
+from result_cache import build_miss_cache, build_result_cache
+from search_service import DEFAULT_LIMIT, SearchService, cache_ttls
 from sqlite_repo import SqliteRepo
 from sync import SyncService
 
@@ -39,11 +42,33 @@ if not os.path.exists(CONFIG_PATH):
     raise RuntimeError("config.ini não encontrado.")
 config.read(CONFIG_PATH, encoding="utf-8")
 
-repo = SqliteRepo(DB_PATH)
+repo = SqliteRepo(
+    DB_PATH,
+    mmap_size=config.getint("app", "sqlite_mmap_mb", fallback=256) * 1024 * 1024,
+    cache_size_kb=config.getint("app", "sqlite_cache_mb", fallback=64) * 1024,
+)
 repo.init_schema()
 fb = FirebirdClient(config)
-sync_service = SyncService(config, fb, repo)
-search_service = SearchService(repo, fb)
+# catálogo em memória para a busca por produto (opcional, ver config.ini)
+catalog = (
+    load_hot_catalog(repo)
+    if config.getboolean("app", "hot_catalog", fallback=False)
+    else None
+)
+search_limit = config.getint("app", "search_limit", fallback=DEFAULT_LIMIT)
+search_service = SearchService(
+    repo,
+    fb,
+    ttls=cache_ttls(config),
+    catalog=catalog,
+    results=build_result_cache(config),
+    misses=build_miss_cache(config),
+)
+# digitação que só estende a busca anterior filtra o resultado em memória
+type_ahead = search_service.type_ahead()
+sync_service = SyncService(
+    config, fb, repo, catalog=catalog, on_sync=search_service.invalidate_cache
+)
 
 root = Tk()
 root.title("Buscador Duplo")
@@ -131,33 +156,75 @@ tree.configure(yscrollcommand=vsb.set)
 vsb.grid(row=row, column=1, sticky="ns")
 
 
+def row_values(r):
+    return (
+        r.get("codigo", ""),
+        r.get("descricao", ""),
+        r.get("preco", ""),
+        r.get("estoque", ""),
+        r.get("fornecedor", ""),
+        r.get("marca", ""),
+        r.get("grupo", ""),
+        r.get("subgrupo", ""),
+    )
+
+
 def populate(items):
     tree.delete(*tree.get_children())
     if not items:
         return
     for r in items:
-        tree.insert(
-            "",
-            "end",
-            values=(
-                r.get("codigo", ""),
-                r.get("descricao", ""),
-                r.get("preco", ""),
-                r.get("estoque", ""),
-                r.get("fornecedor", ""),
-                r.get("marca", ""),
-                r.get("grupo", ""),
-                r.get("subgrupo", ""),
-            ),
-        )
+        # iid = código, para o enriquecimento atualizar a linha no lugar
+        tree.insert("", "end", iid=r.get("codigo") or None, values=row_values(r))
+
+
+def fill(items):
+    """Preenche preço/estoque/cadastro nas linhas já exibidas."""
+    for r in items:
+        code = r.get("codigo", "")
+        if code and tree.exists(code):
+            tree.item(code, values=row_values(r))
+
+
+# enriquecimento chega de outra thread: fila lida pelo loop do Tk; cada busca
+# tem uma geração e respostas de buscas antigas são descartadas
+enrich_queue: "queue.Queue" = queue.Queue()
+search_generation = 0
+# enriquecimento da busca anterior: cancelado se ainda não começou
+pending_enrichment = None
 
 
 def do_search(*_):
-    res = search_service.search(produto_var.get(), veiculo_var.get(), detalhe_var.get())
+    global search_generation, pending_enrichment
+    search_generation += 1
+    generation = search_generation
+    if pending_enrichment is not None:
+        pending_enrichment.cancel()
+        pending_enrichment = None
+    res = type_ahead.search(
+        produto_var.get(),
+        veiculo_var.get(),
+        detalhe_var.get(),
+        limit=search_limit,
+        on_enriched=lambda items: enrich_queue.put((generation, items)),
+    )
     items = res.get("items", []) if isinstance(res, dict) else (res or [])
+    if isinstance(res, dict):
+        pending_enrichment = res.get("pending")
     populate(items)
 
 
+def poll_enrichment():
+    try:
+        while True:
+            generation, items = enrich_queue.get_nowait()
+            if generation == search_generation:
+                fill(items)
+    except queue.Empty:
+        pass
+    root.after(50, poll_enrichment)
+
+
 search_btn.configure(command=do_search)
 produto_entry.bind("<KeyRelease>", do_search)
 veiculo_entry.bind("<KeyRelease>", do_search)
@@ -174,5 +241,9 @@ try:
     do_search()
 except Exception as e:
     print(f"[WARN] Primeira busca falhou: {e}")
+poll_enrichment()
 
 root.mainloop()
+search_service.close()
+fb.close()
+repo.close()
@@ -79,8 +79,7 @@ def main():
     fb = FirebirdClient(cfg)
 
     out_path = os.path.join(base, "db_overview.md")
-    con = fb._connect()
-    try:
+    with fb._connect() as con:
         with open(out_path, "w", encoding="utf-8") as f:
             cur = con.cursor()
             cur.execute(
@@ -168,11 +167,6 @@ def main():
                 except Exception as e:
                     f.write(f"\nFalha ao ler amostra: {e}\n")
                 f.write("\n\n")
-    finally:
-        try:
-            con.close()
-        except Exception:
-            pass
 
     print(f"Arquivo gerado: {out_path}")
 
@@ -0,0 +1,358 @@
+# fb_catalog.py
+"""
+Catálogo de metadados do Firebird carregado em poucas consultas em lote
+(tabelas, colunas, índices e chaves estrangeiras) e persistido em disco,
+associado a uma impressão digital barata do schema.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+# RDB$FIELDS.RDB$FIELD_TYPE -> nome SQL
+TYPE_NAMES = {
+    7: "SMALLINT",
+    8: "INTEGER",
+    10: "FLOAT",
+    12: "DATE",
+    13: "TIME",
+    14: "CHAR",
+    16: "BIGINT",
+    27: "DOUBLE",
+    35: "TIMESTAMP",
+    37: "VARCHAR",
+    40: "CSTRING",
+    261: "BLOB",
+}
+TEXT_TYPES = (14, 37, 40)
+NUMERIC_TYPES = (7, 8, 10, 16, 27)
+
+# formato do arquivo; mude ao alterar a estrutura serializada
+_FILE_VERSION = 1
+
+_SQL_FINGERPRINT = """
+    SELECT (SELECT COUNT(*) FROM RDB$RELATIONS),
+           (SELECT SUM(RDB$FORMAT) FROM RDB$RELATIONS),
+           (SELECT COUNT(*) FROM RDB$RELATION_FIELDS),
+           (SELECT COUNT(*) FROM RDB$INDICES),
+           (SELECT COUNT(*) FROM RDB$INDICES WHERE RDB$INDEX_INACTIVE = 1)
+    FROM RDB$DATABASE
+"""
+
+_SQL_RELATIONS = """
+    SELECT TRIM(RDB$RELATION_NAME),
+           IIF(RDB$VIEW_BLR IS NULL, 0, 1),
+           COALESCE(RDB$SYSTEM_FLAG, 0)
+    FROM RDB$RELATIONS
+"""
+
+_SQL_FIELDS = """
+    SELECT TRIM(rf.RDB$RELATION_NAME),
+           TRIM(rf.RDB$FIELD_NAME),
+           COALESCE(f.RDB$FIELD_TYPE, 0),
+           COALESCE(f.RDB$FIELD_SUB_TYPE, 0),
+           COALESCE(f.RDB$CHARACTER_LENGTH, f.RDB$FIELD_LENGTH, 0),
+           COALESCE(f.RDB$FIELD_PRECISION, 0),
+           COALESCE(f.RDB$FIELD_SCALE, 0),
+           COALESCE(rf.RDB$NULL_FLAG, f.RDB$NULL_FLAG, 0)
+    FROM RDB$RELATION_FIELDS rf
+    JOIN RDB$FIELDS f ON f.RDB$FIELD_NAME = rf.RDB$FIELD_SOURCE
+    ORDER BY rf.RDB$RELATION_NAME, rf.RDB$FIELD_POSITION
+"""
+
+_SQL_INDICES = """
+    SELECT TRIM(i.RDB$RELATION_NAME),
+           TRIM(i.RDB$INDEX_NAME),
+           COALESCE(i.RDB$UNIQUE_FLAG, 0),
+           COALESCE(i.RDB$INDEX_INACTIVE, 0),
+           TRIM(rc.RDB$CONSTRAINT_TYPE),
+           TRIM(s.RDB$FIELD_NAME)
+    FROM RDB$INDICES i
+    JOIN RDB$INDEX_SEGMENTS s ON s.RDB$INDEX_NAME = i.RDB$INDEX_NAME
+    LEFT JOIN RDB$RELATION_CONSTRAINTS rc ON rc.RDB$INDEX_NAME = i.RDB$INDEX_NAME
+    ORDER BY i.RDB$RELATION_NAME, i.RDB$INDEX_NAME, s.RDB$FIELD_POSITION
+"""
+
+_SQL_FOREIGN_KEYS = """
+    SELECT TRIM(rc.RDB$RELATION_NAME),
+           TRIM(rc.RDB$CONSTRAINT_NAME),
+           TRIM(s.RDB$FIELD_NAME),
+           TRIM(ri.RDB$RELATION_NAME),
+           TRIM(rs.RDB$FIELD_NAME)
+    FROM RDB$RELATION_CONSTRAINTS rc
+    JOIN RDB$INDICES i ON i.RDB$INDEX_NAME = rc.RDB$INDEX_NAME
+    JOIN RDB$INDEX_SEGMENTS s ON s.RDB$INDEX_NAME = i.RDB$INDEX_NAME
+    JOIN RDB$INDICES ri ON ri.RDB$INDEX_NAME = i.RDB$FOREIGN_KEY
+    JOIN RDB$INDEX_SEGMENTS rs ON rs.RDB$INDEX_NAME = ri.RDB$INDEX_NAME
+         AND rs.RDB$FIELD_POSITION = s.RDB$FIELD_POSITION
+    WHERE rc.RDB$CONSTRAINT_TYPE = 'FOREIGN KEY'
+    ORDER BY rc.RDB$RELATION_NAME, rc.RDB$CONSTRAINT_NAME, s.RDB$FIELD_POSITION
+"""
+
+
+def _log(*args):
+    print("[FB-CATALOG]", *args)
+
+
+def type_to_str(
+    ftype: int, subtype: int, length: int, precision: int, scale: int
+) -> str:
+    name = TYPE_NAMES.get(ftype, str(ftype))
+    if ftype in TEXT_TYPES:
+        return f"{name}({length})"
+    if ftype in (7, 8, 16) and subtype in (1, 2):
+        kind = "NUMERIC" if subtype == 1 else "DECIMAL"
+        return f"{kind}({precision},{abs(scale)})"
+    if ftype == 261:
+        return f"BLOB(sub={subtype})"
+    return name
+
+
+@dataclass
+class ColumnInfo:
+    name: str
+    type_code: int
+    subtype: int = 0
+    length: int = 0
+    precision: int = 0
+    scale: int = 0
+    not_null: bool = False
+
+    @property
+    def type_name(self) -> str:
+        return type_to_str(
+            self.type_code, self.subtype, self.length, self.precision, self.scale
+        )
+
+    @property
+    def is_text(self) -> bool:
+        return self.type_code in TEXT_TYPES
+
+    @property
+    def is_numeric(self) -> bool:
+        return self.type_code in NUMERIC_TYPES
+
+
+@dataclass
+class IndexInfo:
+    name: str
+    columns: List[str] = field(default_factory=list)
+    unique: bool = False
+    active: bool = True
+    constraint: Optional[str] = None  # PRIMARY KEY | UNIQUE | FOREIGN KEY
+
+
+@dataclass
+class ForeignKeyInfo:
+    name: str
+    columns: List[str] = field(default_factory=list)
+    ref_table: str = ""
+    ref_columns: List[str] = field(default_factory=list)
+
+
+@dataclass
+class TableInfo:
+    name: str
+    is_view: bool = False
+    is_system: bool = False
+    columns: List[ColumnInfo] = field(default_factory=list)
+    indices: List[IndexInfo] = field(default_factory=list)
+    foreign_keys: List[ForeignKeyInfo] = field(default_factory=list)
+
+
+def schema_fingerprint(con) -> str:
+    """Impressão digital barata do schema (uma única consulta)."""
+    cur = con.cursor()
+    cur.execute(_SQL_FINGERPRINT)
+    row = cur.fetchone() or ()
+    return "-".join(str(int(v or 0)) for v in row)
+
+
+class MetadataCatalog:
+    """Metadados de todas as relações do banco, indexados por nome (maiúsculo)."""
+
+    def __init__(
+        self,
+        tables: Dict[str, TableInfo],
+        *,
+        database: str = "",
+        fingerprint: str = "",
+        annotations: Optional[Dict[str, Any]] = None,
+    ):
+        self.tables = tables
+        self.database = database
+        self.fingerprint = fingerprint
+        # resultados derivados do schema (ex.: tabela de produto descoberta);
+        # persistidos junto e descartados quando a impressão digital muda
+        self.annotations: Dict[str, Any] = annotations or {}
+
+    # ---------- consultas ----------
+    def table(self, name: str) -> Optional[TableInfo]:
+        return self.tables.get(name.upper())
+
+    def user_tables(self) -> List[str]:
+        """Tabelas de usuário (sem views e sem tabelas de sistema)."""
+        return [
+            t.name for t in self.tables.values() if not t.is_view and not t.is_system
+        ]
+
+    def columns(self, table: str) -> List[str]:
+        t = self.table(table)
+        return [c.name for c in t.columns] if t else []
+
+    def column(self, table: str, column: str) -> Optional[ColumnInfo]:
+        t = self.table(table)
+        if not t:
+            return None
+        up = column.upper()
+        for c in t.columns:
+            if c.name.upper() == up:
+                return c
+        return None
+
+    def text_columns(self, table: str) -> List[str]:
+        t = self.table(table)
+        return [c.name for c in t.columns if c.is_text] if t else []
+
+    def leading_index(self, table: str, column: str) -> Optional[IndexInfo]:
+        """Índice ativo cujo primeiro segmento é `column` (None se não houver)."""
+        t = self.table(table)
+        if not t:
+            return None
+        up = column.upper()
+        for ix in t.indices:
+            if ix.active and ix.columns and ix.columns[0].upper() == up:
+                return ix
+        return None
+
+    def primary_key(self, table: str) -> List[str]:
+        """Colunas da chave primária (lista vazia se não houver)."""
+        t = self.table(table)
+        for ix in t.indices if t else []:
+            if ix.constraint == "PRIMARY KEY":
+                return list(ix.columns)
+        return []
+
+    # ---------- carga em lote ----------
+    @classmethod
+    def fetch(
+        cls, con, *, database: str = "", fingerprint: str = ""
+    ) -> "MetadataCatalog":
+        """Carrega o catálogo inteiro em quatro consultas."""
+        cur = con.cursor()
+        tables: Dict[str, TableInfo] = {}
+
+        cur.execute(_SQL_RELATIONS)
+        for name, is_view, sys_flag in cur.fetchall():
+            tables[name.upper()] = TableInfo(
+                name=name, is_view=bool(is_view), is_system=int(sys_flag or 0) != 0
+            )
+
+        cur.execute(_SQL_FIELDS)
+        for rel, col, ftype, sub, length, prec, scale, nullflag in cur.fetchall():
+            t = tables.get(rel.upper())
+            if t is None:
+                continue
+            t.columns.append(
+                ColumnInfo(
+                    name=col,
+                    type_code=int(ftype),
+                    subtype=int(sub),
+                    length=int(length),
+                    precision=int(prec),
+                    scale=int(scale),
+                    not_null=int(nullflag) == 1,
+                )
+            )
+
+        cur.execute(_SQL_INDICES)
+        current: Optional[IndexInfo] = None
+        for rel, ix_name, uniq, inactive, ctype, col in cur.fetchall():
+            t = tables.get(rel.upper())
+            if t is None:
+                continue
+            if current is None or current.name != ix_name:
+                current = IndexInfo(
+                    name=ix_name,
+                    unique=int(uniq) == 1,
+                    active=int(inactive) != 1,
+                    constraint=ctype or None,
+                )
+                t.indices.append(current)
+            current.columns.append(col)
+
+        cur.execute(_SQL_FOREIGN_KEYS)
+        fk: Optional[ForeignKeyInfo] = None
+        for rel, c_name, col, ref_rel, ref_col in cur.fetchall():
+            t = tables.get(rel.upper())
+            if t is None:
+                continue
+            if fk is None or fk.name != c_name:
+                fk = ForeignKeyInfo(name=c_name, ref_table=ref_rel)
+                t.foreign_keys.append(fk)
+            fk.columns.append(col)
+            fk.ref_columns.append(ref_col)
+
+        return cls(tables, database=database, fingerprint=fingerprint)
+
+    # ---------- persistência ----------
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": _FILE_VERSION,
+            "database": self.database,
+            "fingerprint": self.fingerprint,
+            "tables": [asdict(t) for t in self.tables.values()],
+            "annotations": self.annotations,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MetadataCatalog":
+        tables: Dict[str, TableInfo] = {}
+        for raw in data.get("tables", []):
+            t = TableInfo(
+                name=raw["name"],
+                is_view=raw.get("is_view", False),
+                is_system=raw.get("is_system", False),
+                columns=[ColumnInfo(**c) for c in raw.get("columns", [])],
+                indices=[IndexInfo(**i) for i in raw.get("indices", [])],
+                foreign_keys=[ForeignKeyInfo(**f) for f in raw.get("foreign_keys", [])],
+            )
+            tables[t.name.upper()] = t
+        return cls(
+            tables,
+            database=data.get("database", ""),
+            fingerprint=data.get("fingerprint", ""),
+            annotations=data.get("annotations") or {},
+        )
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(
+        cls, path: str, *, database: str, fingerprint: str
+    ) -> Optional["MetadataCatalog"]:
+        """Lê o catálogo do disco; None se ausente, corrompido ou desatualizado."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            _log(f"Cache de metadados ilegível ({path}): {e}")
+            return None
+        if (
+            data.get("version") != _FILE_VERSION
+            or data.get("database") != database
+            or data.get("fingerprint") != fingerprint
+        ):
+            return None
+        try:
+            return cls.from_dict(data)
+        except Exception as e:
+            _log(f"Cache de metadados inválido ({path}): {e}")
+            return None
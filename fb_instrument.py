@@ -0,0 +1,261 @@
+# fb_instrument.py
+"""
+Instrumentação opcional das consultas Firebird.
+
+Conexões embrulhadas por `QueryRecorder.wrap` registram, para cada statement:
+forma do SQL (literais e listas IN normalizadas), nº de parâmetros, linhas
+devolvidas, tempos de prepare/execute/fetch e o PLAN escolhido pelo Firebird.
+Statements acima de `slow_ms` vão para um log rotativo (JSON por linha),
+agregado depois por `fb_slowlog_report.py`.
+
+O PLAN vem do prepare (`prep(sql, explain_plan=True)` no firebirdsql). SQL
+executado sem prepare é explicado uma vez por forma e o plano é reaproveitado
+pelas execuções seguintes, sem um prepare extra por statement.
+"""
+
+import json
+import logging
+import logging.handlers
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+_RE_SPACES = re.compile(r"\s+")
+_RE_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_FIRST = re.compile(r"\b(FIRST|SKIP)\s+\d+", re.IGNORECASE)
+_RE_NUMBER = re.compile(r"(?<![\w$])\d+(?:\.\d+)?(?![\w$])")
+
+_loggers: Dict[str, logging.Logger] = {}
+_loggers_lock = threading.Lock()
+
+
+def sql_shape(sql: str) -> str:
+    """Normaliza o SQL para agrupar execuções da mesma "forma"."""
+    s = _RE_SPACES.sub(" ", sql).strip()
+    s = _RE_STRING.sub("'?'", s)
+    s = _RE_IN_LIST.sub("(?…)", s)
+    s = _RE_FIRST.sub(lambda m: f"{m.group(1).upper()} N", s)
+    s = _RE_NUMBER.sub("N", s)
+    return s
+
+
+def _slow_logger(path: str, max_bytes: int, backups: int) -> logging.Logger:
+    """Um logger por arquivo (vários clientes no mesmo processo compartilham)."""
+    with _loggers_lock:
+        lg = _loggers.get(path)
+        if lg is None:
+            lg = logging.getLogger(f"fb.slow.{len(_loggers)}")
+            lg.setLevel(logging.INFO)
+            lg.propagate = False
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            lg.addHandler(handler)
+            _loggers[path] = lg
+        return lg
+
+
+def _prep(cur, sql: str, explain: bool):
+    """`cur.prep`, pedindo o PLAN quando `explain` (drivers sem o argumento: sem)."""
+    if explain:
+        try:
+            return cur.prep(sql, explain_plan=True)
+        except TypeError:
+            pass
+    return cur.prep(sql)
+
+
+def _plan_of(obj: Any) -> Optional[str]:
+    # firebirdsql guarda o plano em PreparedStatement.stmt.plan; `.plan` direto
+    # fica como alternativa para outros drivers
+    plan = None
+    for attrs in (("stmt", "plan"), ("plan",)):
+        try:
+            plan = obj
+            for attr in attrs:
+                plan = getattr(plan, attr, None)
+        except Exception:
+            plan = None
+        if plan:
+            break
+    if isinstance(plan, bytes):
+        plan = plan.decode("utf-8", "replace")
+    return _RE_SPACES.sub(" ", plan).strip() if isinstance(plan, str) else None
+
+
+class QueryRecorder:
+    def __init__(
+        self,
+        *,
+        slow_ms: float = 200.0,
+        log_path: Optional[str] = None,
+        max_bytes: int = 5 * 1024 * 1024,
+        backups: int = 3,
+        capture_plan: bool = True,
+    ):
+        self.slow_ms = float(slow_ms)
+        self.capture_plan = capture_plan
+        self._logger = _slow_logger(log_path, max_bytes, backups) if log_path else None
+        self._lock = threading.Lock()
+        # forma -> {count, total_ms, max_ms, rows[, plan]}
+        self.by_shape: Dict[str, Dict[str, Any]] = {}
+        # forma -> PLAN já obtido ("" se o prepare avulso falhou); não repete
+        self._plans: Dict[str, str] = {}
+
+    def wrap(self, con):
+        return _Connection(con, self)
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            agg = self.by_shape.setdefault(
+                entry["shape"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0}
+            )
+            agg["count"] += 1
+            agg["total_ms"] += entry["total_ms"]
+            agg["max_ms"] = max(agg["max_ms"], entry["total_ms"])
+            agg["rows"] += entry["rows"]
+            if entry.get("plan"):
+                agg["plan"] = entry["plan"]
+        if self._logger is not None and entry["total_ms"] >= self.slow_ms:
+            self._logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def plan_for(self, shape: str, explain) -> Optional[str]:
+        """PLAN da forma; na 1ª vez chama `explain()` e guarda o resultado."""
+        with self._lock:
+            if shape in self._plans:
+                return self._plans[shape] or None
+        plan = explain()
+        with self._lock:
+            self._plans[shape] = plan or ""
+        return plan
+
+    def summary(self, top: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [dict(v, shape=k) for k, v in self.by_shape.items()]
+        items.sort(key=lambda x: x["total_ms"], reverse=True)
+        return items[:top]
+
+
+class _Connection:
+    """Proxy de conexão DB-API cujo cursor() devolve cursores instrumentados."""
+
+    def __init__(self, con, recorder: QueryRecorder):
+        self._con = con
+        self._recorder = recorder
+
+    def cursor(self):
+        return _Cursor(self._con.cursor(), self._recorder, self._con)
+
+    def __getattr__(self, name):
+        return getattr(self._con, name)
+
+
+class _Cursor:
+    def __init__(self, cur, recorder: QueryRecorder, con=None):
+        self._cur = cur
+        self._recorder = recorder
+        self._con = con
+        self._prepared: Dict[int, tuple] = {}  # id(stmt) -> (sql, prepare_ms, stmt)
+        self._pending: Optional[Dict[str, Any]] = None
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    # ---------- ciclo de execução ----------
+    def prep(self, sql: str):
+        t0 = time.perf_counter()
+        stmt = _prep(self._cur, sql, self._recorder.capture_plan)
+        self._prepared[id(stmt)] = (sql, (time.perf_counter() - t0) * 1000, stmt)
+        return stmt
+
+    def execute(self, operation, params=()):
+        self._flush()
+        prepared = self._prepared.get(id(operation))
+        if prepared is not None:
+            sql, prepare_ms, stmt = prepared
+            self._prepared[id(operation)] = (sql, 0.0, stmt)  # só na 1ª execução
+            plan_src: Any = stmt
+        else:
+            sql, prepare_ms, plan_src = str(operation), 0.0, self._cur
+        t0 = time.perf_counter()
+        result = self._cur.execute(operation, params)
+        execute_ms = (time.perf_counter() - t0) * 1000
+        self._pending = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "shape": sql_shape(sql),
+            "sql": sql if len(sql) <= 2000 else sql[:2000] + "…",
+            "params": len(params or ()),
+            "rows": 0,
+            "prepare_ms": round(prepare_ms, 3),
+            "execute_ms": round(execute_ms, 3),
+            "fetch_ms": 0.0,
+            "_plan_src": plan_src,
+        }
+        return result
+
+    def _fetch(self, fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        if self._pending is not None:
+            self._pending["fetch_ms"] += (time.perf_counter() - t0) * 1000
+        return out
+
+    def fetchall(self):
+        rows = self._fetch(self._cur.fetchall)
+        if self._pending is not None:
+            self._pending["rows"] += len(rows)
+        self._flush()
+        return rows
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(self._cur.fetchmany, *(() if size is None else (size,)))
+        if self._pending is not None:
+            self._pending["rows"] += len(rows)
+            if not rows or (size is not None and len(rows) < size):
+                self._flush()
+        return rows
+
+    def fetchone(self):
+        row = self._fetch(self._cur.fetchone)
+        if self._pending is not None and row is not None:
+            self._pending["rows"] += 1
+        self._flush()
+        return row
+
+    def close(self):
+        self._flush()
+        return self._cur.close()
+
+    def _flush(self):
+        entry, self._pending = self._pending, None
+        if entry is None:
+            return
+        plan_src = entry.pop("_plan_src")
+        entry["fetch_ms"] = round(entry["fetch_ms"], 3)
+        entry["total_ms"] = round(
+            entry["prepare_ms"] + entry["execute_ms"] + entry["fetch_ms"], 3
+        )
+        if self._recorder.capture_plan:
+            entry["plan"] = _plan_of(plan_src) or self._recorder.plan_for(
+                entry["shape"], lambda: self._explain(entry["sql"])
+            )
+        self._recorder.record(entry)
+
+    def _explain(self, sql: str) -> Optional[str]:
+        """PLAN via prepare avulso (SQL executado sem prepare, 1ª vez da forma)."""
+        if self._con is None:
+            return None
+        try:
+            cur = self._con.cursor()
+            plan = _plan_of(_prep(cur, sql, True)) if hasattr(cur, "prep") else None
+            try:
+                cur.close()
+            except Exception:
+                pass
+            return plan
+        except Exception:
+            return None
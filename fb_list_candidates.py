@@ -10,10 +10,11 @@ def main():
     cfg.read(os.path.join(base, "config.ini"), encoding="utf-8")
     fb = FirebirdClient(cfg)
     print("== Candidatos a tabela de produtos ==")
-    tables = fb._list_tables()
+    cat = fb.catalog()  # metadados em lote (cache local)
+    tables = cat.user_tables()
     hits = []
     for t in tables:
-        cols = fb._table_columns(t)
+        cols = cat.columns(t)
         up = t.upper()
         # filtro rápido: nomes que sugerem catálogo e não comanda/pedido/nf
         if not any(k in up for k in ("PROD", "ESTOQ")):
@@ -0,0 +1,245 @@
+# fb_pool.py
+import contextlib
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+
+def _log(*args):
+    print("[FB-POOL]", *args)
+
+
+class _Entry:
+    __slots__ = ("con", "created", "last_used")
+
+    def __init__(self, con: Any):
+        now = time.monotonic()
+        self.con = con
+        self.created = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Pool limitado e thread-safe de conexões DB-API.
+
+    - checkout/checkin via `connection()` (context manager);
+    - valida a conexão no empréstimo quando ela ficou ociosa mais que
+      `validate_after` segundos;
+    - descarta conexões ociosas há mais de `max_idle` ou vivas há mais de
+      `max_lifetime` segundos;
+    - `max_size <= 0` desliga o pool (abre e fecha uma conexão por uso).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        *,
+        max_size: int = 4,
+        max_idle: float = 300.0,
+        max_lifetime: float = 1800.0,
+        validate_after: float = 5.0,
+        acquire_timeout: float = 10.0,
+        validator: Optional[Callable[[Any], None]] = None,
+        long_transaction: float = 30.0,
+    ):
+        self._factory = factory
+        self.max_size = int(max_size)
+        self.max_idle = float(max_idle)
+        self.max_lifetime = float(max_lifetime)
+        self.validate_after = float(validate_after)
+        self.acquire_timeout = float(acquire_timeout)
+        self._validator = validator
+        self.long_transaction = float(long_transaction)
+        self._cond = threading.Condition()
+        self._idle: Deque[_Entry] = deque()
+        self._size = 0  # conexões vivas (ociosas + emprestadas)
+        self._closed = False
+        self.stats: Dict[str, float] = {
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "validation_failed": 0,
+            "waits": 0,
+            # duração das transações (do empréstimo ao commit/rollback)
+            "transactions": 0,
+            "tx_ms_total": 0.0,
+            "tx_ms_max": 0.0,
+            "tx_long": 0,
+        }
+
+    # ---------- internos ----------
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        if self.max_lifetime > 0 and now - entry.created >= self.max_lifetime:
+            return True
+        if self.max_idle > 0 and now - entry.last_used >= self.max_idle:
+            return True
+        return False
+
+    def _prune_locked(self, now: float) -> List[_Entry]:
+        """Remove do lado mais antigo as conexões expiradas (chamar com lock)."""
+        dead: List[_Entry] = []
+        while self._idle and self._expired(self._idle[0], now):
+            dead.append(self._idle.popleft())
+        self._size -= len(dead)
+        return dead
+
+    def _close_entries(self, entries: List[_Entry]) -> None:
+        for e in entries:
+            self.stats["discarded"] += 1
+            try:
+                e.con.close()
+            except Exception:
+                pass
+
+    def _create(self) -> _Entry:
+        try:
+            entry = _Entry(self._factory())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self.stats["created"] += 1
+        return entry
+
+    def _validate(self, entry: _Entry) -> bool:
+        if self._validator is None:
+            return True
+        if time.monotonic() - entry.last_used < self.validate_after:
+            return True
+        try:
+            self._validator(entry.con)
+            return True
+        except Exception as e:
+            self.stats["validation_failed"] += 1
+            _log("conexão inválida descartada:", e)
+            return False
+
+    def _end_transaction(self, started: float) -> None:
+        ms = (time.monotonic() - started) * 1000
+        with self._cond:
+            self.stats["transactions"] += 1
+            self.stats["tx_ms_total"] += ms
+            self.stats["tx_ms_max"] = max(self.stats["tx_ms_max"], ms)
+            if self.long_transaction > 0 and ms >= self.long_transaction * 1000:
+                self.stats["tx_long"] += 1
+                long_tx = True
+            else:
+                long_tx = False
+        if long_tx:
+            _log(f"transação longa: {ms / 1000:.1f}s (segura OIT/OAT no servidor)")
+
+    # ---------- API ----------
+    def acquire(self) -> _Entry:
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            entry: Optional[_Entry] = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Pool de conexões Firebird fechado.")
+                    now = time.monotonic()
+                    dead = self._prune_locked(now)
+                    if dead:
+                        self._close_entries(dead)
+                    while self._idle:
+                        cand = self._idle.pop()  # LIFO: a mais "quente"
+                        if self._expired(cand, now):
+                            self._size -= 1
+                            self._close_entries([cand])
+                            continue
+                        entry = cand
+                        break
+                    if entry is not None:
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise RuntimeError(
+                            f"Pool de conexões Firebird esgotado ({self.max_size} em uso)."
+                        )
+                    self.stats["waits"] += 1
+                    self._cond.wait(remaining)
+            if create:
+                return self._create()
+            assert entry is not None
+            if self._validate(entry):
+                self.stats["reused"] += 1
+                return entry
+            self.release(entry, discard=True)
+
+    def release(self, entry: _Entry, *, discard: bool = False) -> None:
+        now = time.monotonic()
+        with self._cond:
+            if discard or self._closed or self._expired(entry, now):
+                self._size -= 1
+                dead = [entry]
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+                dead = []
+            self._cond.notify()
+        if dead:
+            self._close_entries(dead)
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Empresta uma conexão; commit na devolução (rollback em erro)."""
+        if self.max_size <= 0:
+            con = self._factory()
+            started = time.monotonic()
+            try:
+                yield con
+                con.commit()
+            finally:
+                self._end_transaction(started)
+                try:
+                    con.close()
+                except Exception:
+                    pass
+            return
+
+        entry = self.acquire()
+        started = time.monotonic()
+        discard = False
+        try:
+            yield entry.con
+        except BaseException:
+            try:
+                entry.con.rollback()
+            except Exception:
+                discard = True
+            raise
+        else:
+            try:
+                entry.con.commit()
+            except Exception:
+                discard = True
+        finally:
+            self._end_transaction(started)
+            self.release(entry, discard=discard)
+
+    def close(self) -> None:
+        """Fecha as conexões ociosas; as emprestadas fecham ao serem devolvidas."""
+        with self._cond:
+            self._closed = True
+            dead = list(self._idle)
+            self._idle.clear()
+            self._size -= len(dead)
+            self._cond.notify_all()
+        self._close_entries(dead)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._cond:
+            out = dict(self.stats)
+            out["size"] = self._size
+            out["idle"] = len(self._idle)
+        n = out["transactions"]
+        out["tx_ms_avg"] = out["tx_ms_total"] / n if n else 0.0
+        return out
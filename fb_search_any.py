@@ -7,17 +7,7 @@ from firebird_client import FirebirdClient
 
 
 def get_text_columns(fb: FirebirdClient, table: str) -> List[str]:
-    sql = (
-        "SELECT TRIM(rf.RDB$FIELD_NAME) "
-        "FROM RDB$RELATION_FIELDS rf "
-        "JOIN RDB$FIELDS f ON f.RDB$FIELD_NAME = rf.RDB$FIELD_SOURCE "
-        "WHERE rf.RDB$RELATION_NAME = ? AND f.RDB$FIELD_TYPE IN (14,37,40) "
-        "ORDER BY rf.RDB$FIELD_POSITION"
-    )
-    with fb._connect() as con:
-        cur = con.cursor()
-        cur.execute(sql, (table.upper(),))
-        return [r[0] for r in cur.fetchall()]
+    return fb.catalog().text_columns(table)
 
 
 def main():
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+from typing import Any, Dict, Iterator, List
+
+
+def iter_entries(path: str, backups: int = 9) -> Iterator[Dict[str, Any]]:
+    """Lê o log atual e os rotacionados (.1, .2, ...), ignorando linhas ruins."""
+    files = [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]
+    for fp in files:
+        if not os.path.exists(fp):
+            continue
+        with open(fp, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def aggregate(entries) -> List[Dict[str, Any]]:
+    by_shape: Dict[str, Dict[str, Any]] = {}
+    for e in entries:
+        shape = e.get("shape") or e.get("sql") or "?"
+        total = float(e.get("total_ms") or 0.0)
+        agg = by_shape.setdefault(
+            shape,
+            {"shape": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0},
+        )
+        agg["count"] += 1
+        agg["total_ms"] += total
+        agg["rows"] += int(e.get("rows") or 0)
+        if total >= agg["max_ms"]:
+            agg["max_ms"] = total
+            agg["plan"] = e.get("plan")
+            agg["sample"] = e.get("sql")
+    for agg in by_shape.values():
+        agg["avg_ms"] = agg["total_ms"] / agg["count"]
+    return list(by_shape.values())
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description="Resume o log de consultas lentas (fb_slow.log) por forma de SQL."
+    )
+    p.add_argument("--log", default="fb_slow.log", help="Arquivo de log")
+    p.add_argument("--top", type=int, default=20, help="Qtde de formas exibidas")
+    p.add_argument(
+        "--sort",
+        choices=["total", "avg", "max", "count"],
+        default="total",
+        help="Critério de ordenação (padrão: total)",
+    )
+    p.add_argument("--plans", action="store_true", help="Mostra o PLAN de cada forma")
+    args = p.parse_args()
+
+    items = aggregate(iter_entries(args.log))
+    if not items:
+        print("Nenhuma consulta lenta registrada.")
+        return
+    key = {"total": "total_ms", "avg": "avg_ms", "max": "max_ms", "count": "count"}
+    items.sort(key=lambda x: x[key[args.sort]], reverse=True)
+    print(f"{'qtde':>6} {'total ms':>10} {'média':>9} {'máx':>9} {'linhas':>8}  SQL")
+    for it in items[: args.top]:
+        shape = it["shape"] if len(it["shape"]) <= 160 else it["shape"][:160] + "…"
+        print(
+            f"{it['count']:>6} {it['total_ms']:>10.1f} {it['avg_ms']:>9.1f} "
+            f"{it['max_ms']:>9.1f} {it['rows']:>8}  {shape}"
+        )
+        if args.plans and it.get("plan"):
+            print(f"{'':>46}{it['plan']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# fb_statements.py
+"""
+Cache de SQL gerado e de statements preparados por conexão.
+
+Listas IN são completadas até tamanhos fixos ("buckets") para que o mesmo
+texto de SQL, e portanto o mesmo statement preparado, seja reaproveitado
+entre chamadas com quantidades diferentes de códigos.
+"""
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+IN_BUCKETS = (1, 4, 16, 64, 256, 1024)
+
+
+def bucket_size(n: int, max_size: int) -> int:
+    """Menor bucket >= n (o próprio max_size é sempre um bucket)."""
+    for b in IN_BUCKETS:
+        if n <= b <= max_size:
+            return b
+    return max(n, max_size)
+
+
+def pad_params(values: Sequence[Any], size: int) -> List[Any]:
+    """Completa a lista repetindo o último valor (inócuo dentro de um IN)."""
+    out = list(values)
+    if out and len(out) < size:
+        out.extend([out[-1]] * (size - len(out)))
+    return out
+
+
+def _close_statement(cur, stmt) -> None:
+    """Libera no servidor o statement e o cursor que saem do cache."""
+    for obj in (stmt, cur):
+        close = getattr(obj, "close", None)
+        if close is None:
+            continue
+        try:
+            close()
+        except Exception:
+            pass
+
+
+class StatementCache:
+    def __init__(self, *, prepare: bool = True, max_per_connection: int = 64):
+        self.prepare = prepare
+        self.max_per_connection = max_per_connection
+        self._sql: Dict[Hashable, str] = {}
+        self._per_con: "weakref.WeakKeyDictionary[Any, OrderedDict]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {
+            "sql_hits": 0,
+            "sql_misses": 0,
+            "prepare_hits": 0,
+            "prepare_misses": 0,
+            "prepare_ms": 0.0,
+            "evicted": 0,
+        }
+
+    def sql(self, key: Hashable, build: Callable[[], str]) -> str:
+        """Texto SQL para `key`, gerado por `build()` apenas na primeira vez."""
+        with self._lock:
+            hit = self._sql.get(key)
+            if hit is not None:
+                self.stats["sql_hits"] += 1
+                return hit
+            self.stats["sql_misses"] += 1
+        text = build()
+        with self._lock:
+            self._sql[key] = text
+        return text
+
+    def _statements_for(self, con) -> Optional[OrderedDict]:
+        with self._lock:
+            try:
+                per = self._per_con.get(con)
+                if per is None:
+                    per = OrderedDict()
+                    self._per_con[con] = per
+                return per
+            except TypeError:  # conexão sem suporte a weakref
+                return None
+
+    def execute(self, con, sql: str, params: Sequence[Any] = ()):
+        """
+        Executa `sql` em `con` e devolve o cursor com o resultado. Quando o
+        driver oferece `cursor.prep`, guarda (cursor, statement) por conexão.
+        """
+        per = self._statements_for(con) if self.prepare else None
+        if per is not None:
+            hit = per.get(sql)
+            if hit is not None:
+                cur, stmt = hit
+                try:
+                    cur.execute(stmt, params)
+                    per.move_to_end(sql)
+                    with self._lock:
+                        self.stats["prepare_hits"] += 1
+                    return cur
+                except Exception:
+                    # handle inválido (ex.: conexão reciclada); prepara de novo
+                    per.pop(sql, None)
+                    _close_statement(cur, stmt)
+        cur = con.cursor()
+        prep = getattr(cur, "prep", None)
+        if per is None or prep is None:
+            cur.execute(sql, params)
+            return cur
+        t0 = time.perf_counter()
+        stmt = prep(sql)
+        with self._lock:
+            self.stats["prepare_misses"] += 1
+            self.stats["prepare_ms"] += (time.perf_counter() - t0) * 1000
+        cur.execute(stmt, params)
+        per[sql] = (cur, stmt)
+        while len(per) > self.max_per_connection:
+            _, (old_cur, old_stmt) = per.popitem(last=False)
+            _close_statement(old_cur, old_stmt)
+            with self._lock:
+                self.stats["evicted"] += 1
+        return cur
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            out = dict(self.stats)
+            out["sql_cached"] = len(self._sql)
+        return out
@@ -74,17 +74,20 @@ def _connect(cfg: FbConfig):
 
     - 'fdb' requer fbclient.dll compatível (64 bits se Python for 64 bits).
     - 'firebirdsql' não precisa de fbclient.dll, mas requer 'passlib' para FB 2.5.
-    Força charset e respeita ROLE quando disponível.
+    Força charset e respeita ROLE quando disponível. As transações são
+    READ COMMITTED read-only (FB_READ_ONLY=0 volta ao padrão do driver).
     """
 
     prefer = os.getenv("FB_DRIVER", "auto").lower()
+    # só leituras aqui: READ COMMITTED read-only não segura o OAT no servidor
+    read_only = os.getenv("FB_READ_ONLY", "1").lower() in ("1", "true", "yes", "on")
     last_err: Optional[Exception] = None
 
     def _try_fdb():
         if not _HAS_FDB:
             return None
         try:
-            return _fdb.connect(
+            conn = _fdb.connect(
                 host=cfg.host,
                 port=cfg.port,
                 database=cfg.database,
@@ -94,6 +97,10 @@ def _connect(cfg: FbConfig):
                 role=cfg.role,
                 sql_dialect=3,
             )
+            tpb = getattr(_fdb, "ISOLATION_LEVEL_READ_COMMITED_RO", None)
+            if read_only and tpb is not None:
+                conn.default_tpb = tpb
+            return conn
         except Exception as e:  # inclui OSError WinError 193 (arquitetura inválida)
             nonlocal last_err
             last_err = e
@@ -103,6 +110,10 @@ def _connect(cfg: FbConfig):
         if _fbsql is None:
             return None
         try:
+            kwargs: Dict[str, Any] = {}
+            level = getattr(_fbsql, "ISOLATION_LEVEL_READ_COMMITED_RO", None)
+            if read_only and level is not None:
+                kwargs["isolation_level"] = level
             return _fbsql.connect(
                 host=cfg.host,
                 port=cfg.port,
@@ -110,6 +121,7 @@ def _connect(cfg: FbConfig):
                 user=cfg.user,
                 password=cfg.password,
                 charset=cfg.charset,
+                **kwargs,
             )
         except Exception as e:
             nonlocal last_err
@@ -131,10 +143,34 @@ def _connect(cfg: FbConfig):
     )
 
 
+_recorder = None
+
+
+def _get_recorder():
+    """QueryRecorder ligado por FB_INSTRUMENT=1 (log em FB_SLOW_LOG_PATH)."""
+    global _recorder
+    if _recorder is None and os.getenv("FB_INSTRUMENT", "0").lower() in (
+        "1",
+        "true",
+        "yes",
+        "on",
+    ):
+        from fb_instrument import QueryRecorder
+
+        _recorder = QueryRecorder(
+            slow_ms=float(os.getenv("FB_SLOW_QUERY_MS", "200")),
+            log_path=os.getenv("FB_SLOW_LOG_PATH", "fb_slow.log"),
+        )
+    return _recorder
+
+
 @contextmanager
 def fb_cursor(cfg: Optional[FbConfig] = None):
     cfg = cfg or get_config()
     conn = _connect(cfg)
+    rec = _get_recorder()
+    if rec is not None:
+        conn = rec.wrap(conn)
     try:
         cur = conn.cursor()
         yield cur
@@ -12,7 +12,8 @@ def main():
     fb = FirebirdClient(cfg)
 
     print("== Inspecionando candidatos de PRODUTO e ESTOQUE ==")
-    tables = fb._list_tables()
+    cat = fb.catalog()  # metadados em lote (cache local)
+    tables = cat.user_tables()
 
     product_hits: List[Dict] = []
     stock_hits: List[Dict] = []
@@ -29,7 +30,7 @@ def main():
         return None
 
     for t in tables:
-        cols = fb._table_columns(t)
+        cols = cat.columns(t)
         up = t.upper()
 
         # Produto: precisa de CODIGO + DESCRICAO plausíveis
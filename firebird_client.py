@@ -1,8 +1,12 @@
 # firebird_client.py
 import contextlib
+import json
 import os
 import re
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 import configparser
 
 try:
@@ -10,12 +14,32 @@ try:
 except Exception:  # pacote pode não estar instalado ainda
     firebirdsql = None
 
+from fb_catalog import MetadataCatalog, schema_fingerprint
+from fb_instrument import QueryRecorder
+from fb_pool import ConnectionPool
+from fb_statements import StatementCache, bucket_size, pad_params
+
 
 # --------- Helpers de log ----------
 def _log(*args):
     print("[FB]", *args)
 
 
+# erros da própria tabela (sem permissão, inexistente): resposta definitiva da
+# sondagem. Timeout do pool, rede, lock conflict etc. não dizem nada da tabela.
+_TABLE_ERROR_SQLCODES = (-551, -204)
+_RE_TABLE_ERROR = re.compile(r"no permission|table unknown", re.IGNORECASE)
+
+
+def _is_table_error(e: Exception) -> bool:
+    code = getattr(e, "sql_code", None) or getattr(e, "sqlcode", None)
+    return code in _TABLE_ERROR_SQLCODES or bool(_RE_TABLE_ERROR.search(str(e)))
+
+
+class QueryCancelled(Exception):
+    """A sessão de leitura foi cancelada (ver `read_session(should_stop=...)`)."""
+
+
 def _norm(s: Optional[str]) -> Optional[str]:
     return s.strip() if isinstance(s, str) else s
 
@@ -80,6 +104,26 @@ class FirebirdClient:
         "QTESTOQUE",
     ]
 
+    # aplicações produto × veículo (tabela de veículos + tabela de ligação)
+    _vehicle_table_patterns = [r"VEIC", r"AUTOMOV", r"MODELO"]
+    _vehicle_cols = {
+        "marca": ["MARCA", "MONTADORA", "FABRICANTE", "DESCMARCA"],
+        "modelo": ["MODELO", "DESCMODELO", "VEICULO", "DESCRICAO", "NOME"],
+        "ano_inicio": ["ANOINICIAL", "ANOINICIO", "ANO_INICIO", "ANOINI", "ANODE"],
+        "ano_fim": ["ANOFINAL", "ANOFIM", "ANO_FIM", "ANOFIN", "ANOATE"],
+        "motor": ["MOTOR", "MOTORIZACAO", "CILINDRADA", "MOTORIZ"],
+        "id": ["CODVEICULO", "IDVEICULO", "CONTROLE", "CODIGO", "ID"],
+    }
+    _application_product_cols = [
+        "CODPRODUTO",
+        "CODIGOPRODUTO",
+        "CODPROD",
+        "IDPRODUTO",
+        "PRODUTO",
+    ]
+    _application_vehicle_cols = ["CODVEICULO", "IDVEICULO", "VEICULO_ID", "VEICULO"]
+    _brand_name_cols = ["DESCRICAO", "NOME", "MARCA", "MONTADORA"]
+
     def __init__(self, cfg: configparser.ConfigParser):
         # Aceita [FIREBIRD] ou [firebird]
         fb_section: Optional[str] = None
@@ -102,6 +146,22 @@ class FirebirdClient:
                     pass
             return default
 
+        def opt_bool(name: str, default: bool) -> bool:
+            if fb_section and cfg.has_option(fb_section, name):
+                try:
+                    return cfg.getboolean(fb_section, name)
+                except Exception:
+                    pass
+            return default
+
+        def opt_float(name: str, default: float) -> float:
+            if fb_section and cfg.has_option(fb_section, name):
+                try:
+                    return cfg.getfloat(fb_section, name)
+                except Exception:
+                    pass
+            return default
+
         # 1) tenta pegar do config.ini (se houver)
         host = opt("HOST")
         port = opt_int("PORT")
@@ -159,18 +219,184 @@ class FirebirdClient:
         # com aliases: CODIGO, DESCRICAO, BARRAS, PRECO, ESTOQUE, FORNECEDOR, MARCA, GRUPO, SUBGRUPO
         # e conter o token {placeholders} em um IN (...) que iremos preencher.
         self._override_full_sql = opt("FULL_SQL") or os.environ.get("FIREBIRD_FULL_SQL")
+        # aplicações: SELECT completo (aliases CODIGO_PRODUTO, MARCA, MODELO,
+        # ANO_INICIO, ANO_FIM, MOTOR) ou tabelas forçadas para a descoberta
+        self._applications_sql: Optional[str] = opt(
+            "APPLICATIONS_SQL"
+        ) or os.environ.get("FIREBIRD_APPLICATIONS_SQL")
+        self._vehicle_table = opt("VEHICLE_TABLE")
+        self._application_table = opt("APPLICATION_TABLE")
+        # (tabela de ligação, coluna do produto) do SELECT descoberto
+        self._applications_link: Optional[Tuple[str, str]] = None
 
-        # cache de metadados
-        self._columns_cache: Dict[str, List[str]] = {}
+        # catálogo de metadados (carregado em lote e persistido em disco)
+        self._catalog_path = (
+            opt("CATALOG_PATH")
+            or os.environ.get("FIREBIRD_CATALOG_PATH")
+            or "fb_metadata.json"
+        )
+        if not os.path.isabs(self._catalog_path):
+            self._catalog_path = os.path.join(base_dir, self._catalog_path)
+        self._catalog: Optional[MetadataCatalog] = None
+        self._catalog_lock = threading.Lock()
         self._product_table_signature: Optional[Tuple[str, Dict[str, str]]] = None
 
+        # instrumentação opcional: tempos por statement, PLAN e log de lentas
+        self._recorder: Optional[QueryRecorder] = None
+        if opt_bool("INSTRUMENT", False):
+            slow_log = opt("SLOW_LOG_PATH") or "fb_slow.log"
+            if not os.path.isabs(slow_log):
+                slow_log = os.path.join(base_dir, slow_log)
+            self._recorder = QueryRecorder(
+                slow_ms=opt_float("SLOW_QUERY_MS", 200.0),
+                log_path=slow_log,
+                max_bytes=opt_int("SLOW_LOG_MAX_BYTES", 5 * 1024 * 1024),
+                backups=opt_int("SLOW_LOG_BACKUPS", 3),
+                capture_plan=opt_bool("CAPTURE_PLAN", True),
+            )
+
+        # pool de conexões: evita handshake TCP + auth a cada chamada
+        self._pool = ConnectionPool(
+            self._open_connection,
+            max_size=opt_int("POOL_SIZE", 4),
+            max_idle=opt_float("POOL_MAX_IDLE", 300.0),
+            max_lifetime=opt_float("POOL_MAX_LIFETIME", 1800.0),
+            validate_after=opt_float("POOL_VALIDATE_AFTER", 5.0),
+            acquire_timeout=opt_float("POOL_TIMEOUT", 10.0),
+            validator=self._validate_connection,
+            long_transaction=opt_float("LONG_TRANSACTION", 30.0),
+        )
+        # leituras em transação READ COMMITTED read-only: não seguram o OAT
+        self._read_only = opt_bool("READ_ONLY", True)
+        # conexão fixada por read_session() (uma transação por busca, por thread;
+        # emprestada no primeiro _connect() da sessão)
+        self._session = threading.local()
+
+        # sondagem de tabelas vazias na descoberta (lotes EXISTS em paralelo)
+        self._probe_batch = max(1, opt_int("PROBE_BATCH", 25) or 25)
+        self._probe_workers = max(1, opt_int("PROBE_WORKERS", 4) or 1)
+        self._discovery_budget = opt_float("DISCOVERY_BUDGET", 5.0)
+        # tabela -> (tem linhas, quando foi sondada); vale PROBE_CACHE_TTL segundos
+        self._rows_cache: Dict[str, Tuple[bool, float]] = {}
+        self._rows_ttl = opt_float("PROBE_CACHE_TTL", 600.0)
+
+        # listas IN grandes são quebradas em blocos (FB 2.5 aceita até 1500 itens)
+        self._in_chunk_size = min(1500, max(1, opt_int("IN_CHUNK_SIZE", 200) or 200))
+        self._in_workers = max(1, opt_int("IN_WORKERS", 4) or 1)
+
+        # campos extraídos no snapshot do catálogo (além de codigo/descricao)
+        self._snapshot_fields = (
+            "barras",
+            "preco",
+            "estoque",
+            "fornecedor",
+            "marca",
+            "grupo",
+            "subgrupo",
+        )
+
+        # cache de SQL gerado + statements preparados por conexão do pool
+        self._stmts = StatementCache(prepare=opt_bool("PREPARE_STATEMENTS", True))
+
     # ---------- Conexão ----------
     def _connect(self):
+        """
+        Empresta uma conexão do pool (use com `with`; devolve ao sair). Dentro
+        de `read_session()` devolve a conexão da sessão, sem abrir transação;
+        a sessão só pega a conexão no primeiro uso. Sessão cancelada: levanta
+        QueryCancelled antes de qualquer nova consulta.
+        """
+        stack = getattr(self._session, "stack", None)
+        if stack is None:
+            return self._pool.connection()
+        stop = self._session.stop
+        if stop is not None and stop():
+            raise QueryCancelled("Busca cancelada.")
+        if self._session.con is None:
+            self._session.con = stack.enter_context(self._pool.connection())
+        return contextlib.nullcontext(self._session.con)
+
+    @contextlib.contextmanager
+    def read_session(
+        self, should_stop: Optional[Callable[[], bool]] = None
+    ) -> Iterator[None]:
+        """
+        Agrupa as leituras do bloco (na thread atual) numa única transação
+        curta, encerrada ao sair. Sessões aninhadas reaproveitam a externa.
+        A conexão só é emprestada na primeira leitura: um bloco que não chega
+        ao Firebird (cache) não abre conexão nem depende do banco estar no ar.
+        Com `should_stop`, cada nova consulta da sessão antes o consulta e, se
+        verdadeiro, levanta QueryCancelled (a consulta em curso não é abortada);
+        numa sessão aninhada, vale enquanto o bloco interno durar.
+        """
+        if getattr(self._session, "stack", None) is not None:
+            outer = self._session.stop
+            if should_stop is not None:
+                self._session.stop = (
+                    should_stop if outer is None else lambda: outer() or should_stop()
+                )
+            try:
+                yield
+            finally:
+                self._session.stop = outer
+            return
+        with contextlib.ExitStack() as stack:
+            self._session.stack = stack
+            self._session.con = None
+            self._session.stop = should_stop
+            try:
+                yield
+            finally:
+                self._session.stack = None
+                self._session.con = None
+                self._session.stop = None
+
+    def close(self) -> None:
+        """Fecha as conexões mantidas pelo pool."""
+        self._pool.close()
+
+    @property
+    def pool_size(self) -> int:
+        """Máximo de conexões emprestadas ao mesmo tempo (<= 0: sem pool)."""
+        return self._pool.max_size
+
+    def pool_stats(self) -> Dict[str, float]:
+        """Uso do pool e duração das transações (tx_ms_avg/max, tx_long)."""
+        return self._pool.snapshot()
+
+    def statement_stats(self) -> Dict[str, float]:
+        """Acertos/erros do cache de SQL e de statements preparados."""
+        return self._stmts.snapshot()
+
+    def query_stats(self, top: int = 20) -> List[Dict[str, Any]]:
+        """Formas de SQL mais custosas (vazio se INSTRUMENT estiver desligado)."""
+        return self._recorder.summary(top) if self._recorder else []
+
+    @staticmethod
+    def _mapping_key(mapping: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted(mapping.items()))
+
+    @staticmethod
+    def _validate_connection(con) -> None:
+        cur = con.cursor()
+        cur.execute("SELECT 1 FROM RDB$DATABASE")
+        cur.fetchone()
+        con.commit()
+
+    def _open_connection(self):
+        con = self._new_connection()
+        return self._recorder.wrap(con) if self._recorder else con
+
+    def _new_connection(self):
         # Nada de auth_method e nada de timeout que quebraram antes
         if firebirdsql is None:
             raise RuntimeError(
                 "Dependência ausente: instale 'firebirdsql' (pip install -r requirements.txt)"
             )
+        kwargs: Dict[str, Any] = {}
+        level = getattr(firebirdsql, "ISOLATION_LEVEL_READ_COMMITED_RO", None)
+        if self._read_only and level is not None:
+            kwargs["isolation_level"] = level
         return firebirdsql.connect(
             host=self.host,
             port=self.port,
@@ -178,41 +404,83 @@ class FirebirdClient:
             password=self.password,
             database=self.database,
             charset=self.charset,
+            **kwargs,
         )
 
     # ---------- Metadata ----------
+    def catalog(self, refresh: bool = False) -> MetadataCatalog:
+        """
+        Catálogo de metadados do banco. Usa o arquivo local quando a impressão
+        digital do schema confere; senão recarrega tudo em lote e regrava.
+        """
+        with self._catalog_lock:
+            if self._catalog is not None and not refresh:
+                return self._catalog
+            if refresh:
+                self._rows_cache.clear()  # tabelas vazias podem ter ganhado linhas
+            with self._connect() as con:
+                fp = schema_fingerprint(con)
+                cat = None
+                if not refresh:
+                    cat = MetadataCatalog.load(
+                        self._catalog_path, database=self.database, fingerprint=fp
+                    )
+                if cat is None:
+                    cat = MetadataCatalog.fetch(
+                        con, database=self.database, fingerprint=fp
+                    )
+                    _log(f"Metadados carregados: {len(cat.tables)} relações.")
+                    try:
+                        cat.save(self._catalog_path)
+                    except OSError as e:
+                        _log(f"Falha ao gravar cache de metadados: {e}")
+            self._catalog = cat
+            return cat
+
+    def _signature_config_key(self) -> str:
+        """Identifica os overrides em uso; mudou o config, descarta a assinatura salva."""
+        return json.dumps(
+            [self._override_table, self._override_cols], sort_keys=True, default=str
+        )
+
+    def _load_persisted_signature(self) -> Optional[Tuple[str, Dict[str, str]]]:
+        """Lê (tabela, mapeamento) salvo no catálogo e valida contra o schema atual."""
+        cat = self.catalog()
+        saved = cat.annotations.get("product_table")
+        if not isinstance(saved, dict):
+            return None
+        if saved.get("config") != self._signature_config_key():
+            return None
+        table = saved.get("table")
+        mapping = saved.get("mapping")
+        if not table or not isinstance(mapping, dict):
+            return None
+        cols = {c.upper() for c in cat.columns(table)}
+        if not cols or any(str(c).upper() not in cols for c in mapping.values()):
+            return None
+        if "codigo" not in mapping or "descricao" not in mapping:
+            return None
+        return table, mapping
+
+    def _persist_signature(self, sig: Tuple[str, Dict[str, str]]) -> None:
+        table, mapping = sig
+        try:
+            cat = self.catalog()
+            with self._catalog_lock:
+                cat.annotations["product_table"] = {
+                    "config": self._signature_config_key(),
+                    "table": table,
+                    "mapping": mapping,
+                }
+                cat.save(self._catalog_path)
+        except Exception as e:
+            _log(f"Falha ao persistir tabela de produto: {e}")
+
     def _list_tables(self) -> List[str]:
-        with self._connect() as con:
-            cur = con.cursor()
-            cur.execute(
-                """
-                SELECT TRIM(RDB$RELATION_NAME)
-                FROM RDB$RELATIONS
-                WHERE RDB$VIEW_BLR IS NULL
-                  AND (RDB$SYSTEM_FLAG IS NULL OR RDB$SYSTEM_FLAG = 0)
-            """
-            )
-            return [r[0] for r in cur.fetchall()]
+        return self.catalog().user_tables()
 
     def _table_columns(self, table: str) -> List[str]:
-        t = table.upper()
-        if t in self._columns_cache:
-            return self._columns_cache[t]
-        with self._connect() as con:
-            cur = con.cursor()
-            cur.execute(
-                """
-                SELECT TRIM(rf.RDB$FIELD_NAME)
-                FROM RDB$RELATION_FIELDS rf
-                JOIN RDB$FIELDS f ON f.RDB$FIELD_NAME = rf.RDB$FIELD_SOURCE
-                WHERE rf.RDB$RELATION_NAME = ?
-                ORDER BY rf.RDB$FIELD_POSITION
-            """,
-                (t,),
-            )
-            cols = [r[0] for r in cur.fetchall()]
-            self._columns_cache[t] = cols
-            return cols
+        return self.catalog().columns(table)
 
     def _find_first_existing(
         self, cols: List[str], candidates: List[str]
@@ -239,14 +507,113 @@ class FirebirdClient:
                 return True
         return False
 
+    def _cached_rows(self, table: str) -> Optional[bool]:
+        """Resultado ainda válido da sondagem de `table` (None = sondar)."""
+        hit = self._rows_cache.get(table.upper())
+        if hit is None or time.monotonic() - hit[1] > self._rows_ttl:
+            return None
+        return hit[0]
+
+    def _remember_rows(self, found: Dict[str, bool]) -> None:
+        now = time.monotonic()
+        self._rows_cache.update({t.upper(): (v, now) for t, v in found.items()})
+
     def _has_rows(self, table: str, mapping: Dict[str, str]) -> bool:
+        """
+        `table` tem linhas? Tabela sem permissão/inexistente conta como vazia;
+        outras falhas (pool, rede, lock) sobem e não ficam no cache.
+        """
+        t = table.upper()
+        cached = self._cached_rows(t)
+        if cached is not None:
+            return cached
         try:
             with self._connect() as con:
                 cur = con.cursor()
                 cur.execute(f"SELECT FIRST 1 {mapping.get('codigo','1')} FROM {table}")
-                return cur.fetchone() is not None
-        except Exception:
-            return False
+                found = cur.fetchone() is not None
+        except Exception as e:
+            if not _is_table_error(e):
+                raise
+            found = False
+        self._remember_rows({t: found})
+        return found
+
+    def _probe_batch_rows(self, tables: List[str]) -> Dict[str, bool]:
+        """Testa várias tabelas numa única consulta EXISTS contra RDB$DATABASE."""
+        exprs = ", ".join(f"IIF(EXISTS(SELECT 1 FROM {t}), 1, 0)" for t in tables)
+        try:
+            with self._connect() as con:
+                cur = con.cursor()
+                cur.execute(f"SELECT {exprs} FROM RDB$DATABASE")
+                row = cur.fetchone() or ()
+            out = {t.upper(): bool(v) for t, v in zip(tables, row)}
+        except Exception as e:
+            if not _is_table_error(e):
+                raise
+            # uma tabela sem permissão derruba o lote; cai para uma a uma
+            return {t.upper(): self._has_rows(t, {}) for t in tables}
+        self._remember_rows(out)
+        return out
+
+    def _probe_tables(
+        self, tables: List[str], deadline: Optional[float] = None
+    ) -> Dict[str, bool]:
+        """
+        Descobre quais tabelas têm linhas. Usa o cache, agrupa o restante em
+        lotes EXISTS e executa os lotes em paralelo (conexões do pool).
+        Passado o `deadline`, lotes ainda não iniciados são cancelados e os já
+        em execução terminam em segundo plano (devolvem a conexão ao pool e
+        alimentam o cache). Tabelas sem resposta até lá, ou cujo lote falhou
+        por erro transitório, ficam fora do resultado.
+        """
+        out: Dict[str, bool] = {}
+        pending: List[str] = []
+        for t in tables:
+            cached = self._cached_rows(t)
+            if cached is not None:
+                out[t.upper()] = cached
+            else:
+                pending.append(t)
+        if not pending:
+            return out
+        batches = [
+            pending[i : i + self._probe_batch]
+            for i in range(0, len(pending), self._probe_batch)
+        ]
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if len(batches) == 1 or self._probe_workers <= 1:
+            for b in batches:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                try:
+                    out.update(self._probe_batch_rows(b))
+                except Exception as e:
+                    _log(f"Falha na sondagem de tabelas: {e}")
+            return out
+        ex = ThreadPoolExecutor(
+            max_workers=min(self._probe_workers, len(batches)),
+            thread_name_prefix="fb-probe",
+        )
+        futures = [ex.submit(self._probe_batch_rows, b) for b in batches]
+        not_done = set(futures)
+        try:
+            _, not_done = wait(futures, timeout=timeout)
+            if not_done:
+                _log(
+                    f"Orçamento de descoberta esgotado: {len(not_done)} lote(s) sem resposta."
+                )
+        finally:
+            # estourado o orçamento, não espera as sondas em execução
+            ex.shutdown(wait=not not_done, cancel_futures=True)
+        for f in futures:
+            if f in not_done:
+                continue
+            try:
+                out.update(f.result())
+            except Exception as e:
+                _log(f"Falha na sondagem de tabelas: {e}")
+        return out
 
     def _discover_product_candidates(
         self, max_candidates: int = 10, *, lenient: bool = False
@@ -255,6 +622,18 @@ class FirebirdClient:
 
         Quando lenient=True, ignora o filtro de nome/tipo (não usa _looks_like_product_table)
         e considera qualquer tabela que tenha combinações plausíveis de código+descrição.
+        A checagem de linhas é feita em lotes paralelos, em ordem de pontuação, e
+        respeita o orçamento DISCOVERY_BUDGET (segundos).
+        """
+        return self._rank_product_candidates(max_candidates, lenient=lenient)[0]
+
+    def _rank_product_candidates(
+        self, max_candidates: int = 10, *, lenient: bool = False
+    ) -> Tuple[List[Tuple[str, Dict[str, str]]], bool]:
+        """
+        `_discover_product_candidates` + se a ordem é confiável: False quando
+        algum candidato mais bem pontuado que o 1º achado ficou sem resposta
+        (orçamento esgotado ou erro transitório na sondagem).
         """
         tables = self._list_tables()
         candidates: List[Tuple[str, Dict[str, str], int]] = []  # (t, mapping, score)
@@ -275,13 +654,35 @@ class FirebirdClient:
                         score += 2
                     elif key == "barras":
                         score += 1
-            if "codigo" in m and "descricao" in m and self._has_rows(t, m):
+            if "codigo" in m and "descricao" in m:
                 # bônus por nome forte
                 if t.upper() in self._likely_product_tables:
                     score += 2
                 candidates.append((t, m, score))
         candidates.sort(key=lambda x: x[2], reverse=True)
-        return [(t, m) for (t, m, _s) in candidates[:max_candidates]]
+
+        # sonda em ondas (melhores primeiro) até juntar max_candidates com linhas
+        deadline = (
+            time.monotonic() + self._discovery_budget
+            if self._discovery_budget > 0
+            else None
+        )
+        wave = max(self._probe_batch * self._probe_workers, max_candidates)
+        found: List[Tuple[str, Dict[str, str]]] = []
+        reliable = True  # nenhum candidato acima do 1º achado ficou sem resposta
+        for i in range(0, len(candidates), wave):
+            chunk = candidates[i : i + wave]
+            has = self._probe_tables([t for (t, _m, _s) in chunk], deadline)
+            for t, m, _s in chunk:
+                if t.upper() not in has and not found:
+                    reliable = False
+                if has.get(t.upper()):
+                    found.append((t, m))
+                    if len(found) >= max_candidates:
+                        return found, reliable
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return found, reliable
 
     def _discover_product_table(self) -> Optional[Tuple[str, Dict[str, str]]]:
         """
@@ -291,6 +692,17 @@ class FirebirdClient:
         if self._product_table_signature is not None:
             return self._product_table_signature
 
+        # assinatura salva de uma execução anterior (mesmo schema e config)
+        try:
+            saved = self._load_persisted_signature()
+        except Exception as e:
+            saved = None
+            _log(f"Falha ao ler tabela de produto salva: {e}")
+        if saved:
+            self._product_table_signature = saved
+            _log(f"Tabela de produto (cache): {saved[0]} -> {saved[1]}")
+            return saved
+
         # se houver override explícito, usa-o
         if (
             self._override_table
@@ -313,6 +725,7 @@ class FirebirdClient:
                         # também exige ao menos 1 linha
                         if self._has_rows(table, m):
                             self._product_table_signature = (table, m)  # inclui extras
+                            self._persist_signature(self._product_table_signature)
                             _log(f"Tabela de produto (override): {table} -> {m}")
                             return self._product_table_signature
                         else:
@@ -328,10 +741,15 @@ class FirebirdClient:
             except Exception as e:
                 _log(f"Falha ao validar override {table}: {e}. Ignorando override.")
 
-        cands = self._discover_product_candidates()
+        cands, reliable = self._rank_product_candidates()
         if cands:
             t, m = cands[0]
             self._product_table_signature = (t, m)
+            if reliable:
+                self._persist_signature(self._product_table_signature)
+            else:
+                # um candidato melhor ficou sem resposta: vale só nesta execução
+                _log("Descoberta incompleta; tabela de produto não será salva.")
             _log(f"Tabela de produto descoberta: {t} -> {m}")
             return self._product_table_signature
 
@@ -339,6 +757,249 @@ class FirebirdClient:
         self._product_table_signature = None
         return None
 
+    # ---------- Aplicações (produto × veículo) ----------
+    def _vehicle_mapping(self, table: str) -> Optional[Dict[str, str]]:
+        cat = self.catalog()
+        cols = cat.columns(table)
+        m: Dict[str, str] = {}
+        for k, cands in self._vehicle_cols.items():
+            hit = self._find_first_existing(cols, cands)
+            if hit:
+                m[k] = hit
+        pk = cat.primary_key(table)
+        if len(pk) == 1:
+            m["id"] = pk[0]
+        if not m.get("modelo") or not m.get("id") or m["modelo"] == m["id"]:
+            return None
+        return m
+
+    def _brand_join(self, table: str) -> Optional[Tuple[str, str, str, str]]:
+        """(tabela, col. nome, col. FK no veículo, col. referenciada) da marca."""
+        cat = self.catalog()
+        info = cat.table(table)
+        for fk in info.foreign_keys if info else []:
+            if len(fk.columns) != 1 or not re.search(
+                r"MARCA|MONTADORA|FABRIC", fk.ref_table
+            ):
+                continue
+            name = self._find_first_existing(
+                cat.columns(fk.ref_table), self._brand_name_cols
+            )
+            if name:
+                return fk.ref_table, name, fk.columns[0], fk.ref_columns[0]
+        return None
+
+    def _application_link(self, vehicle_table: str):
+        """Procura a tabela de ligação produto × veículo: (tabela, col_prod, col_veic)."""
+        cat = self.catalog()
+        found = []
+        for t in cat.user_tables():
+            if t == vehicle_table or (
+                self._application_table and t != self._application_table.upper()
+            ):
+                continue
+            cols = cat.columns(t)
+            prod = self._find_first_existing(cols, self._application_product_cols)
+            if not prod:
+                continue
+            info = cat.table(t)
+            veh = next(
+                (
+                    fk.columns[0]
+                    for fk in (info.foreign_keys if info else [])
+                    if fk.ref_table == vehicle_table and len(fk.columns) == 1
+                ),
+                None,
+            ) or self._find_first_existing(cols, self._application_vehicle_cols)
+            if not veh or veh == prod:
+                continue
+            score = 2 if "APLIC" in t else 1
+            found.append((score, t, prod, veh))
+        for _, t, prod, veh in sorted(found, key=lambda x: (-x[0], x[1])):
+            if self._has_rows(t, {"codigo": prod}):
+                return t, prod, veh
+        return None
+
+    def _discover_applications_sql(self) -> Optional[str]:
+        """
+        Monta o SELECT de aplicações a partir do catálogo: tabela de veículos
+        (marca/modelo/anos/motor + chave) e tabela de ligação com código do
+        produto e referência ao veículo (FK ou nome de coluna). Resultado
+        guardado nas anotações do catálogo.
+        """
+        if self._applications_sql:
+            return self._applications_sql
+        cat = self.catalog()
+        config_key = json.dumps([self._vehicle_table, self._application_table])
+        saved = cat.annotations.get("applications")
+        if (
+            isinstance(saved, dict)
+            and saved.get("config") == config_key
+            and saved.get("table")
+        ):
+            self._applications_sql = saved.get("sql")
+            self._applications_link = (saved["table"], saved.get("product_column"))
+            return self._applications_sql
+
+        sql = None
+        link = None
+        for vt in cat.user_tables():
+            if self._vehicle_table:
+                if vt != self._vehicle_table.upper():
+                    continue
+            elif not any(re.search(p, vt) for p in self._vehicle_table_patterns):
+                continue
+            m = self._vehicle_mapping(vt)
+            if not m:
+                continue
+            link = self._application_link(vt)
+            if not link:
+                continue
+            at, prod, veh = link
+            joins = f"FROM {at} A JOIN {vt} V ON V.{m['id']} = A.{veh}"
+            if m.get("marca"):
+                marca = f"V.{m['marca']}"
+            else:
+                brand = self._brand_join(vt)
+                if brand:
+                    bt, name, fk_col, ref_col = brand
+                    joins += f" LEFT JOIN {bt} M ON M.{ref_col} = V.{fk_col}"
+                    marca = f"M.{name}"
+                else:
+                    marca = "CAST(NULL AS VARCHAR(60))"
+
+            def col(k: str, null: str) -> str:
+                return f"V.{m[k]}" if m.get(k) else null
+
+            sql = (
+                f"SELECT A.{prod} AS CODIGO_PRODUTO, {marca} AS MARCA, "
+                f"V.{m['modelo']} AS MODELO, "
+                f"{col('ano_inicio', 'CAST(NULL AS INTEGER)')} AS ANO_INICIO, "
+                f"{col('ano_fim', 'CAST(NULL AS INTEGER)')} AS ANO_FIM, "
+                f"{col('motor', 'CAST(NULL AS VARCHAR(60))')} AS MOTOR "
+                f"{joins}"
+            )
+            link = (at, prod)
+            _log(f"Aplicações descobertas: {at} -> {vt}")
+            break
+
+        if sql is None:
+            _log("Nenhuma tabela de aplicações produto × veículo encontrada.")
+            return None
+        self._applications_sql = sql
+        self._applications_link = link
+        try:
+            with self._catalog_lock:
+                cat.annotations["applications"] = {
+                    "config": config_key,
+                    "sql": sql,
+                    "table": link[0],
+                    "product_column": link[1],
+                }
+                cat.save(self._catalog_path)
+        except Exception as e:
+            _log(f"Falha ao salvar aplicações descobertas: {e}")
+        return sql
+
+    def _applications_page_column(self) -> Optional[str]:
+        """
+        Coluna para paginar as aplicações por código (`A.<col>`), se a tabela
+        de ligação tem índice ativo começando nela; None caso contrário (ou
+        com APPLICATIONS_SQL próprio, de estrutura desconhecida).
+        """
+        if not self._applications_link:
+            return None
+        table, prod = self._applications_link
+        info = self.catalog().table(table)
+        for idx in info.indices if info else []:
+            if idx.active and idx.columns and idx.columns[0].upper() == prod.upper():
+                return f"A.{prod}"
+        return None
+
+    def iter_vehicle_applications(
+        self, batch_size: int = 5000, *, fetch_size: int = 1000
+    ) -> Iterator[List[Dict]]:
+        """
+        Extrai as aplicações (codigo_produto, marca, modelo, ano_inicio,
+        ano_fim, motor) em lotes de `batch_size` linhas.
+
+        Com índice no código do produto da tabela de ligação, pagina por ele
+        (FIRST n ... WHERE codigo > último ORDER BY codigo, resolvido pelo
+        índice): as linhas do último código de cada página são completadas
+        na mesma conexão, que volta ao pool antes de o lote ser entregue.
+        Sem índice, cada página reordenaria o join inteiro (quadrático em
+        milhões de linhas): usa um único cursor em streaming, sem ORDER BY,
+        que segura uma conexão até o fim da extração.
+        """
+        sql = self._discover_applications_sql()
+        if not sql:
+            return
+        page = max(1, int(batch_size))
+        col = self._applications_page_column()
+        if col is None:
+            with self._connect() as con:
+                cur = con.cursor()
+                cur.execute(sql)
+                rows: List[tuple] = []
+                while True:
+                    part = cur.fetchmany(fetch_size)
+                    rows.extend(part)
+                    while len(rows) >= page:
+                        yield self._application_rows(rows[:page])
+                        rows = rows[page:]
+                    if not part:
+                        break
+                if rows:
+                    yield self._application_rows(rows)
+            return
+
+        # SELECT descoberto: "SELECT A.<prod> AS CODIGO_PRODUTO, ... FROM ... JOIN"
+        head = f"SELECT FIRST {page} {sql[len('SELECT '):]}"
+        last = None  # valor bruto do último código (mantém o tipo da coluna)
+        while True:
+            rows = []
+            with self._connect() as con:
+                cur = con.cursor()
+                if last is None:
+                    cur.execute(f"{head} WHERE {col} IS NOT NULL ORDER BY {col}")
+                else:
+                    cur.execute(f"{head} WHERE {col} > ? ORDER BY {col}", (last,))
+                while True:
+                    part = cur.fetchmany(fetch_size)
+                    if not part:
+                        break
+                    rows.extend(part)
+                full_page = len(rows) >= page
+                if full_page:
+                    # o último código pode continuar na próxima página
+                    last = rows[-1][0]
+                    rows = [r for r in rows if r[0] != last]
+                    cur.execute(f"{sql} WHERE {col} = ?", (last,))
+                    while True:
+                        part = cur.fetchmany(fetch_size)
+                        if not part:
+                            break
+                        rows.extend(part)
+            if rows:
+                yield self._application_rows(rows)
+            if not full_page:
+                return
+
+    @staticmethod
+    def _application_rows(rows: List[tuple]) -> List[Dict]:
+        return [
+            {
+                "codigo_produto": _norm(codigo),
+                "marca": _norm(marca) or "",
+                "modelo": _norm(modelo),
+                "ano_inicio": ano_ini,
+                "ano_fim": ano_fim,
+                "motor": _norm(motor),
+            }
+            for codigo, marca, modelo, ano_ini, ano_fim, motor in rows
+            if codigo is not None
+        ]
+
     # ---------- API pública ----------
     def ping(self) -> bool:
         try:
@@ -351,48 +1012,159 @@ class FirebirdClient:
             _log("ping falhou:", e)
             return False
 
-    def fetch_products_basic(self, limit: int = 200) -> List[Dict]:
+    def iter_products(
+        self,
+        batch_size: int = 1000,
+        *,
+        limit: Optional[int] = None,
+        fetch_size: int = 500,
+    ) -> Iterator[List[Dict]]:
         """
-        Usado pelo SyncService: obtém um snapshot básico de produtos.
-        Retorna lista de dicts com: codigo, descricao, barras, preco
+        Extrai o catálogo em lotes de até `batch_size` itens, com paginação por
+        chave no código (WHERE codigo > último ORDER BY codigo). A memória fica
+        constante e a conexão volta ao pool antes de cada lote ser entregue.
+
+        Cada item traz codigo, descricao e os campos de cadastro (barras,
+        fornecedor, marca, grupo, subgrupo; None quando a tabela não os tem),
+        mais preco/estoque quando mapeados. Com FULL_SQL configurado, o lote é
+        completado por `fetch_full_by_codes` (JOINs do usuário).
         """
         sig = self._discover_product_table()
         if not sig:
-            return []  # deixa o autosync passar em branco sem quebrar
+            return  # deixa o autosync passar em branco sem quebrar
         table, mapping = sig
+        codigo_col = mapping["codigo"]
         parts = []
-        parts.append(f"{mapping['codigo']} AS CODIGO")
+        parts.append(f"{codigo_col} AS CODIGO")
         parts.append(f"{mapping['descricao']} AS DESCRICAO")
-        if "barras" in mapping:
-            parts.append(f"{mapping['barras']} AS BARRAS")
-        else:
-            parts.append("CAST(NULL AS VARCHAR(40)) AS BARRAS")
-        if "preco" in mapping:
-            parts.append(f"{mapping['preco']} AS PRECO")
-        else:
-            parts.append("CAST(NULL AS DECIMAL(18,4)) AS PRECO")
-
+        fields = [f for f in self._snapshot_fields if mapping.get(f)]
+        parts.extend(f"{mapping[f]} AS {f.upper()}" for f in fields)
+        missing = [f for f in self._snapshot_fields if f not in fields]
+        # campos de cadastro ausentes na tabela: None "oficial" (nada a buscar)
+        absent = [f for f in missing if f not in ("preco", "estoque")]
         select_cols = ", ".join(parts)
-        sql = f"SELECT FIRST {int(limit)} {select_cols} FROM {table}"
 
-        with self._connect() as con:
-            cur = con.cursor()
-            cur.execute(sql)
-            rows = cur.fetchall()
+        batch_size = max(1, int(batch_size))
+        remaining = None if limit is None else max(0, int(limit))
+        last = None  # valor bruto do último código (mantém o tipo da coluna)
+        while remaining is None or remaining > 0:
+            page = batch_size if remaining is None else min(batch_size, remaining)
+            where = f" WHERE {codigo_col} > ?" if last is not None else ""
+            sql = (
+                f"SELECT FIRST {int(page)} {select_cols} FROM {table}{where} "
+                f"ORDER BY {codigo_col}"
+            )
+            batch: List[Dict] = []
+            with self._connect() as con:
+                cur = con.cursor()
+                cur.execute(sql, (last,) if last is not None else ())
+                while True:
+                    rows = cur.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    for r in rows:
+                        last = r[0]
+                        item: Dict = {"codigo": _norm(r[0]), "descricao": _norm(r[1])}
+                        for f, v in zip(fields, r[2:]):
+                            if f in ("preco", "estoque"):
+                                item[f] = float(v) if v is not None else None
+                            else:
+                                item[f] = _norm(v)
+                        for f in absent:
+                            item[f] = None
+                        batch.append(item)
+            if not batch:
+                return
+            if self._override_full_sql:
+                full = self.fetch_full_by_codes([i["codigo"] for i in batch])
+                for item in batch:
+                    item.update(
+                        {
+                            k: v
+                            for k, v in full.get(item["codigo"], {}).items()
+                            if k != "descricao" or v
+                        }
+                    )
+            yield batch
+            if remaining is not None:
+                remaining -= len(batch)
+            if len(batch) < page:
+                return
 
+    def fetch_products_basic(self, limit: int = 200) -> List[Dict]:
+        """
+        Usado pelo SyncService: obtém um snapshot de produtos (mesmos campos
+        de `iter_products`).
+        """
         out: List[Dict] = []
-        for r in rows:
-            codigo, descricao, barras, preco = r
-            out.append(
-                {
-                    "codigo": _norm(codigo),
-                    "descricao": _norm(descricao),
-                    "barras": _norm(barras),
-                    "preco": float(preco) if preco is not None else None,
-                }
-            )
+        size = min(int(limit), 1000)
+        for batch in self.iter_products(batch_size=size, limit=limit):
+            out.extend(batch)
         return out
 
+    def _fetch_in_chunks(self, sql_template: str, codes: List[str]) -> List[tuple]:
+        """
+        Executa `sql_template` (com o token {placeholders} dentro de um IN) em
+        blocos de IN_CHUNK_SIZE códigos. Os blocos rodam em paralelo, cada um
+        numa conexão do pool, e as linhas são concatenadas. Dentro de
+        `read_session()` rodam em sequência na conexão (e transação) da sessão.
+        """
+        codes = list(dict.fromkeys(codes))  # remove repetidos, mantém a ordem
+        size = self._in_chunk_size
+        chunks = [codes[i : i + size] for i in range(0, len(codes), size)]
+
+        def run(chunk: List[str]) -> List[tuple]:
+            # IN completado até um bucket fixo -> mesmo SQL, statement reaproveitado
+            bucket = bucket_size(len(chunk), size)
+            sql = self._stmts.sql(
+                ("in", sql_template, bucket),
+                lambda: sql_template.replace(
+                    "{placeholders}", ",".join(["?"] * bucket)
+                ),
+            )
+            with self._connect() as con:
+                cur = self._stmts.execute(con, sql, pad_params(chunk, bucket))
+                return cur.fetchall()
+
+        in_session = getattr(self._session, "stack", None) is not None
+        if len(chunks) <= 1 or self._in_workers <= 1 or in_session:
+            rows: List[tuple] = []
+            for chunk in chunks:
+                rows.extend(run(chunk))
+            return rows
+        rows = []
+        with ThreadPoolExecutor(
+            max_workers=min(self._in_workers, len(chunks)),
+            thread_name_prefix="fb-in",
+        ) as ex:
+            for part in ex.map(run, chunks):
+                rows.extend(part)
+        return rows
+
+    @staticmethod
+    def _full_row(r) -> Tuple[str, Dict[str, Optional[float]]]:
+        (
+            codigo,
+            descricao,
+            barras,
+            preco,
+            estoque,
+            fornecedor,
+            marca,
+            grupo,
+            subgrupo,
+        ) = r
+        return _norm(codigo) or "", {
+            "descricao": _norm(descricao),
+            "barras": _norm(barras),
+            "preco": float(preco) if preco is not None else None,
+            "estoque": float(estoque) if estoque is not None else None,
+            "fornecedor": _norm(fornecedor),
+            "marca": _norm(marca),
+            "grupo": _norm(grupo),
+            "subgrupo": _norm(subgrupo),
+        }
+
     def fetch_stock_price_by_codes(
         self, codes: List[str]
     ) -> Dict[str, Dict[str, Optional[float]]]:
@@ -403,30 +1175,31 @@ class FirebirdClient:
         if not sig:
             return {}
         table, mapping = sig
-        cols = self._table_columns(table)
-        estoque_col = mapping.get("estoque") or self._find_first_existing(
-            cols, self._candidate_stock_cols
-        )
-        preco_col = mapping.get("preco")
-        codigo_col = mapping["codigo"]
-        select_parts = [f"{codigo_col} AS CODIGO"]
-        if estoque_col:
-            select_parts.append(f"{estoque_col} AS ESTOQUE")
-        else:
-            select_parts.append("CAST(NULL AS DECIMAL(18,4)) AS ESTOQUE")
-        if preco_col:
-            select_parts.append(f"{preco_col} AS PRECO")
-        else:
-            select_parts.append("CAST(NULL AS DECIMAL(18,4)) AS PRECO")
-        select_cols = ", ".join(select_parts)
-        placeholders = ",".join(["?"] * len(codes))
-        sql = (
-            f"SELECT {select_cols} FROM {table} WHERE {codigo_col} IN ({placeholders})"
-        )
-        with self._connect() as con:
-            cur = con.cursor()
-            cur.execute(sql, codes)
-            rows = cur.fetchall()
+
+        def build() -> str:
+            cols = self._table_columns(table)
+            estoque_col = mapping.get("estoque") or self._find_first_existing(
+                cols, self._candidate_stock_cols
+            )
+            preco_col = mapping.get("preco")
+            codigo_col = mapping["codigo"]
+            select_parts = [f"{codigo_col} AS CODIGO"]
+            if estoque_col:
+                select_parts.append(f"{estoque_col} AS ESTOQUE")
+            else:
+                select_parts.append("CAST(NULL AS DECIMAL(18,4)) AS ESTOQUE")
+            if preco_col:
+                select_parts.append(f"{preco_col} AS PRECO")
+            else:
+                select_parts.append("CAST(NULL AS DECIMAL(18,4)) AS PRECO")
+            select_cols = ", ".join(select_parts)
+            return (
+                f"SELECT {select_cols} FROM {table} "
+                f"WHERE {codigo_col} IN ({{placeholders}})"
+            )
+
+        sql = self._stmts.sql(("stock", table, self._mapping_key(mapping)), build)
+        rows = self._fetch_in_chunks(sql, codes)
         out: Dict[str, Dict[str, Optional[float]]] = {}
         for r in rows:
             codigo, estoque, preco = r
@@ -444,42 +1217,13 @@ class FirebirdClient:
             return {}
         # Caso o usuário tenha fornecido um SELECT completo para JOINs, usa-o aqui
         if self._override_full_sql:
-            placeholders = ",".join(["?"] * len(codes))
-            sql = self._override_full_sql.replace("{placeholders}", placeholders)
-            with self._connect() as con:
-                cur = con.cursor()
-                cur.execute(sql, codes)
-                rows = cur.fetchall()
-            out: Dict[str, Dict[str, Optional[float]]] = {}
-            for r in rows:
-                (
-                    codigo,
-                    descricao,
-                    barras,
-                    preco,
-                    estoque,
-                    fornecedor,
-                    marca,
-                    grupo,
-                    subgrupo,
-                ) = r
-                out[_norm(codigo) or ""] = {
-                    "descricao": _norm(descricao),
-                    "barras": _norm(barras),
-                    "preco": float(preco) if preco is not None else None,
-                    "estoque": float(estoque) if estoque is not None else None,
-                    "fornecedor": _norm(fornecedor),
-                    "marca": _norm(marca),
-                    "grupo": _norm(grupo),
-                    "subgrupo": _norm(subgrupo),
-                }
-            return out
+            rows = self._fetch_in_chunks(self._override_full_sql, codes)
+            return dict(self._full_row(r) for r in rows)
 
         sig = self._discover_product_table()
         if not sig:
             return {}
         table, mapping = sig
-        cols = self._table_columns(table)
 
         def col_or_null(colname: Optional[str], cast: str, alias: str) -> str:
             return (
@@ -488,62 +1232,74 @@ class FirebirdClient:
                 else f"CAST(NULL AS {cast}) AS {alias}"
             )
 
-        codigo_col = mapping["codigo"]
-        descricao_col = mapping.get("descricao")
-        barras_col = mapping.get("barras")
-        preco_col = mapping.get("preco")
-        estoque_col = mapping.get("estoque") or self._find_first_existing(
-            cols, self._candidate_stock_cols
-        )
-        fornecedor_col = mapping.get("fornecedor")
-        marca_col = mapping.get("marca")
-        grupo_col = mapping.get("grupo")
-        subgrupo_col = mapping.get("subgrupo")
-
-        select_parts = [
-            f"{codigo_col} AS CODIGO",
-            col_or_null(descricao_col, "VARCHAR(200)", "DESCRICAO"),
-            col_or_null(barras_col, "VARCHAR(50)", "BARRAS"),
-            col_or_null(preco_col, "DECIMAL(18,4)", "PRECO"),
-            col_or_null(estoque_col, "DECIMAL(18,4)", "ESTOQUE"),
-            col_or_null(fornecedor_col, "VARCHAR(200)", "FORNECEDOR"),
-            col_or_null(marca_col, "VARCHAR(200)", "MARCA"),
-            col_or_null(grupo_col, "VARCHAR(200)", "GRUPO"),
-            col_or_null(subgrupo_col, "VARCHAR(200)", "SUBGRUPO"),
-        ]
-        select_cols = ", ".join(select_parts)
-        placeholders = ",".join(["?"] * len(codes))
-        sql = (
-            f"SELECT {select_cols} FROM {table} WHERE {codigo_col} IN ({placeholders})"
-        )
-        with self._connect() as con:
-            cur = con.cursor()
-            cur.execute(sql, codes)
-            rows = cur.fetchall()
-        out: Dict[str, Dict[str, Optional[float]]] = {}
-        for r in rows:
-            (
-                codigo,
-                descricao,
-                barras,
-                preco,
-                estoque,
-                fornecedor,
-                marca,
-                grupo,
-                subgrupo,
-            ) = r
-            out[_norm(codigo) or ""] = {
-                "descricao": _norm(descricao),
-                "barras": _norm(barras),
-                "preco": float(preco) if preco is not None else None,
-                "estoque": float(estoque) if estoque is not None else None,
-                "fornecedor": _norm(fornecedor),
-                "marca": _norm(marca),
-                "grupo": _norm(grupo),
-                "subgrupo": _norm(subgrupo),
-            }
-        return out
+        def build() -> str:
+            cols = self._table_columns(table)
+            codigo_col = mapping["codigo"]
+            descricao_col = mapping.get("descricao")
+            barras_col = mapping.get("barras")
+            preco_col = mapping.get("preco")
+            estoque_col = mapping.get("estoque") or self._find_first_existing(
+                cols, self._candidate_stock_cols
+            )
+            fornecedor_col = mapping.get("fornecedor")
+            marca_col = mapping.get("marca")
+            grupo_col = mapping.get("grupo")
+            subgrupo_col = mapping.get("subgrupo")
+
+            select_parts = [
+                f"{codigo_col} AS CODIGO",
+                col_or_null(descricao_col, "VARCHAR(200)", "DESCRICAO"),
+                col_or_null(barras_col, "VARCHAR(50)", "BARRAS"),
+                col_or_null(preco_col, "DECIMAL(18,4)", "PRECO"),
+                col_or_null(estoque_col, "DECIMAL(18,4)", "ESTOQUE"),
+                col_or_null(fornecedor_col, "VARCHAR(200)", "FORNECEDOR"),
+                col_or_null(marca_col, "VARCHAR(200)", "MARCA"),
+                col_or_null(grupo_col, "VARCHAR(200)", "GRUPO"),
+                col_or_null(subgrupo_col, "VARCHAR(200)", "SUBGRUPO"),
+            ]
+            select_cols = ", ".join(select_parts)
+            return (
+                f"SELECT {select_cols} FROM {table} "
+                f"WHERE {codigo_col} IN ({{placeholders}})"
+            )
+
+        sql = self._stmts.sql(("full", table, self._mapping_key(mapping)), build)
+        rows = self._fetch_in_chunks(sql, codes)
+        return dict(self._full_row(r) for r in rows)
+
+    def _indexed_conditions(
+        self, table: str, mapping: Dict[str, str], terms: List[str]
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Condições sobre código/barras que o Firebird resolve por índice
+        (igualdade para colunas numéricas, STARTING WITH para texto), apenas
+        para colunas que são o 1º segmento de um índice ativo.
+        """
+        try:
+            cat = self.catalog()
+        except Exception as e:
+            _log(f"Sem metadados de índice para {table}: {e}")
+            return [], []
+        conds: List[str] = []
+        params: List[str] = []
+        for key in ("codigo", "barras"):
+            col = mapping.get(key)
+            if not col or not cat.leading_index(table, col):
+                continue
+            info = cat.column(table, col)
+            for t in terms:
+                t = t.strip()
+                if not t:
+                    continue
+                if info is not None and info.is_numeric:
+                    if t.isdigit():
+                        conds.append(f"{col} = ?")
+                        params.append(t)
+                    continue
+                for variant in dict.fromkeys([t, t.upper()]):
+                    conds.append(f"{col} STARTING WITH ?")
+                    params.append(variant)
+        return conds, params
 
     def search_products_loose(
         self,
@@ -555,6 +1311,13 @@ class FirebirdClient:
         """
         Pesquisa "solta" no Firebird com base nas colunas que existirem.
         O SearchService usa o SQLite; isto aqui serve de fallback se você quiser.
+
+        Por tabela, primeiro tenta código/barras via índice (UNION de consultas
+        com igualdade/STARTING WITH); a varredura com CONTAINING/LIKE fica como
+        último recurso, quando o índice não devolve nada.
+
+        Sem nada encontrado, uma falha que não seja da própria tabela (pool,
+        rede, lock) sobe: lista vazia quer dizer "o termo não existe".
         """
         terms = [t for t in [produto, veiculo, detalhe] if t]
         if not terms:
@@ -563,41 +1326,22 @@ class FirebirdClient:
         # tenta tabela principal, depois candidatos adicionais até preencher o limite
         tried: List[str] = []
         results: Dict[str, Dict] = {}
+        errors: List[Exception] = []  # falhas transitórias (resposta incompleta)
 
-        def run_on(table: str, mapping: Dict[str, str], remaining: int):
-            where_clauses: List[str] = []
-            params: List[str] = []
-            if mapping.get("descricao"):
-                for t in terms:
-                    where_clauses.append(f"{mapping['descricao']} CONTAINING ?")
-                    params.append(t)
-            if mapping.get("codigo"):
-                for t in terms:
-                    where_clauses.append(
-                        f"CAST({mapping['codigo']} AS VARCHAR(50)) LIKE ?"
-                    )
-                    params.append(f"%{t}%")
-            if mapping.get("barras"):
-                for t in terms:
-                    where_clauses.append(f"{mapping['barras']} LIKE ?")
-                    params.append(f"%{t}%")
-            if not where_clauses:
-                return 0
+        def select_cols(mapping: Dict[str, str]) -> str:
             parts = [
                 f"{mapping['codigo']} AS CODIGO",
                 f"{mapping['descricao']} AS DESCRICAO",
                 f"{mapping.get('barras', 'CAST(NULL AS VARCHAR(40))')} AS BARRAS",
                 f"{mapping.get('preco', 'CAST(NULL AS DECIMAL(18,4))')} AS PRECO",
             ]
-            select_cols = ", ".join(parts)
-            sql = (
-                f"SELECT FIRST {int(remaining)} {select_cols} FROM {table} "
-                f"WHERE {' OR '.join(where_clauses)}"
-            )
+            return ", ".join(parts)
+
+        def collect(table: str, sql: str, params: List) -> int:
+            added = 0
             try:
                 with self._connect() as con:
-                    cur = con.cursor()
-                    cur.execute(sql, params)
+                    cur = self._stmts.execute(con, sql, params)
                     for codigo, descricao, barras, preco in cur.fetchall():
                         code = _norm(codigo) or ""
                         if not code or code in results:
@@ -608,10 +1352,69 @@ class FirebirdClient:
                             "barras": _norm(barras),
                             "preco": float(preco) if preco is not None else None,
                         }
+                        added += 1
                         if len(results) >= limit:
                             break
+            except QueryCancelled:
+                raise
             except Exception as e:
                 _log(f"Falha ao buscar em {table}: {e}")
+                if not _is_table_error(e):
+                    errors.append(e)
+            return added
+
+        def run_on(table: str, mapping: Dict[str, str], remaining: int):
+            mkey = self._mapping_key(mapping)
+
+            # 1) caminhos indexados (código/barras exatos ou por prefixo)
+            conds, cparams = self._indexed_conditions(table, mapping, terms)
+            if conds:
+
+                def build_indexed() -> str:
+                    cols = select_cols(mapping)
+                    union = " UNION ".join(
+                        f"SELECT {cols} FROM {table} WHERE {c}" for c in conds
+                    )
+                    return f"SELECT FIRST ? * FROM ({union}) R"
+
+                sql = self._stmts.sql(
+                    ("loose-idx", table, mkey, tuple(conds)), build_indexed
+                )
+                if collect(table, sql, [int(remaining), *cparams]):
+                    return len(results)
+
+            # 2) último recurso: varredura com CONTAINING/LIKE
+            params: List = [int(remaining)]
+            if mapping.get("descricao"):
+                params.extend(terms)
+            if mapping.get("codigo"):
+                params.extend(f"%{t}%" for t in terms)
+            if mapping.get("barras"):
+                params.extend(f"%{t}%" for t in terms)
+            if len(params) == 1:
+                return 0
+
+            def build() -> str:
+                where_clauses: List[str] = []
+                if mapping.get("descricao"):
+                    for _t in terms:
+                        where_clauses.append(f"{mapping['descricao']} CONTAINING ?")
+                if mapping.get("codigo"):
+                    for _t in terms:
+                        where_clauses.append(
+                            f"CAST({mapping['codigo']} AS VARCHAR(50)) LIKE ?"
+                        )
+                if mapping.get("barras"):
+                    for _t in terms:
+                        where_clauses.append(f"{mapping['barras']} LIKE ?")
+                # FIRST parametrizado: o mesmo SQL serve para qualquer limite
+                return (
+                    f"SELECT FIRST ? {select_cols(mapping)} FROM {table} "
+                    f"WHERE {' OR '.join(where_clauses)}"
+                )
+
+            sql = self._stmts.sql(("loose", table, mkey, len(terms)), build)
+            collect(table, sql, params)
             return len(results)
 
         # 1) principal
@@ -622,22 +1425,26 @@ class FirebirdClient:
             run_on(table, mapping, limit)
 
         # 2) candidatos adicionais
-        if len(results) < limit:
-            # primeiro candidatos "fortes"; depois, em modo leniente (qualquer tabela com codigo+descricao)
-            for t, m in self._discover_product_candidates(max_candidates=20):
-                if t.upper() in tried:
-                    continue
-                run_on(t, m, limit - len(results))
-                if len(results) >= limit:
-                    break
-        if len(results) < limit:
-            for t, m in self._discover_product_candidates(
-                max_candidates=30, lenient=True
-            ):
+        # primeiro candidatos "fortes"; depois, em modo leniente (qualquer tabela com codigo+descricao)
+        for max_candidates, lenient in ((20, False), (30, True)):
+            if len(results) >= limit:
+                break
+            try:
+                cands = self._discover_product_candidates(
+                    max_candidates=max_candidates, lenient=lenient
+                )
+            except Exception as e:
+                _log(f"Falha ao listar tabelas candidatas: {e}")
+                errors.append(e)
+                break
+            for t, m in cands:
                 if t.upper() in tried:
                     continue
+                tried.append(t.upper())
                 run_on(t, m, limit - len(results))
                 if len(results) >= limit:
                     break
 
+        if not results and errors:
+            raise errors[0]
         return list(results.values())
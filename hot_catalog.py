@@ -0,0 +1,282 @@
+# hot_catalog.py
+"""
+Catálogo de produtos em memória para a busca enquanto se digita.
+
+Layout compacto, em arrays paralelos indexados por um id interno (posição):
+
+- `codes` / `descs` / `barras`: listas de strings internadas;
+- índice invertido token da descrição → lista de ids (`array('I')`, ordem crescente), com
+  vocabulário ordenado para achar todos os tokens de um prefixo por bisect;
+- índice de trigramas de código/código de barras → ids, para fragmentos.
+
+Atualizações não mexem nas listas de postings: o id antigo vira lápide
+(`alive[id] = 0`) e a versão nova ganha um id no fim.
+"""
+
+import heapq
+import itertools
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+_RE_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def fold(text: str) -> str:
+    """Minúsculas sem acentos (mesma regra do tokenizer unicode61 do FTS)."""
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokens(text: str) -> List[str]:
+    return _RE_TOKEN.findall(fold(text))
+
+
+def trigrams(text: str) -> Set[str]:
+    text = text.lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def text_matches(
+    q: str, codigo: str, descricao: Optional[str], barras: Optional[str] = None
+) -> bool:
+    """Regras da busca no cache (FTS por prefixo + fragmento de código) para uma linha."""
+    q = q.strip()
+    if len(q) >= 3 and len(q.split()) == 1:
+        frag = q.lower()
+        if frag in str(codigo).lower() or frag in (barras or "").lower():
+            return True
+    words = tokens(q)
+    toks = tokens(descricao or "") + tokens(str(codigo))
+    return bool(words) and all(any(t.startswith(w) for t in toks) for w in words)
+
+
+class HotCatalog:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.codes: List[str] = []
+        self.descs: List[str] = []
+        self.barras: List[Optional[str]] = []
+        self.alive = bytearray()
+        self._by_code: Dict[str, int] = {}
+        self._by_barras: Dict[str, int] = {}
+        self._postings: Dict[str, array] = {}
+        self._vocab: List[str] = []
+        self._grams: Dict[str, array] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._by_code)
+
+    def load(self, repo: Any, batch_size: int = 10000) -> "HotCatalog":
+        """Carrega `produtos_cache` inteiro (substitui o conteúdo atual)."""
+        with self._lock:
+            self._reset()
+            with repo._reader() as con:
+                cur = con.execute(
+                    "SELECT codigo, descricao, barras FROM produtos_cache ORDER BY rowid"
+                )
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        self._add(row["codigo"], row["descricao"], row["barras"])
+            self._vocab = sorted(self._postings)
+            self.loaded = True
+        return self
+
+    def _add(self, codigo: str, descricao: str, barras: Optional[str]) -> List[str]:
+        """Acrescenta um registro; devolve os tokens novos no vocabulário."""
+        idx = len(self.codes)
+        codigo = sys.intern(str(codigo))
+        self.codes.append(codigo)
+        self.descs.append(sys.intern(descricao or ""))
+        self.barras.append(sys.intern(barras) if barras else None)
+        self.alive.append(1)
+        self._by_code[codigo] = idx
+        if barras:
+            self._by_barras[self.barras[idx]] = idx
+        new_tokens = []
+        words = set(tokens(descricao or ""))
+        for w in words:
+            post = self._postings.get(w)
+            if post is None:
+                post = self._postings[sys.intern(w)] = array("I")
+                new_tokens.append(w)
+            post.append(idx)
+        grams = trigrams(codigo)
+        if barras:
+            grams |= trigrams(barras)
+        for g in grams:
+            post = self._grams.get(g)
+            if post is None:
+                post = self._grams[sys.intern(g)] = array("I")
+            post.append(idx)
+        return new_tokens
+
+    def upsert(self, items: Iterable[Dict[str, Any]]) -> int:
+        """
+        Aplica itens gravados no cache (sync ou fallback da busca). Itens sem
+        mudança em descrição/código de barras são ignorados. Devolve quantos
+        registros mudaram.
+        """
+        changed = 0
+        with self._lock:
+            for it in items:
+                codigo = str(it["codigo"])
+                old = self._by_code.get(codigo)
+                descricao = it.get("descricao") or ""
+                barras = it.get("barras") if "barras" in it else None
+                if old is not None:
+                    if "barras" not in it:
+                        barras = self.barras[old]
+                    if self.descs[old] == descricao and self.barras[old] == barras:
+                        continue
+                    self.alive[old] = 0
+                for w in self._add(codigo, descricao, barras):
+                    insort(self._vocab, w)
+                changed += 1
+        return changed
+
+    def _prefix_postings(self, prefix: str) -> List[array]:
+        vocab = self._vocab
+        i = bisect_left(vocab, prefix)
+        out = []
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            out.append(self._postings[vocab[i]])
+            i += 1
+        return out
+
+    def _substring_ids(self, fragment: str) -> Iterator[int]:
+        """Ids cujo código/EAN contém `fragment`: percorre o menor posting e confere."""
+        grams = [self._grams.get(g) for g in trigrams(fragment)]
+        if not grams or not all(grams):
+            return
+        frag = fragment.lower()
+        for i in min(grams, key=len):
+            if self.alive[i] and (
+                frag in self.codes[i].lower() or frag in (self.barras[i] or "").lower()
+            ):
+                yield i
+
+    def _candidates(self, word: str) -> Tuple[int, Iterable[int]]:
+        """(tamanho estimado, ids em ordem) dos registros que podem casar `word`."""
+        posts = self._prefix_postings(word)
+        ids: Iterable[int] = posts[0] if len(posts) == 1 else heapq.merge(*posts)
+        size = sum(len(p) for p in posts)
+        if len(word) >= 3:
+            # termo pode ser parte de um código no meio da busca
+            ids = itertools.chain(ids, self._substring_ids(word))
+        return size, ids
+
+    def _matches(self, i: int, words: List[str]) -> bool:
+        toks = tokens(self.descs[i]) + tokens(self.codes[i])
+        return all(any(t.startswith(w) for t in toks) for w in words)
+
+    def search(self, q: str, limit: int = 200) -> List[Dict[str, Any]]:
+        """
+        Mesmas regras de `SqliteRepo.search_products_cache`: um termo só com 3+
+        caracteres também procura fragmento de código/EAN (primeiro); depois
+        todos os termos por prefixo na descrição. Os ids saem do termo mais
+        seletivo e os demais termos são conferidos registro a registro, parando
+        ao atingir `limit`. Código ou EAN igual ao termo vem antes de tudo,
+        para não ficar fora do corte.
+        """
+        q = q.strip()
+        words = tokens(q)
+        if not words:
+            return []
+        with self._lock:
+            ids: List[int] = []
+            seen: Set[int] = set()
+            for c in dict.fromkeys((q, q.upper(), q.lower())):
+                for i in (self._by_code.get(c), self._by_barras.get(c)):
+                    if i is not None and self.alive[i] and i not in seen:
+                        ids.append(i)
+                        seen.add(i)
+            if len(q) >= 3 and len(q.split()) == 1:
+                for i in self._substring_ids(q):
+                    if len(ids) >= limit:
+                        break
+                    if i not in seen:
+                        ids.append(i)
+                        seen.add(i)
+            if len(ids) < limit:
+                _, candidates = min(
+                    (self._candidates(w) for w in words), key=lambda c: c[0]
+                )
+                for i in candidates:
+                    if i in seen or not self.alive[i]:
+                        continue
+                    seen.add(i)
+                    if len(words) > 1 and not self._matches(i, words):
+                        continue
+                    ids.append(i)
+                    if len(ids) >= limit:
+                        break
+            return [
+                {"codigo": self.codes[i], "descricao": self.descs[i]}
+                for i in ids[:limit]
+            ]
+
+    def memory_report(self) -> Dict[str, int]:
+        """Bytes aproximados de cada estrutura (strings únicas contadas uma vez)."""
+        with self._lock:
+            seen: Set[int] = set()
+
+            def strings(values: Iterable[Optional[str]]) -> int:
+                total = 0
+                for s in values:
+                    if s is not None and id(s) not in seen:
+                        seen.add(id(s))
+                        total += sys.getsizeof(s)
+                return total
+
+            def postings(d: Dict[str, array]) -> int:
+                return (
+                    sys.getsizeof(d)
+                    + strings(d)
+                    + sum(sys.getsizeof(a) for a in d.values())
+                )
+
+            report = {
+                "items": len(self),
+                "records": sys.getsizeof(self.codes)
+                + sys.getsizeof(self.descs)
+                + sys.getsizeof(self.barras)
+                + sys.getsizeof(self.alive)
+                + strings(self.codes)
+                + strings(self.descs)
+                + strings(self.barras),
+                "code_map": sys.getsizeof(self._by_code)
+                + sys.getsizeof(self._by_barras),
+                "tokens": postings(self._postings) + sys.getsizeof(self._vocab),
+                "trigrams": postings(self._grams),
+            }
+            report["total"] = (
+                report["records"]
+                + report["code_map"]
+                + report["tokens"]
+                + report["trigrams"]
+            )
+        return report
+
+
+def load_hot_catalog(repo: Any) -> Optional[HotCatalog]:
+    """Carrega o catálogo; em caso de falha segue sem ele (busca via SQLite)."""
+    try:
+        return HotCatalog().load(repo)
+    except sqlite3.Error as e:
+        print(f"[WARN] Falha ao carregar o catálogo em memória: {e}")
+        return None
@@ -0,0 +1,87 @@
+import argparse
+import csv
+import json
+import os
+from typing import Any, Dict, Iterator
+
+from sqlite_repo import SqliteRepo
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def iter_csv(path: str, delimiter: str = "") -> Iterator[Dict[str, Any]]:
+    """Lê o CSV em streaming; sem delimitador, detecta entre ';', ',' e TAB."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if not delimiter:
+            sample = f.read(64 * 1024)
+            f.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=";,\t").delimiter
+            except csv.Error:
+                delimiter = ";"
+        reader = csv.DictReader(f, delimiter=delimiter)
+        for row in reader:
+            yield {(k or "").strip().lower(): v for k, v in row.items()}
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield {k.lower(): v for k, v in json.loads(line).items()}
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description="Importa aplicações (produto × veículo) de CSV ou JSONL para o "
+        "cache SQLite. Colunas: codigo_produto (ou codigo), marca, modelo, "
+        "ano_inicio, ano_fim, motor."
+    )
+    p.add_argument("arquivo", help="Arquivo .csv ou .jsonl")
+    p.add_argument(
+        "--db", default=os.path.join(BASE_DIR, "catalogo.db"), help="Banco SQLite"
+    )
+    p.add_argument("--formato", choices=["csv", "jsonl"], help="Padrão: pela extensão")
+    p.add_argument("--delimitador", default="", help="Delimitador do CSV")
+    p.add_argument("--lote", type=int, default=50000, help="Linhas por transação")
+    p.add_argument(
+        "--manter-indices",
+        action="store_true",
+        help="Não remove os índices secundários durante a carga",
+    )
+    args = p.parse_args()
+
+    fmt = args.formato or (
+        "jsonl" if args.arquivo.lower().endswith((".jsonl", ".ndjson")) else "csv"
+    )
+    rows = (
+        iter_jsonl(args.arquivo)
+        if fmt == "jsonl"
+        else iter_csv(args.arquivo, args.delimitador)
+    )
+
+    def progress(st: Dict[str, float]) -> None:
+        print(
+            f"{int(st['rows']):>10} linhas  {int(st['applications_new']):>10} aplicações  "
+            f"{int(st['vehicles_new']):>7} veículos  {st['rows_per_s']:>9.0f} linhas/s"
+        )
+
+    with SqliteRepo(args.db) as repo:
+        repo.init_schema()
+        st = repo.bulk_import_applications(
+            rows,
+            batch_size=args.lote,
+            defer_indexes=not args.manter_indices,
+            progress=progress,
+        )
+    print(
+        f"Concluído: {int(st['rows'])} linhas em {st['seconds']:.1f}s "
+        f"({st['rows_per_s']:.0f} linhas/s); {int(st['vehicles_new'])} veículos e "
+        f"{int(st['applications_new'])} aplicações novos; "
+        f"{int(st['skipped'])} linhas ignoradas."
+    )
+
+
+if __name__ == "__main__":
+    main()
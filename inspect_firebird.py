@@ -42,9 +42,12 @@ def main():
     print("Tabela em uso:", table)
     print("Mapeamento de colunas:", mapping)
 
-    # lista primeiras colunas
-    cols = fb._table_columns(table)
+    # lista colunas (com tipo) a partir do catálogo de metadados
+    info = fb.catalog().table(table)
+    cols = [f"{c.name} {c.type_name}" for c in info.columns] if info else []
     print("Colunas (ordem):", cols)
+    if info and info.indices:
+        print("Índices:", {ix.name: ix.columns for ix in info.indices})
 
     # amostra das 5 primeiras linhas
     try:
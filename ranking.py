@@ -0,0 +1,74 @@
+# ranking.py
+"""
+Relevância dos resultados da busca, calculada sobre os candidatos já no cache:
+
+1. código ou código de barras igual ao termo digitado;
+2. código/código de barras começando pelo termo, ou descrição começando
+   pelos termos na ordem digitada;
+3. pontuação BM25 da descrição (IDF e tamanho médio tirados dos próprios
+   candidatos; cada termo casa tokens por prefixo, como no FTS).
+
+Empates ficam em ordem alfabética de descrição. A seleção dos `limit` melhores
+usa heap (O(n log k)), sem ordenar a lista inteira.
+"""
+
+import heapq
+import math
+from typing import Any, Dict, Iterable, List, Sequence
+
+from hot_catalog import fold, tokens
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TIER_EXACT = 2
+TIER_PREFIX = 1
+TIER_TEXT = 0
+
+
+def tier(query: str, terms: Sequence[str], row: Dict[str, Any]) -> int:
+    q = query.strip().lower()
+    codes = [str(row.get("codigo") or "").lower(), str(row.get("barras") or "").lower()]
+    if q and q in codes:
+        return TIER_EXACT
+    if q and any(c.startswith(q) for c in codes if c):
+        return TIER_PREFIX
+    desc = tokens(row.get("descricao") or "")
+    if terms and len(desc) >= len(terms):
+        if all(d.startswith(t) for d, t in zip(desc, terms)):
+            return TIER_PREFIX
+    return TIER_TEXT
+
+
+def bm25_scores(terms: Sequence[str], docs: List[List[str]]) -> List[float]:
+    """BM25 de cada documento (lista de tokens) para os termos (prefixos)."""
+    n = len(docs)
+    if not n or not terms:
+        return [0.0] * n
+    avgdl = sum(len(d) for d in docs) / n or 1.0
+    tfs = [[sum(1 for tok in d if tok.startswith(t)) for t in terms] for d in docs]
+    idf = []
+    for j in range(len(terms)):
+        df = sum(1 for tf in tfs if tf[j])
+        idf.append(math.log((n - df + 0.5) / (df + 0.5) + 1.0))
+    out = []
+    for d, tf in zip(docs, tfs):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(d) / avgdl)
+        out.append(
+            sum(idf[j] * f * (BM25_K1 + 1) / (f + norm) for j, f in enumerate(tf) if f)
+        )
+    return out
+
+
+def top_k(
+    query: str, rows: Iterable[Dict[str, Any]], limit: int
+) -> List[Dict[str, Any]]:
+    """Os `limit` candidatos mais relevantes para `query`, do melhor ao pior."""
+    rows = list(rows)
+    terms = tokens(query)
+    scores = bm25_scores(terms, [tokens(r.get("descricao") or "") for r in rows])
+    keyed = (
+        (-tier(query, terms, r), -s, fold(r.get("descricao") or ""), i)
+        for i, (r, s) in enumerate(zip(rows, scores))
+    )
+    return [rows[k[-1]] for k in heapq.nsmallest(int(limit), keyed)]
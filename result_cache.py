@@ -0,0 +1,235 @@
+# result_cache.py
+"""
+Cache LRU de resultados de busca do SearchService.
+
+A chave é o trio (produto, veículo, detalhe) normalizado (sem acento, caixa
+ou espaços extras) mais o limite. Cada entrada guarda duas coisas com validades
+independentes:
+
+- a lista de códigos (ranqueada), que só muda com o cache local;
+- os itens já enriquecidos (preço/estoque), que envelhecem mais rápido.
+
+`invalidate()` (chamado ao fim de um sync) descarta tudo. `MissCache` guarda
+os termos que o fallback no Firebird não achou.
+"""
+
+import configparser
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from hot_catalog import fold
+
+
+def normalize(text: str) -> str:
+    return " ".join(fold(text or "").split())
+
+
+@dataclass
+class CachedResult:
+    codes: List[str]
+    codes_ts: float
+    items: Optional[List[Dict[str, Any]]] = None
+    items_ts: float = 0.0
+    size: int = field(default=0, repr=False)
+
+
+def _estimate_size(codes: List[str], items: Optional[List[Dict[str, Any]]]) -> int:
+    size = sys.getsizeof(codes) + sum(sys.getsizeof(c) for c in codes)
+    for it in items or ():
+        size += sys.getsizeof(it) + sum(sys.getsizeof(v) for v in it.values())
+    return size
+
+
+class ResultCache:
+    def __init__(
+        self,
+        *,
+        codes_ttl: float = 300.0,
+        items_ttl: float = 30.0,
+        max_entries: int = 256,
+        max_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.codes_ttl = codes_ttl
+        self.items_ttl = items_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {
+            "hits": 0,
+            "code_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def key(
+        produto: str, veiculo: str, detalhe: str, limit: int, strict: bool = False
+    ) -> Tuple:
+        return (
+            normalize(produto),
+            normalize(veiculo),
+            normalize(detalhe),
+            int(limit),
+            bool(strict),
+        )
+
+    def get(self, key: Hashable) -> Tuple[Optional[List[str]], Optional[list]]:
+        """
+        (códigos, itens) da entrada: itens só se o enriquecimento estiver no
+        prazo, códigos só se a lista estiver no prazo; (None, None) = miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry.codes_ts > self.codes_ttl:
+                if entry is not None:
+                    self._drop(key)
+                self.stats["misses"] += 1
+                return None, None
+            self._entries.move_to_end(key)
+            if entry.items is not None and now - entry.items_ts <= self.items_ttl:
+                self.stats["hits"] += 1
+                return entry.codes, [dict(i) for i in entry.items]
+            self.stats["code_hits"] += 1
+            return entry.codes, None
+
+    def put(
+        self,
+        key: Hashable,
+        codes: List[str],
+        items: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            old = self._entries.get(key)
+            codes_ts = old.codes_ts if old is not None and old.codes == codes else now
+            if old is not None:
+                self._drop(key)
+            entry = CachedResult(
+                codes=list(codes),
+                codes_ts=codes_ts,
+                items=[dict(i) for i in items] if items is not None else None,
+                items_ts=now,
+                size=_estimate_size(codes, items),
+            )
+            if entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.stats["invalidations"] += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            out = dict(self.stats)
+            out["entries"] = len(self._entries)
+            out["bytes"] = self._bytes
+        lookups = out["hits"] + out["code_hits"] + out["misses"]
+        out["hit_ratio"] = (
+            (out["hits"] + out["code_hits"]) / lookups if lookups else 0.0
+        )
+        return out
+
+
+def build_result_cache(config: configparser.ConfigParser) -> Optional[ResultCache]:
+    """Cache de resultados conforme `[app]` (result_cache_itens = 0 desliga)."""
+    app = config["app"] if config.has_section("app") else {}
+    max_entries = int(app.get("result_cache_itens", 256))
+    if max_entries <= 0:
+        return None
+    return ResultCache(
+        codes_ttl=float(app.get("result_cache_ttl_codigos", 300)),
+        items_ttl=float(app.get("result_cache_ttl_precos", 30)),
+        max_entries=max_entries,
+        max_bytes=int(float(app.get("result_cache_mb", 16)) * 1024 * 1024),
+    )
+
+
+class MissCache:
+    """
+    Termos que o fallback no Firebird não encontrou, por `ttl` segundos. A busca
+    solta é por "contém", então um termo que começa por um termo sem resultado
+    ("xyz" -> "xyzw", "xyz 12") também fica sem resultado.
+    """
+
+    def __init__(self, *, ttl: float = 60.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._misses: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {
+            "hits": 0,
+            "misses": 0,
+            "stored": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _key(term: str) -> str:
+        # sem mudar caixa/acentos: LIKE no código diferencia maiúsculas
+        return " ".join(term.split())
+
+    def known_miss(self, term: str) -> bool:
+        term = self._key(term)
+        now = time.time()
+        with self._lock:
+            for i in range(1, len(term) + 1):
+                expires = self._misses.get(term[:i])
+                if expires is None:
+                    continue
+                if expires < now:
+                    del self._misses[term[:i]]
+                    continue
+                self.stats["hits"] += 1
+                return True
+            self.stats["misses"] += 1
+            return False
+
+    def add(self, term: str) -> None:
+        term = self._key(term)
+        if not term:
+            return
+        with self._lock:
+            self._misses.pop(term, None)
+            self._misses[term] = time.time() + self.ttl
+            self.stats["stored"] += 1
+            while len(self._misses) > self.max_entries:
+                self._misses.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._misses.clear()
+            self.stats["invalidations"] += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            out = dict(self.stats)
+            out["entries"] = len(self._misses)
+        return out
+
+
+def build_miss_cache(config: configparser.ConfigParser) -> Optional[MissCache]:
+    """Cache de termos sem resultado no Firebird (fallback_miss_ttl = 0 desliga)."""
+    app = config["app"] if config.has_section("app") else {}
+    ttl = float(app.get("fallback_miss_ttl", 60))
+    if ttl <= 0:
+        return None
+    return MissCache(ttl=ttl, max_entries=int(app.get("fallback_miss_itens", 1024)))
@@ -1,77 +1,433 @@
-from typing import Any, Dict, List, Set
+import asyncio
+import configparser
+import contextlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 from firebird_client import FirebirdClient
-from sqlite_repo import SqliteRepo
+from hot_catalog import HotCatalog, text_matches
+from ranking import top_k
+from result_cache import MissCache, ResultCache, normalize
+from sqlite_repo import CACHE_FIELDS, SLOW_FIELDS, VOLATILE_FIELDS, SqliteRepo
+
+# validade (segundos) de cada campo do cache antes de reler do Firebird
+DEFAULT_TTLS: Dict[str, float] = {
+    **{f: 86400.0 for f in SLOW_FIELDS},
+    "preco": 600.0,
+    "estoque": 120.0,
+}
+
+# linhas exibidas por busca e quantos candidatos (múltiplo do limite) entram
+# no ranking antes de enriquecer só os que vão para a tela
+DEFAULT_LIMIT = 100
+RANK_POOL_FACTOR = 5
+
+# buscas do fallback em paralelo (produto, veículo e releitura dos locais);
+# no máximo metade do pool: o resto fica para as sessões de busca, o
+# enriquecimento, o sync e a descoberta de tabelas
+FALLBACK_WORKERS = 3
+
+
+def cache_ttls(config: configparser.ConfigParser) -> Dict[str, float]:
+    """
+    TTLs do `[app]`: ttl_cadastro (barras, fornecedor, marca, grupo, subgrupo),
+    ttl_preco, ttl_estoque e, por campo, ttl_<campo>.
+    """
+    app = config["app"] if config.has_section("app") else {}
+    ttls = dict(DEFAULT_TTLS)
+    if app.get("ttl_cadastro"):
+        for f in SLOW_FIELDS:
+            ttls[f] = float(app["ttl_cadastro"])
+    for f in CACHE_FIELDS:
+        if app.get(f"ttl_{f}"):
+            ttls[f] = float(app[f"ttl_{f}"])
+    return ttls
 
 
 class SearchService:
-    def __init__(self, repo: SqliteRepo, fb: FirebirdClient):
+    def __init__(
+        self,
+        repo: SqliteRepo,
+        fb: FirebirdClient,
+        ttls: Optional[Dict[str, float]] = None,
+        catalog: Optional[HotCatalog] = None,
+        results: Optional[ResultCache] = None,
+        misses: Optional[MissCache] = None,
+    ):
         self.repo = repo
         self.fb = fb
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        # catálogo em memória (opcional): busca só por produto sem ir ao SQLite
+        self.catalog = catalog
+        # cache LRU de resultados por (produto, veículo, detalhe) normalizados
+        self.results = results
+        # termos sem resultado no fallback do Firebird (não repete a varredura)
+        self.misses = misses
+        # muda a cada invalidação; sessões de digitação descartam o que têm
+        self.generation = 0
+        # enriquecimento em segundo plano (buscas com on_enriched)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # buscas do fallback no Firebird (criado no 1º uso, fechado em close())
+        self._fallback_executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
 
-    def search(self, produto: str, veiculo: str, detalhe: str = "") -> Dict[str, Any]:
+    def search(
+        self,
+        produto: str,
+        veiculo: str,
+        detalhe: str = "",
+        limit: int = DEFAULT_LIMIT,
+        *,
+        strict: bool = False,
+        on_enriched: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ) -> Dict[str, Any]:
         """Busca independente por cada campo e cruza apenas se ambos estiverem preenchidos.
 
         Estratégia:
         - Primeiro tenta o cache (SQLite) para rapidez.
         - Se nada for encontrado para um termo, faz fallback para o Firebird (pesquisa solta).
         - Se os dois campos tiverem conteúdo, intersecta os códigos; caso contrário usa o conjunto do campo preenchido.
+        - Ordena por relevância (ranking.py) e só enriquece os `limit` primeiros.
+
+        Os fallbacks no Firebird dos dois campos rodam em paralelo. Com
+        `strict=True`, um campo preenchido sem resultado zera a busca (em vez
+        de valer só o outro campo) e o outro lado deixa de ser esperado.
+
+        Com `on_enriched`, volta na hora com descrição e valores do cache; o
+        que venceu (preço, estoque, cadastro) é relido em segundo plano e a
+        lista completa chega por `on_enriched`. O Future fica em "pending"
+        (None se nada precisou ser relido).
+        """
+        with self._read_session():
+            return self._search(produto, veiculo, detalhe, limit, strict, on_enriched)
+
+    async def search_async(
+        self,
+        produto: str,
+        veiculo: str,
+        detalhe: str = "",
+        limit: int = DEFAULT_LIMIT,
+        *,
+        strict: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        `search` para quem já roda um event loop: a busca vai para uma thread
+        e o loop segue livre. Cancelar a task libera quem espera e para os
+        fallbacks no Firebird antes da próxima consulta (a que já está no
+        servidor termina em segundo plano).
+        """
+        cancel = threading.Event()
+
+        def run() -> Dict[str, Any]:
+            with self._read_session():
+                return self._search(
+                    produto, veiculo, detalhe, limit, strict, cancel=cancel
+                )
+
+        try:
+            return await asyncio.to_thread(run)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    def _read_session(self, should_stop: Optional[Callable[[], bool]] = None):
+        # todas as leituras no Firebird desta busca numa só transação read-only
+        session = getattr(self.fb, "read_session", None)
+        if session is None:
+            return contextlib.nullcontext()
+        return session(should_stop=should_stop) if should_stop else session()
+
+    def _fb_codes(self, term: str, limit: int = 200) -> Set[str]:
+        """
+        Fallback: busca direta no Firebird, alimentando o cache com o que achar.
+        Só uma busca concluída sem resultado vira "miss" (falhas sobem), e não
+        se houve sync no meio: o termo pode ter chegado nele.
         """
+        if self.misses is not None and self.misses.known_miss(term):
+            return set()
+        generation = self.generation
+        fb_items = self.fb.search_products_loose(produto=term, limit=limit)
+        if not fb_items and self.misses is not None and self.generation == generation:
+            self.misses.add(term)
+        # alimente o cache com o que achou para acelerar próximas buscas
+        if fb_items:
+            rows = [
+                {"codigo": i["codigo"], "descricao": i["descricao"]} for i in fb_items
+            ]
+            try:
+                self.repo.upsert_products(rows)
+            except Exception:
+                pass
+            if self.catalog is not None:
+                self.catalog.upsert(rows)
+        return {i["codigo"] for i in fb_items}
+
+    def _search(
+        self,
+        produto: str,
+        veiculo: str,
+        detalhe: str,
+        limit: int,
+        strict: bool,
+        on_enriched: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        *,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        key = None
+        codes = None
+        cached = None
+        # um sync no meio da busca invalida o cache: o resultado não é guardado
+        generation = self.generation
+        if self.results is not None:
+            key = self.results.key(produto, veiculo, detalhe, limit, strict)
+            codes, items = self.results.get(key)
+            if items is not None:
+                return {"items": items, "count": len(items)}
+            # lista de códigos ainda válida: só refaz o enriquecimento
+        if codes is None:
+            codes, cached = self._find_codes(
+                produto, veiculo, detalhe, limit, strict, cancel=cancel
+            )
+        if cancel is not None and cancel.is_set():
+            return {"items": [], "count": 0}  # ninguém espera mais a resposta
+
+        def store(items: List[Dict[str, Any]]) -> None:
+            if key is not None and self.generation == generation:
+                self.results.put(key, codes, items)
+
+        if on_enriched is None:
+            items = self._enrich(codes, cached)
+            store(items)
+            return {"items": items, "count": len(items)}
+
+        def deliver(items: List[Dict[str, Any]]) -> None:
+            store(items)
+            on_enriched(items)
+
+        items, pending = self._enrich_later(codes, cached, deliver)
+        if pending is None:
+            store(items)
+        return {"items": items, "count": len(items), "pending": pending}
 
-        def codes_for_term(term: str) -> Set[str]:
-            term = term.strip()
-            if not term:
-                return set()
-            # tenta cache
-            cached = self.repo.search_products_cache(term, limit=500)
-            codes = {p["codigo"] for p in cached}
-            if codes:
-                return codes
-            # fallback: busca direta no Firebird
-            fb_items = self.fb.search_products_loose(produto=term, limit=200)
-            # alimente o cache com o que achou para acelerar próximas buscas
-            if fb_items:
-                try:
-                    self.repo.upsert_products(
-                        [
-                            {"codigo": i["codigo"], "descricao": i["descricao"]}
-                            for i in fb_items
-                        ]
-                    )
-                except Exception:
-                    pass
-            return {i["codigo"] for i in fb_items}
-
-        # conjuntos independentes para cada campo
-        codigos_prod = codes_for_term(produto)
-        codigos_apl = codes_for_term((veiculo + " " + detalhe).strip())
-
-        if codigos_prod and codigos_apl:
-            final_codes = list(codigos_prod.intersection(codigos_apl))
-        elif codigos_prod:
-            final_codes = list(codigos_prod)
-        elif codigos_apl:
-            final_codes = list(codigos_apl)
+    def _find_codes(
+        self,
+        produto: str,
+        veiculo: str,
+        detalhe: str,
+        limit: int,
+        strict: bool = False,
+        *,
+        cancel: Optional[threading.Event] = None,
+    ) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+        """Códigos a exibir (ranqueados) e as linhas do cache lidas para o ranking."""
+        rows, _ = self._candidates(
+            produto, veiculo, detalhe, limit, strict, cancel=cancel
+        )
+        termo = produto.strip() or (veiculo + " " + detalhe).strip()
+        ranked = [r["codigo"] for r in top_k(termo, rows, limit)]
+        return ranked, {r["codigo"]: r for r in rows if "descricao" in r}
+
+    def _candidates(
+        self,
+        produto: str,
+        veiculo: str,
+        detalhe: str,
+        limit: int,
+        strict: bool = False,
+        *,
+        cancel: Optional[threading.Event] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Todos os candidatos ao ranking (linhas do cache; só o código se o
+        produto não estiver lá) e se o conjunto está completo: False quando
+        o limite de candidatos cortou a lista ou um lado veio do Firebird.
+        `cancel` (busca abandonada) interrompe os fallbacks no Firebird.
+        """
+        termo_prod = produto.strip()
+        termo_veic = (veiculo + " " + detalhe).strip()
+        pool = max(int(limit), 1) * RANK_POOL_FACTOR
+
+        if self.catalog is not None and self.catalog.loaded and not termo_veic:
+            final_codes = [r["codigo"] for r in self.catalog.search(termo_prod, pool)]
+            achou_prod, achou_veic = bool(final_codes), False
         else:
-            return {"items": [], "count": 0}
+            # os dois lados (e o cruzamento) numa consulta indexada no SQLite
+            final_codes, achou_prod, achou_veic = self.repo.search_codes(
+                termo_prod, termo_veic, limit=pool
+            )
+        complete = len(final_codes) < pool
+
+        # lado sem resultado no cache: Firebird, cruzando com o outro lado
+        falta_prod = bool(termo_prod) and not achou_prod
+        falta_veic = bool(termo_veic) and not achou_veic
+        if falta_prod or falta_veic:
+            complete = False
+            codigos_prod, codigos_apl = self._fallback(
+                termo_prod if falta_prod else None,
+                termo_veic if falta_veic else None,
+                final_codes,
+                pool,
+                limit,
+                strict,
+                cancel,
+            )
+            if strict and termo_prod and termo_veic:
+                final_codes = list(codigos_prod & codigos_apl)
+            elif codigos_prod and codigos_apl:
+                final_codes = list(codigos_prod.intersection(codigos_apl))
+            else:
+                final_codes = list(codigos_prod or codigos_apl)
+
+        if not final_codes:
+            return [], complete
+
+        # ranking com o que já está no cache; só os exibidos vão ao Firebird
+        cached = {p["codigo"]: p for p in self.repo.get_products_by_codes(final_codes)}
+        return [cached.get(c) or {"codigo": c} for c in final_codes], complete
+
+    def _fallback(
+        self,
+        termo_prod: Optional[str],
+        termo_veic: Optional[str],
+        local: List[str],
+        pool: int,
+        limit: int,
+        strict: bool,
+        cancel: Optional[threading.Event] = None,
+    ) -> Tuple[Set[str], Set[str]]:
+        """
+        Conjuntos (produto, veículo) quando o cache não respondeu um lado (termo
+        informado = buscar no Firebird; None = usa `local`). As buscas no
+        Firebird rodam em paralelo e, enquanto isso, os melhores candidatos do
+        lado local já têm preço/estoque relidos. Um lado cuja busca falhou
+        recebe o conjunto do outro lado (vale só o outro).
+
+        Em modo estrito, o primeiro lado vazio já decide (resultado vazio): o
+        outro lado para antes da próxima consulta ao Firebird. Fora dele, um
+        lado vazio não zera a busca (vale o outro) e os dois são esperados.
+        `cancel` (busca abandonada) também para os dois lados.
+
+        Cada tarefa paralela usa uma conexão do pool; se o pool não comporta
+        isso (ver `_fallback_pool`), os lados rodam em sequência na sessão de
+        quem busca.
+        """
+        sets = {"prod": set(local), "veic": set(local)}
+        terms = {"prod": termo_prod, "veic": termo_veic}
+        sides = [side for side, term in terms.items() if term is not None]
+        failed: Set[str] = set()
+        stop = threading.Event()
+
+        def stopped() -> bool:
+            return stop.is_set() or (cancel is not None and cancel.is_set())
+
+        def result() -> Tuple[Set[str], Set[str]]:
+            for side in failed:
+                sets[side] = sets["veic" if side == "prod" else "prod"]
+            return sets["prod"], sets["veic"]
+
+        ex = self._fallback_pool()
+        if ex is None:
+            for side in sides:
+                found = self._fb_side(terms[side], pool, stopped)
+                if found is None:
+                    failed.add(side)
+                    continue
+                sets[side] = found
+                if strict and not found:
+                    return set(), set()
+            return result()
+
+        jobs = {ex.submit(self._fb_side, terms[s], pool, stopped): s for s in sides}
+        # o resultado final sai destes códigos (ou é igual a eles)
+        warm = ex.submit(self._warm, local[:limit]) if local else None
+        pending = set(jobs)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    found = f.result()
+                    if found is None:
+                        failed.add(jobs[f])
+                        continue
+                    sets[jobs[f]] = found
+                    if strict and not found:
+                        return set(), set()
+            if warm is not None:
+                wait([warm])  # evita reler os mesmos códigos no enriquecimento
+        finally:
+            # saída antecipada: o que não começou não roda; o lado que já roda
+            # para antes da próxima consulta e devolve a vaga e a conexão
+            if pending:
+                stop.set()
+            for f in [*pending, warm]:
+                if f is not None:
+                    f.cancel()
+        return result()
+
+    def _fb_side(
+        self, term: str, limit: int, stopped: Callable[[], bool]
+    ) -> Optional[Set[str]]:
+        """
+        Um lado do fallback; None se o Firebird falhou (vale o outro lado) ou
+        se `stopped()` interrompeu a busca.
+        """
+        if stopped():
+            return None
+        try:
+            # numa thread do pool: transação (e conexão) própria, uma só
+            with self._read_session(stopped):
+                return self._fb_codes(term, limit)
+        except Exception as e:
+            if not stopped():
+                print(f"[WARN] Fallback no Firebird falhou para '{term}': {e}")
+            return None
 
-        # enriquecer com descrições do cache (ou vazio se não houver)
-        produtos_info = {
-            p["codigo"]: p for p in self.repo.get_products_by_codes(final_codes)
-        }
-        # Buscar dados completos diretamente do Firebird (inclui extras quando disponíveis)
-        full = self.fb.fetch_full_by_codes(final_codes)
+    def _warm(self, codes: List[str]) -> None:
+        # releitura antecipada; se falhar, o enriquecimento relê depois
+        with self._read_session():
+            self._refresh_stale(codes)
 
+    def _fallback_pool(self) -> Optional[ThreadPoolExecutor]:
+        """
+        Executor do fallback, ou None para rodar em sequência (pool pequeno).
+        Usa até metade do pool: com POOL_SIZE=4, duas buscas no Firebird ao
+        mesmo tempo, sem esgotar as conexões de quem enriquece ou sonda.
+        """
+        size = getattr(self.fb, "pool_size", 0)
+        workers = FALLBACK_WORKERS if size <= 0 else min(FALLBACK_WORKERS, size // 2)
+        if workers < 2:
+            return None
+        with self._lock:
+            if self._fallback_executor is None:
+                self._fallback_executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="busca"
+                )
+            return self._fallback_executor
+
+    def _enrich(
+        self,
+        codes: List[str],
+        cached: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        if not codes:
+            return []
+        # só campos vencidos (TTL) são relidos do Firebird
+        return self._items_from(codes, self._refresh_stale(codes, cached))
+
+    @staticmethod
+    def _items_from(
+        codes: List[str], produtos_info: Dict[str, Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
         items: List[Dict[str, Any]] = []
-        for code in final_codes:
-            desc = produtos_info.get(code, {}).get(
-                "descricao", "(sem descrição no cache)"
-            )
-            sp = full.get(code, {})
+        for code in codes:
+            sp = produtos_info.get(code, {})
             items.append(
                 {
                     "codigo": code,
-                    "descricao": sp.get("descricao", desc),
+                    "descricao": sp.get("descricao") or "(sem descrição no cache)",
                     "estoque": sp.get("estoque"),
                     "preco": sp.get("preco"),
                     "fornecedor": sp.get("fornecedor"),
@@ -80,5 +436,294 @@ class SearchService:
                     "subgrupo": sp.get("subgrupo"),
                 }
             )
-        items.sort(key=lambda x: (x["descricao"] or "").lower())
-        return {"items": items, "count": len(items)}
+        return items
+
+    def _enrich_later(
+        self,
+        codes: List[str],
+        cached: Optional[Dict[str, Dict[str, Any]]],
+        on_enriched: Callable[[List[Dict[str, Any]]], None],
+    ) -> Tuple[List[Dict[str, Any]], Optional[Future]]:
+        """
+        Itens com o que o cache tem agora e, se algo venceu, um Future do
+        enriquecimento rodando em segundo plano; ao terminar, `on_enriched`
+        recebe a lista completa (na thread de trabalho).
+        """
+        if cached is None:
+            cached = {p["codigo"]: p for p in self.repo.get_products_by_codes(codes)}
+        items = self._items_from(codes, cached)
+        need_full, need_price = self._stale_codes(codes, cached)
+        if not need_full and not need_price:
+            return items, None
+
+        def run() -> List[Dict[str, Any]]:
+            enriched = self._enrich(codes, cached)
+            try:
+                on_enriched(enriched)
+            except Exception as e:
+                print(f"[WARN] Falha ao entregar o enriquecimento: {e}")
+            return enriched
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="enriquecer"
+                )
+            return items, self._executor.submit(run)
+
+    def close(self) -> None:
+        """Encerra as threads do fallback e do enriquecimento (se houver)."""
+        with self._lock:
+            executors = [self._executor, self._fallback_executor]
+            self._executor = self._fallback_executor = None
+        for ex in executors:
+            if ex is not None:
+                ex.shutdown(wait=False, cancel_futures=True)
+
+    def type_ahead(self, enrich_ttl: float = 30.0) -> "TypeAheadSession":
+        """Sessão de busca enquanto se digita (ver TypeAheadSession)."""
+        return TypeAheadSession(self, enrich_ttl=enrich_ttl)
+
+    def invalidate_cache(self) -> None:
+        """Descarta os resultados guardados (o cache local mudou, ex.: após sync)."""
+        self.generation += 1
+        if self.results is not None:
+            self.results.invalidate()
+        if self.misses is not None:
+            self.misses.invalidate()
+
+    def cache_stats(self) -> Dict[str, float]:
+        out = self.results.snapshot() if self.results is not None else {}
+        if self.misses is not None:
+            out.update({f"fallback_{k}": v for k, v in self.misses.snapshot().items()})
+        return out
+
+    def _is_stale(self, row: Dict[str, Any], fields: Iterable[str], now: float) -> bool:
+        for f in fields:
+            ts = row.get(f"{f}_ts")
+            if ts is None or now - ts > self.ttls.get(f, 0.0):
+                return True
+        return False
+
+    def _stale_codes(
+        self, codes: List[str], rows: Dict[str, Dict[str, Any]]
+    ) -> Tuple[List[str], List[str]]:
+        """(cadastro vencido ou fora do cache, só preço/estoque vencidos)."""
+        now = time.time()
+        need_full = [
+            c
+            for c in codes
+            if c not in rows or self._is_stale(rows[c], SLOW_FIELDS, now)
+        ]
+        full_set = set(need_full)
+        need_price = [
+            c
+            for c in codes
+            if c not in full_set and self._is_stale(rows[c], VOLATILE_FIELDS, now)
+        ]
+        return need_full, need_price
+
+    def _refresh_stale(
+        self, codes: List[str], rows: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Lê os produtos do cache (ou usa `rows`, já lidas) e atualiza só o que
+        venceu: cadastro vencido (ou produto fora do cache) vai por
+        `fetch_full_by_codes`; apenas preço/estoque vencidos, por
+        `fetch_stock_price_by_codes`. Se o Firebird falhar, devolve o que
+        houver no cache.
+        """
+        if rows is None:
+            rows = {p["codigo"]: p for p in self.repo.get_products_by_codes(codes)}
+        need_full, need_price = self._stale_codes(codes, rows)
+        if not need_full and not need_price:
+            return rows
+
+        try:
+            if need_full:
+                full = self.fb.fetch_full_by_codes(need_full)
+                fresh = [
+                    {
+                        **data,
+                        "codigo": code,
+                        "descricao": data.get("descricao")
+                        or rows.get(code, {}).get("descricao")
+                        or "",
+                    }
+                    for code, data in full.items()
+                ]
+                self.repo.upsert_products(fresh)
+                if self.catalog is not None:
+                    self.catalog.upsert(fresh)
+            if need_price:
+                sp = self.fb.fetch_stock_price_by_codes(need_price)
+                self.repo.update_product_fields(
+                    [{"codigo": code, **data} for code, data in sp.items()]
+                )
+        except Exception as e:
+            print(f"[WARN] Firebird indisponível, usando dados do cache: {e}")
+            return rows
+        return {p["codigo"]: p for p in self.repo.get_products_by_codes(codes)}
+
+
+@dataclass
+class _Candidates:
+    produto: str
+    veiculo: str
+    rows: List[Dict[str, Any]]
+    generation: int
+
+
+def _extends(old: str, new: str) -> bool:
+    """`new` só pode achar um subconjunto do que `old` achou."""
+    if not new.startswith(old):
+        return False
+    # fragmento de código (termo único de 3+ letras) acha códigos que o
+    # prefixo mais curto não achava
+    return not _uses_fragment(new) or _uses_fragment(old)
+
+
+def _uses_fragment(q: str) -> bool:
+    return len(q) >= 3 and len(q.split()) == 1
+
+
+class TypeAheadSession:
+    """
+    Busca enquanto se digita: quando o produto digitado só estende o anterior
+    ("filt" -> "filtr") e veículo/detalhe não mudaram, filtra em memória os
+    candidatos da busca anterior em vez de voltar ao índice. Só vale se aquele
+    conjunto estava completo (sem corte pelo limite nem resultado do
+    Firebird). Itens já enriquecidos há menos de `enrich_ttl` segundos são
+    reaproveitados.
+    """
+
+    def __init__(self, service: SearchService, enrich_ttl: float = 30.0):
+        self.service = service
+        self.enrich_ttl = enrich_ttl
+        self._base: Optional[_Candidates] = None
+        self._items: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.stats: Dict[str, int] = {"refined": 0, "full": 0, "items_reused": 0}
+        # o enriquecimento progressivo grava _items na thread de trabalho
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        self._base = None
+        with self._lock:
+            self._items.clear()
+
+    def search(
+        self,
+        produto: str,
+        veiculo: str,
+        detalhe: str = "",
+        limit: int = DEFAULT_LIMIT,
+        *,
+        on_enriched: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ) -> Dict[str, Any]:
+        """Como `SearchService.search` (inclusive o modo progressivo)."""
+        with self.service._read_session():
+            return self._search(produto, veiculo, detalhe, limit, on_enriched)
+
+    def _search(
+        self,
+        produto: str,
+        veiculo: str,
+        detalhe: str,
+        limit: int,
+        on_enriched: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ) -> Dict[str, Any]:
+        generation = self.service.generation
+        results = self.service.results
+        key = results.key(produto, veiculo, detalhe, limit) if results else None
+        if results is not None:
+            codes, items = results.get(key)
+            if items is not None:
+                return {"items": items, "count": len(items)}
+
+        prod = normalize(produto)
+        veic = normalize(veiculo + " " + detalhe)
+        if self._base is not None and self._base.generation != generation:
+            self.reset()
+        base = self._base
+        rows = None
+        if (
+            base is not None
+            and prod
+            and base.veiculo == veic
+            and _extends(base.produto, prod)
+        ):
+            rows = [
+                r
+                for r in base.rows
+                if text_matches(prod, r["codigo"], r.get("descricao"), r.get("barras"))
+            ]
+            # nada sobrou: o índice decide (pode cair no Firebird)
+            rows = rows or None
+        with self._lock:
+            self.stats["refined" if rows is not None else "full"] += 1
+        if rows is not None:
+            self._base = _Candidates(prod, veic, rows, generation)
+        else:
+            rows, complete = self.service._candidates(produto, veiculo, detalhe, limit)
+            self._base = (
+                _Candidates(prod, veic, rows, generation) if complete and rows else None
+            )
+
+        termo = produto.strip() or (veiculo + " " + detalhe).strip()
+        codes = [r["codigo"] for r in top_k(termo, rows, limit)]
+
+        def store(items: List[Dict[str, Any]]) -> None:
+            if results is not None and self.service.generation == generation:
+                results.put(key, codes, items)
+
+        if on_enriched is None:
+            items, _ = self._enrich(codes, rows)
+            store(items)
+            return {"items": items, "count": len(items)}
+
+        def deliver(items: List[Dict[str, Any]]) -> None:
+            store(items)
+            on_enriched(items)
+
+        items, pending = self._enrich(codes, rows, deliver)
+        if pending is None:
+            store(items)
+        return {"items": items, "count": len(items), "pending": pending}
+
+    def _enrich(
+        self,
+        codes: List[str],
+        rows: List[Dict[str, Any]],
+        on_enriched: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Future]]:
+        now = time.time()
+        wanted = set(codes)
+        with self._lock:
+            self._items = {
+                c: v for c, v in self._items.items() if now - v[0] <= self.enrich_ttl
+            }
+            fresh = {c: it for c, (_, it) in self._items.items() if c in wanted}
+            missing = [c for c in codes if c not in fresh]
+            self.stats["items_reused"] += len(codes) - len(missing)
+            if not missing:
+                return [dict(fresh[c]) for c in codes], None
+        cached = {r["codigo"]: r for r in rows if "descricao" in r}
+
+        def keep(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            ts = time.time()
+            with self._lock:
+                for it in items:
+                    fresh[it["codigo"]] = it
+                    self._items[it["codigo"]] = (ts, it)
+                return [dict(fresh[c]) for c in codes]
+
+        if on_enriched is None:
+            return keep(self.service._enrich(missing, cached)), None
+        partial, pending = self.service._enrich_later(
+            missing, cached, lambda items: on_enriched(keep(items))
+        )
+        if pending is None:
+            return keep(partial), None
+        with self._lock:
+            merged = dict(fresh, **{it["codigo"]: it for it in partial})
+        return [dict(merged[c]) for c in codes], pending
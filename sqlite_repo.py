@@ -1,11 +1,32 @@
+import re
 import sqlite3
-from typing import Any, Dict, List, Optional
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from vehicle_query import parse_vehicle_query, vehicle_where
 
 SCHEMA = """
 PRAGMA journal_mode=WAL;
 CREATE TABLE IF NOT EXISTS produtos_cache (
     codigo TEXT PRIMARY KEY,
-    descricao TEXT NOT NULL
+    descricao TEXT NOT NULL,
+    barras TEXT,
+    preco REAL,
+    estoque REAL,
+    fornecedor TEXT,
+    marca TEXT,
+    grupo TEXT,
+    subgrupo TEXT,
+    -- quando cada campo foi lido do Firebird (epoch, segundos)
+    barras_ts REAL,
+    preco_ts REAL,
+    estoque_ts REAL,
+    fornecedor_ts REAL,
+    marca_ts REAL,
+    grupo_ts REAL,
+    subgrupo_ts REAL
 );
 CREATE INDEX IF NOT EXISTS idx_produtos_cache_desc ON produtos_cache(descricao);
 CREATE INDEX IF NOT EXISTS idx_produtos_cache_codigo ON produtos_cache(codigo);
@@ -22,6 +43,7 @@ CREATE INDEX IF NOT EXISTS idx_veic_compacto ON veiculos(marca, modelo, ano_inic
 CREATE INDEX IF NOT EXISTS idx_veic_marca ON veiculos(marca);
 CREATE INDEX IF NOT EXISTS idx_veic_modelo ON veiculos(modelo);
 CREATE INDEX IF NOT EXISTS idx_veic_motor ON veiculos(motor);
+CREATE INDEX IF NOT EXISTS idx_veic_anos ON veiculos(ano_inicio, ano_fim);
 
 CREATE TABLE IF NOT EXISTS aplicacoes (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -38,22 +60,301 @@ CREATE TABLE IF NOT EXISTS meta (
 );
 """
 
+# Índice de texto (FTS5) sobre produtos_cache, mantido por triggers. O
+# tokenizer unicode61 com remove_diacritics 2 ignora acentos e caixa
+# ("oleo" encontra "ÓLEO").
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS produtos_fts USING fts5(
+    codigo, descricao,
+    content='produtos_cache', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS produtos_fts_ai AFTER INSERT ON produtos_cache BEGIN
+    INSERT INTO produtos_fts(rowid, codigo, descricao)
+    VALUES (new.rowid, new.codigo, new.descricao);
+END;
+CREATE TRIGGER IF NOT EXISTS produtos_fts_ad AFTER DELETE ON produtos_cache BEGIN
+    INSERT INTO produtos_fts(produtos_fts, rowid, codigo, descricao)
+    VALUES ('delete', old.rowid, old.codigo, old.descricao);
+END;
+CREATE TRIGGER IF NOT EXISTS produtos_fts_au
+AFTER UPDATE OF codigo, descricao ON produtos_cache BEGIN
+    INSERT INTO produtos_fts(produtos_fts, rowid, codigo, descricao)
+    VALUES ('delete', old.rowid, old.codigo, old.descricao);
+    INSERT INTO produtos_fts(rowid, codigo, descricao)
+    VALUES (new.rowid, new.codigo, new.descricao);
+END;
+"""
+
+# Índice de substring (FTS5 trigram) sobre código e código de barras: acha
+# "1234" dentro de "VW-0281234A". Separado do índice de palavras acima.
+CODE_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS produtos_codigo_fts USING fts5(
+    codigo, barras,
+    content='produtos_cache', content_rowid='rowid',
+    tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS produtos_codigo_fts_ai
+AFTER INSERT ON produtos_cache BEGIN
+    INSERT INTO produtos_codigo_fts(rowid, codigo, barras)
+    VALUES (new.rowid, new.codigo, new.barras);
+END;
+CREATE TRIGGER IF NOT EXISTS produtos_codigo_fts_ad
+AFTER DELETE ON produtos_cache BEGIN
+    INSERT INTO produtos_codigo_fts(produtos_codigo_fts, rowid, codigo, barras)
+    VALUES ('delete', old.rowid, old.codigo, old.barras);
+END;
+CREATE TRIGGER IF NOT EXISTS produtos_codigo_fts_au
+AFTER UPDATE OF codigo, barras ON produtos_cache BEGIN
+    INSERT INTO produtos_codigo_fts(produtos_codigo_fts, rowid, codigo, barras)
+    VALUES ('delete', old.rowid, old.codigo, old.barras);
+    INSERT INTO produtos_codigo_fts(rowid, codigo, barras)
+    VALUES (new.rowid, new.codigo, new.barras);
+END;
+"""
+
+# Tokens de marca/modelo/motor dos veículos. O '.' faz parte do token para
+# que cilindradas ("1.6") sejam um termo só.
+VEHICLE_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS veiculos_fts USING fts5(
+    marca, modelo, motor,
+    content='veiculos', content_rowid='id',
+    tokenize="unicode61 remove_diacritics 2 tokenchars '.'"
+);
+CREATE TRIGGER IF NOT EXISTS veiculos_fts_ai AFTER INSERT ON veiculos BEGIN
+    INSERT INTO veiculos_fts(rowid, marca, modelo, motor)
+    VALUES (new.id, new.marca, new.modelo, new.motor);
+END;
+CREATE TRIGGER IF NOT EXISTS veiculos_fts_ad AFTER DELETE ON veiculos BEGIN
+    INSERT INTO veiculos_fts(veiculos_fts, rowid, marca, modelo, motor)
+    VALUES ('delete', old.id, old.marca, old.modelo, old.motor);
+END;
+CREATE TRIGGER IF NOT EXISTS veiculos_fts_au
+AFTER UPDATE OF marca, modelo, motor ON veiculos BEGIN
+    INSERT INTO veiculos_fts(veiculos_fts, rowid, marca, modelo, motor)
+    VALUES ('delete', old.id, old.marca, old.modelo, old.motor);
+    INSERT INTO veiculos_fts(rowid, marca, modelo, motor)
+    VALUES (new.id, new.marca, new.modelo, new.motor);
+END;
+"""
+
+FTS_INDEXES = {
+    "produtos_fts": FTS_SCHEMA,
+    "produtos_codigo_fts": CODE_FTS_SCHEMA,
+    "veiculos_fts": VEHICLE_FTS_SCHEMA,
+}
+
+# Índices secundários removidos durante a importação em lote e recriados no fim
+# (o índice único de aplicações fica: é ele que descarta pares repetidos).
+BULK_DEFERRED_INDEXES = (
+    "idx_veic_compacto",
+    "idx_veic_marca",
+    "idx_veic_modelo",
+    "idx_veic_motor",
+    "idx_veic_anos",
+    "idx_apl_codigo",
+    "idx_apl_veic",
+)
+
+# Campos do produto guardados no cache, cada um com a coluna <campo>_ts.
+# Cadastro muda pouco; preço e estoque são voláteis (TTL curto).
+SLOW_FIELDS = ("barras", "fornecedor", "marca", "grupo", "subgrupo")
+VOLATILE_FIELDS = ("preco", "estoque")
+CACHE_FIELDS = SLOW_FIELDS + VOLATILE_FIELDS
+
+# colunas acrescentadas depois da 1ª versão do cache (migração por ALTER TABLE)
+PRODUTOS_CACHE_COLUMNS = {
+    **{f: "REAL" if f in VOLATILE_FIELDS else "TEXT" for f in CACHE_FIELDS},
+    **{f"{f}_ts": "REAL" for f in CACHE_FIELDS},
+}
+
+# score (ordem bm25, menor = melhor) dos fragmentos de código na busca de códigos
+CODE_MATCH_SCORE = -1e9
+
+_RE_FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_prefix_query(q: str) -> Optional[str]:
+    """Converte o texto digitado em consulta FTS5: todos os termos, por prefixo."""
+    tokens = _RE_FTS_TOKEN.findall(q)
+    if not tokens:
+        return None
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in tokens)
+
+
+def fts_substring_query(q: str) -> Optional[str]:
+    """Consulta trigram para um fragmento de código (mín. 3 caracteres)."""
+    q = q.strip()
+    if len(q) < 3:
+        return None
+    return '"' + q.replace('"', '""') + '"'
+
+
+class _ThreadConnections:
+    """Conexões de uma thread; some junto com o `threading.local` da thread."""
+
+    writer: Optional[sqlite3.Connection] = None
+    reader: Optional[sqlite3.Connection] = None
+
+
+def _release(
+    opened: List[sqlite3.Connection], lock: threading.Lock, con: sqlite3.Connection
+) -> None:
+    with lock:
+        try:
+            opened.remove(con)
+        except ValueError:  # já fechada por close()
+            return
+    try:
+        con.close()
+    except Exception:
+        pass
+
 
 class SqliteRepo:
-    def __init__(self, db_path: str):
+    """
+    Cache local em SQLite. Cada thread mantém duas conexões persistentes
+    (escrita e leitura `query_only`), abertas na 1ª chamada e ajustadas por
+    PRAGMAs. Elas são fechadas quando a thread termina; `close()` (ou
+    `with SqliteRepo(...)`) fecha as que ainda estiverem abertas.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_size_kb: int = 64 * 1024,
+    ):
         self.db_path = db_path
+        self.mmap_size = int(mmap_size)
+        self.cache_size_kb = int(cache_size_kb)
+        self._fts: Dict[str, bool] = {}
+        self._local = threading.local()
+        self._open: List[sqlite3.Connection] = []
+        self._open_lock = threading.Lock()
+
+    def __enter__(self) -> "SqliteRepo":
+        return self
 
-    def _conn(self):
-        con = sqlite3.connect(self.db_path)
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _holder(self) -> _ThreadConnections:
+        holder = getattr(self._local, "cons", None)
+        if holder is None:
+            holder = self._local.cons = _ThreadConnections()
+        return holder
+
+    def _open_connection(self, query_only: bool) -> sqlite3.Connection:
+        # check_same_thread=False só para close()/o fim da thread poderem fechar
+        # de outra thread; cada conexão continua sendo usada por uma única thread.
+        con = sqlite3.connect(self.db_path, check_same_thread=False)
         con.row_factory = sqlite3.Row
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA temp_store=MEMORY")
+        con.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        con.execute(f"PRAGMA cache_size={-self.cache_size_kb}")
+        con.execute("PRAGMA busy_timeout=5000")
+        if query_only:
+            con.execute("PRAGMA query_only=ON")
+        with self._open_lock:
+            self._open.append(con)
+        # o `threading.local` solta o holder quando a thread termina
+        weakref.finalize(self._holder(), _release, self._open, self._open_lock, con)
         return con
 
+    def _conn(self) -> sqlite3.Connection:
+        """Conexão de escrita da thread atual (use com `with` para o commit)."""
+        holder = self._holder()
+        if holder.writer is None:
+            holder.writer = self._open_connection(query_only=False)
+        return holder.writer
+
+    def _reader(self) -> sqlite3.Connection:
+        """Conexão só de leitura da thread atual (WAL: não bloqueia a escrita)."""
+        if self.db_path == ":memory:":  # cada conexão seria um banco diferente
+            return self._conn()
+        holder = self._holder()
+        if holder.reader is None:
+            holder.reader = self._open_connection(query_only=True)
+        return holder.reader
+
+    def close(self) -> None:
+        """Fecha as conexões abertas por todas as threads."""
+        with self._open_lock:
+            cons = list(self._open)
+            self._open.clear()
+        # fora do lock: soltar o local antigo dispara os finalizadores
+        self._local = threading.local()
+        for con in cons:
+            try:
+                con.close()
+            except Exception:
+                pass
+
     def init_schema(self):
         with self._conn() as con:
             con.executescript(SCHEMA)
+            have = {r["name"] for r in con.execute("PRAGMA table_info(produtos_cache)")}
+            for col, decl in PRODUTOS_CACHE_COLUMNS.items():
+                if col not in have:
+                    con.execute(f"ALTER TABLE produtos_cache ADD COLUMN {col} {decl}")
+            self._ensure_unique_applications(con)
+        for name, ddl in FTS_INDEXES.items():
+            self._init_fts(name, ddl)
 
-    def get_meta(self, k: str) -> Optional[str]:
+    @staticmethod
+    def _ensure_unique_applications(con: sqlite3.Connection) -> None:
+        """Um par (produto, veículo) só uma vez; remove duplicatas antigas."""
+        if con.execute(
+            "SELECT 1 FROM sqlite_master WHERE name='ux_apl_produto_veiculo'"
+        ).fetchone():
+            return
+        con.execute(
+            "DELETE FROM aplicacoes WHERE id NOT IN ("
+            "SELECT MIN(id) FROM aplicacoes GROUP BY codigo_produto, veiculo_id)"
+        )
+        con.execute(
+            "CREATE UNIQUE INDEX ux_apl_produto_veiculo "
+            "ON aplicacoes(codigo_produto, veiculo_id)"
+        )
+
+    def _init_fts(self, name: str, ddl: str) -> None:
+        """Cria um índice FTS5 (se o SQLite suportar) e o popula na 1ª vez."""
+        try:
+            with self._conn() as con:
+                existed = con.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name=?", (name,)
+                ).fetchone()
+                con.executescript(ddl)
+                if not existed:
+                    con.execute(f"INSERT INTO {name}({name}) VALUES('rebuild')")
+            self._fts[name] = True
+        except sqlite3.OperationalError as e:
+            print(f"[WARN] Índice {name} indisponível, busca no cache usará LIKE: {e}")
+            self._fts[name] = False
+
+    def rebuild_fts(self) -> None:
+        """Reconstrói os índices de texto a partir de produtos_cache."""
         with self._conn() as con:
+            for name in FTS_INDEXES:
+                if self._fts_available(name):
+                    con.execute(f"INSERT INTO {name}({name}) VALUES('rebuild')")
+
+    def _fts_available(self, name: str) -> bool:
+        if name not in self._fts:
+            with self._reader() as con:
+                self._fts[name] = (
+                    con.execute(
+                        "SELECT 1 FROM sqlite_master WHERE name=?", (name,)
+                    ).fetchone()
+                    is not None
+                )
+        return self._fts[name]
+
+    def get_meta(self, k: str) -> Optional[str]:
+        with self._reader() as con:
             cur = con.execute("SELECT v FROM meta WHERE k=?", (k,))
             row = cur.fetchone()
             return row["v"] if row else None
@@ -65,19 +366,104 @@ class SqliteRepo:
                 (k, v),
             )
 
-    def upsert_products(self, items: List[Dict[str, Any]]):
+    def upsert_products(self, items: List[Dict[str, Any]], *, snapshot: bool = False):
+        """
+        Grava produtos no cache. Só os campos presentes em cada item são
+        atualizados, e cada um recebe o carimbo de tempo atual. Com
+        `snapshot=True` (sync do catálogo) os campos de cadastro ausentes
+        também contam como lidos agora (a tabela de produtos não os tem).
+        """
+        now = time.time()
+        groups: Dict[tuple, List[tuple]] = {}
+        for i in items:
+            fields = tuple(
+                f for f in CACHE_FIELDS if f in i or (snapshot and f in SLOW_FIELDS)
+            )
+            row = [i["codigo"], i["descricao"]]
+            row.extend(i.get(f) for f in fields)
+            row.extend(now for _ in fields)
+            groups.setdefault(fields, []).append(tuple(row))
+        with self._conn() as con:
+            for fields, rows in groups.items():
+                cols = ["codigo", "descricao", *fields, *(f"{f}_ts" for f in fields)]
+                updates = ", ".join(f"{c}=excluded.{c}" for c in cols[1:])
+                con.executemany(
+                    f"INSERT INTO produtos_cache({', '.join(cols)}) "
+                    f"VALUES({', '.join('?' * len(cols))}) "
+                    f"ON CONFLICT(codigo) DO UPDATE SET {updates}",
+                    rows,
+                )
+
+    def update_product_fields(self, items: List[Dict[str, Any]]) -> None:
+        """Atualiza (e carimba) campos de produtos já em cache, ex.: preço/estoque."""
+        now = time.time()
         with self._conn() as con:
-            con.executemany(
-                "INSERT INTO produtos_cache(codigo, descricao) VALUES(?, ?) "
-                "ON CONFLICT(codigo) DO UPDATE SET descricao=excluded.descricao",
-                [(i["codigo"], i["descricao"]) for i in items],
+            for i in items:
+                fields = [f for f in CACHE_FIELDS if f in i]
+                if not fields:
+                    continue
+                sets = ", ".join(f"{f}=?, {f}_ts=?" for f in fields)
+                params: List[Any] = []
+                for f in fields:
+                    params.extend((i[f], now))
+                params.append(i["codigo"])
+                con.execute(f"UPDATE produtos_cache SET {sets} WHERE codigo=?", params)
+
+    def search_codes_substring(self, q: str, limit: int = 200) -> List[Dict[str, Any]]:
+        """Produtos cujo código ou código de barras contém o fragmento `q`."""
+        q = q.strip()
+        if not q:
+            return []
+        match = (
+            fts_substring_query(q)
+            if self._fts_available("produtos_codigo_fts")
+            else None
+        )
+        with self._reader() as con:
+            if match:
+                try:
+                    cur = con.execute(
+                        "SELECT p.codigo, p.descricao FROM produtos_codigo_fts f "
+                        "JOIN produtos_cache p ON p.rowid = f.rowid "
+                        "WHERE produtos_codigo_fts MATCH ? LIMIT ?",
+                        (match, int(limit)),
+                    )
+                    return [dict(row) for row in cur.fetchall()]
+                except sqlite3.OperationalError as e:
+                    print(f"[WARN] Falha na busca trigram, usando LIKE: {e}")
+            # fragmentos de 1-2 caracteres não formam trigramas
+            pattern = f"%{q}%"
+            cur = con.execute(
+                "SELECT codigo, descricao FROM produtos_cache "
+                "WHERE codigo LIKE ? OR barras LIKE ? LIMIT ?",
+                (pattern, pattern, int(limit)),
             )
+            return [dict(row) for row in cur.fetchall()]
 
     def search_products_cache(self, q: str, limit: int = 200) -> List[Dict[str, Any]]:
         if not q.strip():
             return []
+        match = fts_prefix_query(q) if self._fts_available("produtos_fts") else None
+        if match:
+            try:
+                # um termo só pode ser fragmento de código/EAN: substring primeiro
+                found: Dict[str, Dict[str, Any]] = {}
+                if fts_substring_query(q) and len(q.split()) == 1:
+                    for row in self.search_codes_substring(q, limit):
+                        found[row["codigo"]] = row
+                with self._reader() as con:
+                    cur = con.execute(
+                        "SELECT codigo, descricao FROM produtos_fts "
+                        "WHERE produtos_fts MATCH ? LIMIT ?",
+                        (match, int(limit)),
+                    )
+                    for row in cur.fetchall():
+                        found.setdefault(row["codigo"], dict(row))
+                return list(found.values())[: int(limit)]
+            except sqlite3.OperationalError as e:
+                print(f"[WARN] Falha na busca FTS, usando LIKE: {e}")
         pattern = f"%{q.strip()}%"
-        with self._conn() as con:
+        with self._reader() as con:
             cur = con.execute(
                 "SELECT codigo, descricao FROM produtos_cache WHERE descricao LIKE ? OR codigo LIKE ? LIMIT ?",
                 (pattern, pattern, int(limit)),
@@ -88,9 +474,9 @@ class SqliteRepo:
         if not codes:
             return []
         placeholders = ",".join(["?"] * len(codes))
-        with self._conn() as con:
+        with self._reader() as con:
             cur = con.execute(
-                f"SELECT codigo, descricao FROM produtos_cache WHERE codigo IN ({placeholders})",
+                f"SELECT * FROM produtos_cache WHERE codigo IN ({placeholders})",
                 codes,
             )
             return [dict(row) for row in cur.fetchall()]
@@ -119,7 +505,7 @@ class SqliteRepo:
     def find_vehicle(
         self, marca: str, modelo: str, ano_inicio: int, ano_fim: int, motor: str = ""
     ) -> Optional[Dict[str, Any]]:
-        with self._conn() as con:
+        with self._reader() as con:
             cur = con.execute(
                 """
                 SELECT * FROM veiculos WHERE marca=? AND modelo=? AND IFNULL(ano_inicio,0)=? AND IFNULL(ano_fim,0)=? AND IFNULL(motor,'')=?
@@ -132,51 +518,300 @@ class SqliteRepo:
     def add_application(self, codigo_produto: str, veiculo_id: int):
         with self._conn() as con:
             con.execute(
-                "INSERT INTO aplicacoes(codigo_produto, veiculo_id) VALUES(?,?)",
+                "INSERT OR IGNORE INTO aplicacoes(codigo_produto, veiculo_id) VALUES(?,?)",
                 (codigo_produto, veiculo_id),
             )
 
+    def bulk_import_applications(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        *,
+        batch_size: int = 50000,
+        defer_indexes: bool = True,
+        progress: Optional[Callable[[Dict[str, float]], None]] = None,
+    ) -> Dict[str, float]:
+        """
+        Importa pares produto × veículo em lote. Cada linha traz codigo_produto
+        (ou codigo), marca, modelo, ano_inicio, ano_fim e motor (código e
+        modelo obrigatórios). Veículos são
+        deduplicados em memória (inclusive contra os já gravados), as escritas
+        vão em `executemany` de `batch_size` linhas por transação e, com
+        `defer_indexes`, os índices secundários são recriados só no fim.
+        Devolve (e passa a `progress` a cada lote) as estatísticas da carga.
+        """
+        con = self._conn()
+        vehicles: Dict[Tuple[str, str, int, int, str], int] = {}
+        for r in con.execute(
+            "SELECT id, marca, modelo, IFNULL(ano_inicio,0), IFNULL(ano_fim,0), "
+            "IFNULL(motor,'') FROM veiculos"
+        ):
+            vehicles.setdefault(tuple(r[1:]), r[0])
+        next_id = (con.execute("SELECT MAX(id) FROM veiculos").fetchone()[0] or 0) + 1
+
+        stats: Dict[str, float] = {
+            "rows": 0,
+            "skipped": 0,
+            "vehicles_new": 0,
+            "applications_new": 0,
+            "seconds": 0.0,
+            "rows_per_s": 0.0,
+        }
+        t0 = time.perf_counter()
+        new_vehicles: List[Tuple[Any, ...]] = []
+        apps: List[Tuple[str, int]] = []
+
+        def to_int(v: Any) -> int:
+            try:
+                return int(float(v)) if v not in (None, "") else 0
+            except (TypeError, ValueError):
+                return 0
+
+        def flush() -> None:
+            with con:
+                cur = con.executemany(
+                    "INSERT INTO veiculos(id, marca, modelo, ano_inicio, ano_fim, motor) "
+                    "VALUES(?,?,?,?,?,?)",
+                    new_vehicles,
+                )
+                stats["vehicles_new"] += max(cur.rowcount, 0)
+                cur = con.executemany(
+                    "INSERT OR IGNORE INTO aplicacoes(codigo_produto, veiculo_id) "
+                    "VALUES(?,?)",
+                    apps,
+                )
+                stats["applications_new"] += max(cur.rowcount, 0)
+            new_vehicles.clear()
+            apps.clear()
+            stats["seconds"] = time.perf_counter() - t0
+            stats["rows_per_s"] = (
+                stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+            )
+            if progress:
+                progress(dict(stats))
+
+        fts = self._fts_available("veiculos_fts")
+        if defer_indexes:
+            with con:
+                for name in BULK_DEFERRED_INDEXES:
+                    con.execute(f"DROP INDEX IF EXISTS {name}")
+                # o índice FTS dos veículos é reconstruído de uma vez no fim
+                con.execute("DROP TRIGGER IF EXISTS veiculos_fts_ai")
+        try:
+            for row in rows:
+                stats["rows"] += 1
+                codigo = str(
+                    row.get("codigo_produto") or row.get("codigo") or ""
+                ).strip()
+                marca = str(row.get("marca") or "").strip()
+                modelo = str(row.get("modelo") or "").strip()
+                if not codigo or not modelo:
+                    stats["skipped"] += 1
+                    continue
+                key = (
+                    marca,
+                    modelo,
+                    to_int(row.get("ano_inicio")),
+                    to_int(row.get("ano_fim")),
+                    str(row.get("motor") or "").strip(),
+                )
+                vid = vehicles.get(key)
+                if vid is None:
+                    vid = vehicles[key] = next_id
+                    next_id += 1
+                    new_vehicles.append((vid, *key))
+                apps.append((codigo, vid))
+                if len(apps) >= batch_size:
+                    flush()
+            flush()
+        finally:
+            if defer_indexes:
+                with con:
+                    con.executescript(SCHEMA)  # recria os índices removidos
+                    if fts:
+                        con.executescript(VEHICLE_FTS_SCHEMA)
+                        con.execute(
+                            "INSERT INTO veiculos_fts(veiculos_fts) VALUES('rebuild')"
+                        )
+        stats["seconds"] = time.perf_counter() - t0
+        stats["rows_per_s"] = (
+            stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        )
+        return stats
+
+    def applications_empty(self) -> bool:
+        """Sem veículos nem aplicações gravados (1ª carga)."""
+        with self._reader() as con:
+            row = con.execute(
+                "SELECT NOT EXISTS(SELECT 1 FROM veiculos) "
+                "AND NOT EXISTS(SELECT 1 FROM aplicacoes)"
+            ).fetchone()
+            return bool(row[0])
+
     def list_vehicles(self) -> List[Dict[str, Any]]:
-        with self._conn() as con:
+        with self._reader() as con:
             cur = con.execute(
                 "SELECT * FROM veiculos ORDER BY marca, modelo, ano_inicio"
             )
             return [dict(row) for row in cur.fetchall()]
 
+    def _vehicle_filter(self, veiculo_q: str):
+        """(condição SQL sobre `veiculos v`, parâmetros) ou None se vazio."""
+        query = parse_vehicle_query(veiculo_q)
+        if query.empty:
+            return None
+        return vehicle_where(query, "v", use_fts=self._fts_available("veiculos_fts"))
+
     def suggest_vehicles(self, veiculo_q: str) -> List[Dict[str, Any]]:
-        terms = [t.strip() for t in veiculo_q.split() if t.strip()]
-        if not terms:
+        flt = self._vehicle_filter(veiculo_q)
+        if flt is None:
             return []
-        with self._conn() as con:
-            base_sql = """
-                SELECT DISTINCT marca, modelo, IFNULL(ano_inicio,0) as ano_inicio,
-                       IFNULL(ano_fim,0) as ano_fim, IFNULL(motor,'') as motor
-                FROM veiculos
-                WHERE 1=1
-            """
-            params: List[str] = []
-            for t in terms:
-                base_sql += " AND (marca LIKE ? OR modelo LIKE ? OR CAST(IFNULL(ano_inicio,0) AS TEXT) LIKE ? OR CAST(IFNULL(ano_fim,0) AS TEXT) LIKE ? OR IFNULL(motor,'') LIKE ?)"
-                like = f"%{t}%"
-                params.extend([like, like, like, like, like])
-            base_sql += " ORDER BY marca, modelo LIMIT 50"
-            cur = con.execute(base_sql, params)
+        where, params = flt
+        with self._reader() as con:
+            cur = con.execute(
+                f"""
+                SELECT DISTINCT v.marca, v.modelo, IFNULL(v.ano_inicio,0) as ano_inicio,
+                       IFNULL(v.ano_fim,0) as ano_fim, IFNULL(v.motor,'') as motor
+                FROM veiculos v
+                WHERE {where}
+                ORDER BY v.marca, v.modelo LIMIT 50
+                """,
+                params,
+            )
             return [dict(row) for row in cur.fetchall()]
 
     def search_applications(self, veiculo_q: str) -> List[Dict[str, Any]]:
-        terms = [t.strip() for t in veiculo_q.split() if t.strip()]
-        with self._conn() as con:
-            base_sql = """
+        flt = self._vehicle_filter(veiculo_q)
+        where, params = flt if flt is not None else ("1=1", [])
+        with self._reader() as con:
+            cur = con.execute(
+                f"""
                 SELECT a.codigo_produto, v.marca, v.modelo, v.ano_inicio, v.ano_fim, IFNULL(v.motor,'') as motor
-                FROM aplicacoes a
-                JOIN veiculos v ON v.id = a.veiculo_id
-                WHERE 1=1
-            """
-            params = []
-            for t in terms:
-                base_sql += " AND (v.marca LIKE ? OR v.modelo LIKE ? OR CAST(IFNULL(v.ano_inicio,0) AS TEXT) LIKE ? OR CAST(IFNULL(v.ano_fim,0) AS TEXT) LIKE ? OR IFNULL(v.motor,'') LIKE ?)"
-                like = f"%{t}%"
-                params.extend([like, like, like, like, like])
-            base_sql += " LIMIT 500"
-            cur = con.execute(base_sql, params)
+                FROM veiculos v
+                JOIN aplicacoes a ON a.veiculo_id = v.id
+                WHERE {where}
+                LIMIT 500
+                """,
+                params,
+            )
             return [dict(row) for row in cur.fetchall()]
+
+    def _product_match(
+        self, q: str, use_fts: bool, scored: bool = True
+    ) -> Tuple[str, List[Any]]:
+        """
+        SELECT (codigo, score) dos produtos cujo texto casa com `q`, com as
+        mesmas regras da busca no cache. Score menor = mais relevante (bm25 do
+        FTS5; fragmentos de código antes de tudo).
+        """
+        q = q.strip()
+        match = fts_prefix_query(q) if use_fts else None
+        if not match:
+            pattern = f"%{q}%"
+            return (
+                "SELECT codigo, 0.0 AS score FROM produtos_cache "
+                "WHERE descricao LIKE ? OR codigo LIKE ? OR barras LIKE ?",
+                [pattern] * 3,
+            )
+        score = "bm25(produtos_fts)" if scored else "0.0"
+        sql = (
+            f"SELECT codigo, {score} AS score FROM produtos_fts "
+            "WHERE produtos_fts MATCH ?"
+        )
+        params: List[Any] = [match]
+        sub = fts_substring_query(q)
+        if sub and len(q.split()) == 1 and self._fts_available("produtos_codigo_fts"):
+            sql += (
+                f" UNION ALL SELECT p.codigo, {CODE_MATCH_SCORE} FROM produtos_codigo_fts f "
+                "JOIN produtos_cache p ON p.rowid = f.rowid "
+                "WHERE produtos_codigo_fts MATCH ?"
+            )
+            params.append(sub)
+        return sql, params
+
+    def search_codes(
+        self, produto_q: str, veiculo_q: str, limit: int = 500
+    ) -> Tuple[List[str], bool, bool]:
+        """
+        Códigos para a busca de dois campos, resolvida numa consulta só:
+
+        - produto: texto/código no cache de produtos;
+        - veículo: aplicações (veiculos × aplicacoes) unidas aos produtos cuja
+          descrição cita os termos do veículo.
+
+        Com os dois lados encontrando algo, devolve a interseção; senão, o lado
+        que encontrou. Os `limit` códigos saem em ordem de relevância do lado
+        produto (código digitado inteiro, fragmento de código, bm25). Retorna
+        (códigos, produto_achou, veiculo_achou) para o chamador decidir o
+        fallback no Firebird de cada lado.
+        """
+        produto_q, veiculo_q = produto_q.strip(), veiculo_q.strip()
+        if not produto_q and not veiculo_q:
+            return [], False, False
+        use_fts = self._fts_available("produtos_fts")
+        for attempt in (use_fts, False) if use_fts else (False,):
+            params: List[Any] = []
+            if produto_q:
+                prod_sql, prod_params = self._product_match(produto_q, attempt)
+                params.extend(prod_params)
+            else:
+                prod_sql = "SELECT NULL AS codigo, NULL AS score WHERE 0"
+            if veiculo_q:
+                query = parse_vehicle_query(veiculo_q)
+                veic_sql, veic_params = self._product_match(
+                    veiculo_q, attempt, scored=False
+                )
+                if not query.empty:
+                    where, where_params = vehicle_where(
+                        query,
+                        "v",
+                        use_fts=attempt and self._fts_available("veiculos_fts"),
+                    )
+                    veic_sql = (
+                        "SELECT a.codigo_produto AS codigo, 0.0 AS score "
+                        "FROM veiculos v "
+                        f"JOIN aplicacoes a ON a.veiculo_id = v.id WHERE {where} "
+                        f"UNION ALL {veic_sql}"
+                    )
+                    veic_params = where_params + veic_params
+                params.extend(veic_params)
+            else:
+                veic_sql = "SELECT NULL AS codigo, NULL AS score WHERE 0"
+            # código digitado por inteiro não pode ficar fora do limite
+            params.extend([produto_q, produto_q.upper(), produto_q.lower(), int(limit)])
+            sql = f"""
+                WITH hits(codigo, score) AS MATERIALIZED ({prod_sql}),
+                     prod(codigo, score) AS (
+                         SELECT codigo, MIN(score) FROM hits GROUP BY codigo
+                     ),
+                     veic(codigo) AS (SELECT DISTINCT codigo FROM ({veic_sql})),
+                     flags AS (
+                         SELECT EXISTS(SELECT 1 FROM prod) AS hp,
+                                EXISTS(SELECT 1 FROM veic) AS hv
+                     ),
+                     res(codigo, score) AS (
+                         SELECT codigo, score FROM prod WHERE (SELECT hv FROM flags) = 0
+                         UNION ALL
+                         SELECT codigo, 0.0 FROM veic WHERE (SELECT hp FROM flags) = 0
+                         UNION ALL
+                         SELECT codigo, score FROM prod
+                         WHERE (SELECT hv FROM flags) = 1
+                           AND codigo IN (SELECT codigo FROM veic)
+                     )
+                SELECT f.hp, f.hv, r.codigo
+                FROM flags f LEFT JOIN (
+                    SELECT codigo FROM res
+                    ORDER BY codigo IN (?, ?, ?) DESC, score
+                    LIMIT ?
+                ) r ON 1
+            """
+            try:
+                with self._reader() as con:
+                    rows = con.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                if not attempt:
+                    raise
+                print(f"[WARN] Falha na busca FTS, usando LIKE: {e}")
+                continue
+            codes = [r["codigo"] for r in rows if r["codigo"] is not None]
+            return codes, bool(rows[0]["hp"]), bool(rows[0]["hv"])
+        return [], False, False
@@ -1,21 +1,37 @@
 import asyncio
 import configparser
+import itertools
 from datetime import datetime
+from typing import Callable, Optional
 
 from firebird_client import FirebirdClient
+from hot_catalog import HotCatalog
 from sqlite_repo import SqliteRepo
 
 
 class SyncService:
     def __init__(
-        self, config: configparser.ConfigParser, fb: FirebirdClient, repo: SqliteRepo
+        self,
+        config: configparser.ConfigParser,
+        fb: FirebirdClient,
+        repo: SqliteRepo,
+        catalog: Optional[HotCatalog] = None,
+        on_sync: Optional[Callable[[], None]] = None,
     ):
         self.config = config
         self.fb = fb
         self.repo = repo
+        # catálogo em memória da busca: recebe cada lote gravado no cache
+        self.catalog = catalog
+        # chamado ao fim de cada sync (ex.: invalidar o cache de resultados)
+        self.on_sync = on_sync
         self.autosync_minutes = int(config["app"].get("autosync_minutes", 0))
         # quantidade de itens para snapshot inicial do cache
+        # (0 = catálogo inteiro, extraído em lotes com memória constante)
         self.snapshot_limit = int(config["app"].get("snapshot_limit", 5000))
+        self.sync_batch_size = int(config["app"].get("sync_batch_size", 2000))
+        # aplicações produto × veículo vindas do ERP (0 = não sincroniza)
+        self.applications_hours = float(config["app"].get("sync_aplicacoes_horas", 24))
         self._task: asyncio.Task | None = None
 
     async def auto_sync(self):
@@ -40,9 +56,60 @@ class SyncService:
         self._task = asyncio.create_task(self.sync_products_cache_async())
 
     def sync_products_cache(self):
-        items = self.fb.fetch_products_basic(limit=self.snapshot_limit)
-        self.repo.upsert_products(items)
+        if self.snapshot_limit > 0:
+            items = self.fb.fetch_products_basic(limit=self.snapshot_limit)
+            self._store(items)
+        else:
+            for batch in self.fb.iter_products(batch_size=self.sync_batch_size):
+                self._store(batch)
         self.repo.set_meta("last_sync", datetime.now().isoformat())
+        try:
+            self.sync_applications()
+        except Exception as e:
+            print(f"[WARN] Falha ao sincronizar aplicações: {e}")
+        if self.on_sync is not None:
+            self.on_sync()
+
+    def _store(self, items):
+        self.repo.upsert_products(items, snapshot=True)
+        if self.catalog is not None:
+            self.catalog.upsert(items)
+
+    def sync_applications(self, force: bool = False):
+        """
+        Copia as aplicações produto × veículo do Firebird para o SQLite em
+        lote, no máximo a cada `sync_aplicacoes_horas`. Devolve as
+        estatísticas da carga (ou None se não rodou ou não veio nada).
+        """
+        extract = getattr(self.fb, "iter_vehicle_applications", None)
+        if extract is None or (self.applications_hours <= 0 and not force):
+            return None
+        last = self.repo.get_meta("last_sync_aplicacoes")
+        if last and not force:
+            age = (datetime.now() - datetime.fromisoformat(last)).total_seconds()
+            if age < self.applications_hours * 3600:
+                return None
+
+        rows = (
+            row for batch in extract(batch_size=self.sync_batch_size) for row in batch
+        )
+        first = next(rows, None)
+        if first is None:
+            # nada extraído (ou descoberta sem tabelas): não mexe no cache
+            self.repo.set_meta("last_sync_aplicacoes", datetime.now().isoformat())
+            return None
+        # a busca usa os índices de veículos enquanto o sync roda: só os
+        # derruba na 1ª carga, com as tabelas ainda vazias
+        stats = self.repo.bulk_import_applications(
+            itertools.chain([first], rows),
+            defer_indexes=self.repo.applications_empty(),
+        )
+        print(
+            f"[SYNC] Aplicações: {int(stats['rows'])} linhas, "
+            f"{int(stats['applications_new'])} novas, {stats['rows_per_s']:.0f} linhas/s"
+        )
+        self.repo.set_meta("last_sync_aplicacoes", datetime.now().isoformat())
+        return stats
 
     async def sync_products_cache_async(self):
         await asyncio.to_thread(self.sync_products_cache)
@@ -0,0 +1,60 @@
+"""Conexão Firebird falsa para os testes do FirebirdClient (sem banco)."""
+
+import configparser
+
+from firebird_client import FirebirdClient
+
+
+class FakeCursor:
+    """Cursor DB-API de teste: `handler(sql, params)` devolve as linhas."""
+
+    def __init__(self, handler):
+        self._handler = handler
+        self.pending = []
+
+    def execute(self, sql, params=()):
+        self.pending = list(self._handler(sql, tuple(params or ())) or ())
+
+    def fetchone(self):
+        return self.pending.pop(0) if self.pending else None
+
+    def fetchall(self):
+        out, self.pending = self.pending, []
+        return out
+
+    def fetchmany(self, n):
+        out, self.pending = self.pending[:n], self.pending[n:]
+        return out
+
+
+class FakeConnection:
+    def __init__(self, handler):
+        self._handler = handler
+
+    def cursor(self):
+        return FakeCursor(self._handler)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def fake_client(handler, methods=None, **opts):
+    """
+    FirebirdClient com pool de verdade sobre conexões `FakeConnection`.
+    `methods` sobrescreve métodos do cliente (ex.: `_discover_product_table`);
+    `opts` vão para a seção [firebird] da configuração.
+    """
+    client = type(
+        "Client",
+        (FirebirdClient,),
+        {"_new_connection": lambda self: FakeConnection(handler), **(methods or {})},
+    )
+    cfg = configparser.ConfigParser()
+    cfg["firebird"] = {"DATABASE": "db.fdb", **opts}
+    return client(cfg)
@@ -0,0 +1,132 @@
+import configparser
+
+from fb_catalog import MetadataCatalog
+from firebird_client import FirebirdClient
+
+RELATIONS = [("TPRODUTO", 0, 0), ("VPRODUTO", 1, 0), ("RDB$PAGES", 0, 1)]
+FIELDS = [
+    ("TPRODUTO", "CODPRODUTO", 8, 0, 4, 0, 0, 1),
+    ("TPRODUTO", "DESCRICAO", 37, 0, 100, 0, 0, 0),
+    ("TPRODUTO", "PRECO", 16, 2, 8, 15, -2, 0),
+    ("VPRODUTO", "CODPRODUTO", 8, 0, 4, 0, 0, 0),
+]
+INDICES = [("TPRODUTO", "PK_TPRODUTO", 1, 0, "PRIMARY KEY", "CODPRODUTO")]
+FKS = [("TPRODUTO", "FK_X", "CODPRODUTO", "TOUTRA", "ID")]
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.db.queries.append(sql)
+        if "EXISTS(" in sql:
+            self.rows = [tuple(1 for _ in range(sql.count("EXISTS(")))]
+        elif "FROM RDB$DATABASE" in sql and "COUNT(*)" in sql:
+            self.rows = [self.db.fingerprint]
+        elif "FOREIGN KEY" in sql:
+            self.rows = FKS
+        elif "RDB$INDEX_SEGMENTS" in sql:
+            self.rows = INDICES
+        elif "RDB$RELATION_FIELDS" in sql:
+            self.rows = FIELDS
+        elif "RDB$RELATIONS" in sql:
+            self.rows = RELATIONS
+        elif sql.startswith("SELECT FIRST 1 "):
+            self.rows = [(1,)]
+        else:
+            self.rows = []
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+class FakeDB:
+    def __init__(self):
+        self.queries = []
+        self.fingerprint = (3, 5, 4, 1, 0)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_client(tmp_path, db):
+    class Client(FirebirdClient):
+        def _new_connection(self):
+            return db
+
+    cfg = configparser.ConfigParser()
+    cfg["firebird"] = {
+        "DATABASE": "db.fdb",
+        "CATALOG_PATH": str(tmp_path / "meta.json"),
+    }
+    return Client(cfg)
+
+
+def test_catalog_bulk_load_and_lookups(tmp_path):
+    db = FakeDB()
+    fb = make_client(tmp_path, db)
+    cat = fb.catalog()
+    assert fb._list_tables() == ["TPRODUTO"]
+    assert fb._table_columns("tproduto") == ["CODPRODUTO", "DESCRICAO", "PRECO"]
+    assert cat.column("TPRODUTO", "preco").type_name == "DECIMAL(15,2)"
+    assert cat.leading_index("TPRODUTO", "CODPRODUTO").constraint == "PRIMARY KEY"
+    assert cat.table("TPRODUTO").foreign_keys[0].ref_table == "TOUTRA"
+    # fingerprint + 4 consultas em lote, independente do número de tabelas
+    assert len(db.queries) == 5
+    fb._table_columns("VPRODUTO")
+    assert len(db.queries) == 5
+
+
+def test_catalog_persisted_and_invalidated_by_fingerprint(tmp_path):
+    db = FakeDB()
+    make_client(tmp_path, db).catalog()
+    assert (tmp_path / "meta.json").exists()
+
+    db.queries.clear()
+    cat = make_client(tmp_path, db).catalog()
+    assert len(db.queries) == 1  # só a impressão digital
+    assert cat.columns("TPRODUTO")[0] == "CODPRODUTO"
+
+    db.queries.clear()
+    db.fingerprint = (3, 6, 4, 1, 0)  # ALTER TABLE incrementa RDB$FORMAT
+    make_client(tmp_path, db).catalog()
+    assert len(db.queries) == 5
+
+
+def test_catalog_round_trip():
+    db = FakeDB()
+    cat = MetadataCatalog.fetch(db, database="x", fingerprint="1")
+    again = MetadataCatalog.from_dict(cat.to_dict())
+    assert again.to_dict() == cat.to_dict()
+
+
+def test_product_table_signature_survives_restart(tmp_path):
+    db = FakeDB()
+    sig = make_client(tmp_path, db)._discover_product_table()
+    assert sig == (
+        "TPRODUTO",
+        {"codigo": "CODPRODUTO", "descricao": "DESCRICAO", "preco": "PRECO"},
+    )
+
+    db.queries.clear()
+    assert make_client(tmp_path, db)._discover_product_table() == sig
+    assert len(db.queries) == 1  # só a impressão digital; sem varrer tabelas
+
+    db.fingerprint = (3, 6, 4, 1, 0)
+    db.queries.clear()
+    assert make_client(tmp_path, db)._discover_product_table() == sig
+    assert any("EXISTS(" in q for q in db.queries)
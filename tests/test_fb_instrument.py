@@ -0,0 +1,93 @@
+import json
+
+from fb_instrument import QueryRecorder, sql_shape
+from fb_slowlog_report import aggregate, iter_entries
+
+PLAN = "PLAN (TPRODUTO INDEX (PK_TPRODUTO))"
+
+
+class FakeStmt:
+    """Como o PreparedStatement do firebirdsql: o plano fica em `.stmt.plan`."""
+
+    def __init__(self, explain_plan):
+        self.stmt = type("Stmt", (), {"plan": PLAN if explain_plan else None})()
+
+    def __getattr__(self, name):
+        raise AttributeError(name)
+
+
+class FakeCursor:
+    def __init__(self, con):
+        self.con = con
+        self.rows = []
+
+    def prep(self, sql, explain_plan=False):
+        self.con.prepared.append(sql)
+        return FakeStmt(explain_plan)
+
+    def execute(self, operation, params=()):
+        self.rows = [(1,), (2,)]
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeCon:
+    def __init__(self):
+        self.prepared = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def test_sql_shape_normalizes_literals_and_in_lists():
+    a = sql_shape("SELECT FIRST 10 * FROM T WHERE A IN (?, ?, ?) AND B = 'x'")
+    b = sql_shape("select first 50 *  FROM T\nWHERE A IN (?,?) AND B = 'yy'")
+    assert a == "SELECT FIRST N * FROM T WHERE A IN (?…) AND B = '?'"
+    assert a.upper() == b.upper()
+    assert sql_shape("SELECT RDB$FIELD_NAME FROM RDB$FIELDS WHERE X = 42").endswith(
+        "X = N"
+    )
+
+
+def test_recorder_aggregates_and_logs_slow_with_plan(tmp_path):
+    log = tmp_path / "slow.log"
+    rec = QueryRecorder(slow_ms=0.0, log_path=str(log))
+    con = rec.wrap(FakeCon())
+    for n in (1, 2):
+        cur = con.cursor()
+        stmt = cur.prep(
+            f"SELECT * FROM TPRODUTO WHERE CODIGO IN ({', '.join('?' * n)})"
+        )
+        cur.execute(stmt, ("1",) * n)
+        assert cur.fetchall() == [(1,), (2,)]
+
+    top = rec.summary()
+    assert len(top) == 1  # IN (?) e IN (?, ?) são a mesma forma
+    assert top[0]["count"] == 2 and top[0]["rows"] == 4
+
+    entries = list(iter_entries(str(log)))
+    assert len(entries) == 2
+    assert entries[0]["plan"] == PLAN
+    assert top[0]["plan"] == PLAN
+    assert {"prepare_ms", "execute_ms", "fetch_ms", "total_ms"} <= set(entries[0])
+    agg = aggregate(entries + [json.loads(json.dumps(entries[1]))])
+    assert [a["count"] for a in agg] == [3]
+
+
+def test_fast_statements_not_logged(tmp_path):
+    log = tmp_path / "slow.log"
+    rec = QueryRecorder(slow_ms=10_000.0, log_path=str(log))
+    con = FakeCon()
+    for _ in range(3):
+        cur = rec.wrap(con).cursor()
+        cur.execute("SELECT 1 FROM RDB$DATABASE")
+        cur.fetchall()
+    top = rec.summary()
+    assert top[0]["count"] == 3
+    # rápido, mas o PLAN fica registrado; SQL sem prepare: um explain por forma
+    assert top[0]["plan"] == PLAN and len(con.prepared) == 1
+    assert not log.exists() or log.read_text() == ""
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from fb_pool import ConnectionPool
+
+
+class FakeCon:
+    def __init__(self):
+        self.closed = False
+        self.commits = 0
+        self.rollbacks = 0
+        self.broken = False
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kw):
+    created = []
+
+    def factory():
+        con = FakeCon()
+        created.append(con)
+        return con
+
+    def validator(con):
+        if con.broken:
+            raise RuntimeError("broken")
+
+    kw.setdefault("validator", validator)
+    return ConnectionPool(factory, **kw), created
+
+
+def test_reuses_connection_and_commits_on_checkin():
+    pool, created = make_pool(max_size=2)
+    with pool.connection() as c1:
+        pass
+    with pool.connection() as c2:
+        pass
+    assert c1 is c2
+    assert len(created) == 1
+    assert c1.commits == 2
+
+
+def test_rollback_on_error_keeps_connection():
+    pool, created = make_pool(max_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("sql")
+    assert created[0].rollbacks == 1
+    with pool.connection() as con:
+        assert con is created[0]
+
+
+def test_bounded_size_times_out():
+    pool, _ = make_pool(max_size=1, acquire_timeout=0.05)
+    entry = pool.acquire()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    pool.release(entry)
+    assert pool.acquire() is entry
+
+
+def test_waiter_gets_released_connection():
+    pool, created = make_pool(max_size=1, acquire_timeout=2)
+    entry = pool.acquire()
+    got = []
+    t = threading.Thread(target=lambda: got.append(pool.acquire()))
+    t.start()
+    time.sleep(0.05)
+    pool.release(entry)
+    t.join(1)
+    assert got == [entry]
+    assert len(created) == 1
+
+
+def test_validation_on_borrow_replaces_broken_connection():
+    pool, created = make_pool(max_size=2, validate_after=0)
+    with pool.connection() as con:
+        pass
+    con.broken = True
+    with pool.connection() as con2:
+        assert con2 is not con
+    assert con.closed
+    assert pool.stats["validation_failed"] == 1
+
+
+def test_max_lifetime_and_idle_expire_connections():
+    pool, created = make_pool(max_size=2, max_lifetime=0.01)
+    with pool.connection() as con:
+        pass
+    time.sleep(0.02)
+    with pool.connection() as con2:
+        assert con2 is not con
+    assert con.closed
+
+    pool, created = make_pool(max_size=2, max_idle=0.01)
+    with pool.connection() as con:
+        pass
+    time.sleep(0.02)
+    with pool.connection() as con2:
+        assert con2 is not con
+
+
+def test_disabled_pool_closes_each_connection():
+    pool, created = make_pool(max_size=0)
+    with pool.connection() as con:
+        pass
+    assert con.closed
+    with pool.connection() as con2:
+        pass
+    assert con2 is not con
+
+
+def test_transaction_duration_metrics():
+    pool, created = make_pool(max_size=1, long_transaction=0.01)
+    with pool.connection():
+        pass
+    with pool.connection():
+        time.sleep(0.02)
+    snap = pool.snapshot()
+    assert snap["transactions"] == 2 and snap["tx_long"] == 1
+    assert snap["tx_ms_max"] >= 20 and snap["tx_ms_avg"] > 0
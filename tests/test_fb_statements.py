@@ -0,0 +1,73 @@
+from fb_statements import StatementCache, bucket_size, pad_params
+
+
+class PrepCursor:
+    def __init__(self, con):
+        self.con = con
+
+    def prep(self, sql):
+        self.con.prepared.append(sql)
+        return ("stmt", sql)
+
+    def execute(self, stmt, params=()):
+        self.con.executed.append(stmt)
+
+    def close(self):
+        self.con.closed.append(self)
+
+
+class PrepCon:
+    def __init__(self):
+        self.prepared = []
+        self.executed = []
+        self.closed = []
+
+    def cursor(self):
+        return PrepCursor(self)
+
+
+def test_bucket_size_and_padding():
+    assert bucket_size(1, 200) == 1
+    assert bucket_size(3, 200) == 4
+    assert bucket_size(65, 200) == 200
+    assert bucket_size(150, 200) == 200
+    assert bucket_size(7, 5) == 7
+    assert pad_params(["a", "b"], 4) == ["a", "b", "b", "b"]
+
+
+def test_sql_built_once_per_key():
+    cache = StatementCache()
+    built = []
+    for _ in range(3):
+        sql = cache.sql(("full", "T"), lambda: built.append(1) or "SELECT 1")
+    assert sql == "SELECT 1" and built == [1]
+    assert cache.stats["sql_hits"] == 2 and cache.stats["sql_misses"] == 1
+
+
+def test_prepared_statement_reused_per_connection():
+    cache = StatementCache()
+    con = PrepCon()
+    cache.execute(con, "SELECT A", (1,))
+    cache.execute(con, "SELECT A", (2,))
+    assert con.prepared == ["SELECT A"]
+    assert cache.stats["prepare_hits"] == 1
+    other = PrepCon()
+    cache.execute(other, "SELECT A", (3,))
+    assert other.prepared == ["SELECT A"]
+
+
+def test_prepare_disabled_executes_plain_sql():
+    cache = StatementCache(prepare=False)
+    con = PrepCon()
+    cache.execute(con, "SELECT A", ())
+    assert con.prepared == [] and con.executed == ["SELECT A"]
+
+
+def test_evicted_statements_are_closed():
+    cache = StatementCache(max_per_connection=2)
+    con = PrepCon()
+    for sql in ("SELECT A", "SELECT B", "SELECT C"):
+        cache.execute(con, sql, ())
+    assert len(con.closed) == 1 and cache.stats["evicted"] == 1
+    cache.execute(con, "SELECT A", ())  # saiu do cache: prepara de novo
+    assert con.prepared == ["SELECT A", "SELECT B", "SELECT C", "SELECT A"]
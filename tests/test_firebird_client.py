@@ -1,9 +1,20 @@
+import configparser
+import os
+import re
+import threading
+import time
+
+import pytest
+
+from fakes import fake_client
 from firebird_client import FirebirdClient
 
 
 class StubFB(FirebirdClient):
     def __init__(self):
-        pass
+        cfg = configparser.ConfigParser()
+        cfg["firebird"] = {"DATABASE": "stub.fdb", "CATALOG_PATH": os.devnull}
+        super().__init__(cfg)
 
     def _discover_product_table(self):
         return ("T", {"codigo": "COD", "descricao": "DESC"})
@@ -34,3 +45,380 @@ def test_search_products_loose_stub():
     res = fb.search_products_loose(produto="Prod")
     assert res[0]["codigo"] == "1"
     assert res[0]["descricao"] == "Produto"
+
+
+def make_probe_client(with_rows, failing=(), flaky=(), methods=None, **opts):
+    queries = []
+
+    def handler(sql, params):
+        queries.append(sql)
+        tables = re.findall(r"FROM (\w+)\)", sql) or re.findall(r"FROM (\w+)$", sql)
+        if any(t in failing for t in tables):
+            raise RuntimeError("no permission for read/select access to TABLE")
+        if any(t in flaky for t in tables):
+            raise RuntimeError("lock time-out on wait transaction")
+        if sql.startswith("SELECT FIRST 1"):
+            return [(1,)] if tables[0] in with_rows else []
+        return [tuple(1 if t in with_rows else 0 for t in tables)]
+
+    return fake_client(handler, methods, **opts), queries
+
+
+def test_probe_tables_batched_parallel_with_fallback():
+    names = [f"T{i}" for i in range(10)]
+    fb, queries = make_probe_client(
+        {"T1", "T4", "T7"}, failing={"T7"}, PROBE_BATCH="4", PROBE_WORKERS="3"
+    )
+    res = fb._probe_tables(names)
+    # T7 falha no lote e na sonda individual -> tratada como vazia
+    assert {t for t, v in res.items() if v} == {"T1", "T4"}
+    assert sum("EXISTS(" in q for q in queries) == 3
+    queries.clear()
+    assert fb._probe_tables(names) == res  # cacheado
+    assert queries == []
+
+    # tabela vazia na 1ª sondagem volta a ser testada após o TTL / refresh
+    fb._rows_ttl = -1
+    fb._probe_tables(names)
+    assert sum("EXISTS(" in q for q in queries) == 3
+
+
+def test_probe_transient_errors_are_not_cached():
+    names = [f"T{i}" for i in range(6)]
+    flaky = {"T4"}
+    fb, queries = make_probe_client(
+        {"T1", "T4"}, flaky=flaky, PROBE_BATCH="3", PROBE_WORKERS="2"
+    )
+    # lote de T4 falhou por lock: sem resposta (nem "vazia") e fora do cache
+    assert fb._probe_tables(names) == {"T0": False, "T1": True, "T2": False}
+    flaky.clear()
+    queries.clear()
+    assert fb._probe_tables(names)["T4"] is True
+    assert len(queries) == 1
+
+
+def test_discovery_not_persisted_when_better_candidate_unanswered():
+    cols = {"TPRODUTO": ["CODIGO", "DESCRICAO", "BARRAS", "PRECO"]}
+    cols["TPRODUTO2"] = ["CODIGO", "DESCRICAO"]
+    saved = []
+    flaky = {"TPRODUTO"}
+    fb, _ = make_probe_client(
+        {"TPRODUTO", "TPRODUTO2"},
+        flaky=flaky,
+        methods={
+            "_load_persisted_signature": lambda self: None,
+            "_list_tables": lambda self: list(cols),
+            "_table_columns": lambda self, t: cols[t],
+            "_persist_signature": lambda self, sig: saved.append(sig),
+        },
+        PROBE_BATCH="1",
+        PROBE_WORKERS="1",
+    )
+    assert fb._discover_product_table()[0] == "TPRODUTO2"
+    assert saved == []  # TPRODUTO (melhor pontuada) ficou sem resposta
+
+    flaky.clear()
+    fb._product_table_signature = None
+    assert fb._discover_product_table()[0] == "TPRODUTO"
+    assert [t for t, _m in saved] == ["TPRODUTO"]
+
+
+def test_probe_tables_respects_deadline():
+    fb, queries = make_probe_client({"T1"}, PROBE_BATCH="1", PROBE_WORKERS="1")
+    assert fb._probe_tables(["T1", "T2"], deadline=0) == {}
+
+    # em paralelo: volta no prazo, sem esperar os lotes em execução; eles
+    # terminam em segundo plano, devolvem a conexão e alimentam o cache
+    fb, queries = make_probe_client({"T1"}, PROBE_BATCH="1", PROBE_WORKERS="2")
+    execute = fb._probe_batch_rows
+
+    def slow(tables):
+        time.sleep(0.2)
+        return execute(tables)
+
+    fb._probe_batch_rows = slow
+    t0 = time.monotonic()
+    res = fb._probe_tables(["T1", "T2", "T3", "T4"], deadline=t0 + 0.05)
+    assert res == {} and time.monotonic() - t0 < 0.15
+    time.sleep(0.3)
+    stats = fb.pool_stats()
+    assert stats["idle"] == stats["size"]
+    # 2 lotes estavam em execução; os outros foram cancelados
+    assert fb._cached_rows("T1") is True and fb._cached_rows("T2") is False
+    assert fb._cached_rows("T3") is None and fb._cached_rows("T4") is None
+
+
+def test_fetch_full_by_codes_chunks_in_lists():
+    calls = []
+    lock = threading.Lock()
+
+    def handler(sql, params):
+        with lock:
+            calls.append(list(params))
+        return [(c, f"Item {c}", None, 1.5, 2, None, None, None, None) for c in params]
+
+    fb = fake_client(
+        handler,
+        {
+            "_discover_product_table": lambda self: (
+                "T",
+                {"codigo": "COD", "descricao": "DESC"},
+            ),
+            "_table_columns": lambda self, table: ["COD", "DESC"],
+        },
+        IN_CHUNK_SIZE="3",
+        IN_WORKERS="2",
+    )
+    codes = [str(i) for i in range(7)] + ["0"]
+    res = fb.fetch_full_by_codes(codes)
+    assert sorted(res) == [str(i) for i in range(7)]
+    assert res["5"]["descricao"] == "Item 5"
+    assert sorted(len(c) for c in calls) == [1, 3, 3]
+
+
+def make_table_client(rows, **opts):
+    """Cliente sobre uma 'tabela' em memória que entende FIRST n / codigo > ?."""
+    queries = []
+
+    def handler(sql, params):
+        queries.append((sql, params))
+        first = int(re.search(r"FIRST (\d+)", sql).group(1))
+        data = sorted(rows)
+        if "> ?" in sql:
+            data = [r for r in data if r[0] > params[0]]
+        return data[:first]
+
+    methods = {
+        "_discover_product_table": lambda self: (
+            "T",
+            {"codigo": "COD", "descricao": "DESC"},
+        )
+    }
+    return fake_client(handler, methods, **opts), queries
+
+
+def test_iter_products_keyset_pagination():
+    rows = [(i, f"Produto {i}", None, None) for i in range(1, 11)]
+    fb, queries = make_table_client(rows)
+    batches = list(fb.iter_products(batch_size=4, fetch_size=3))
+    assert [len(b) for b in batches] == [4, 4, 2]
+    assert [p["codigo"] for b in batches for p in b] == list(range(1, 11))
+    assert queries[1][1] == (4,) and queries[2][1] == (8,)
+
+    assert len(fb.fetch_products_basic(limit=5)) == 5
+
+
+def test_search_products_loose_prefers_indexed_lookup():
+    from fb_catalog import ColumnInfo, IndexInfo, MetadataCatalog, TableInfo
+
+    cat = MetadataCatalog(
+        {
+            "T": TableInfo(
+                name="T",
+                columns=[ColumnInfo("COD", 37), ColumnInfo("DESC", 37)],
+                indices=[IndexInfo("PK_T", ["COD"], unique=True)],
+            )
+        }
+    )
+    queries = []
+    index_rows = [("ABC1", "Filtro", None, None)]
+
+    def handler(sql, params):
+        queries.append((sql, list(params)))
+        if "STARTING WITH" in sql:
+            return index_rows
+        return [("Z9", "Zeta", None, None)]
+
+    fb = fake_client(
+        handler,
+        {
+            "catalog": lambda self, refresh=False: cat,
+            "_discover_product_table": lambda self: (
+                "T",
+                {"codigo": "COD", "descricao": "DESC"},
+            ),
+            "_discover_product_candidates": lambda self, *a, **kw: [],
+        },
+    )
+
+    res = fb.search_products_loose(produto="abc")
+    assert [r["codigo"] for r in res] == ["ABC1"]
+    assert len(queries) == 1
+    sql, params = queries[0]
+    assert " UNION " in sql and "CONTAINING" not in sql
+    assert params == [50, "abc", "ABC"]
+
+    queries.clear()
+    index_rows = []
+    res = fb.search_products_loose(produto="zeta")
+    assert [r["codigo"] for r in res] == ["Z9"]
+    assert "CONTAINING" in queries[-1][0]
+
+
+def test_read_session_shares_one_transaction():
+    rows = [(i, f"Produto {i}", None, None) for i in range(1, 6)]
+    fb, queries = make_table_client(rows, POOL_SIZE="2")
+    with fb.read_session():
+        fb.fetch_products_basic(limit=2)
+        fb.fetch_products_basic(limit=3)
+    stats = fb.pool_stats()
+    assert stats["transactions"] == 1 and stats["created"] == 1
+    fb.fetch_products_basic(limit=2)
+    assert fb.pool_stats()["transactions"] == 2
+
+
+def test_vehicle_applications_discovered_and_streamed(tmp_path):
+    from fb_catalog import (
+        ColumnInfo,
+        ForeignKeyInfo,
+        IndexInfo,
+        MetadataCatalog,
+        TableInfo,
+    )
+
+    def table(name, cols, pk=None, fks=()):
+        return TableInfo(
+            name=name,
+            columns=[ColumnInfo(c, 37) for c in cols],
+            indices=(
+                [IndexInfo(f"PK_{name}", [pk], True, constraint="PRIMARY KEY")]
+                if pk
+                else []
+            ),
+            foreign_keys=list(fks),
+        )
+
+    cat = MetadataCatalog(
+        {
+            "TMARCAVEICULO": table(
+                "TMARCAVEICULO", ["CODMARCA", "DESCRICAO"], "CODMARCA"
+            ),
+            "TVEICULOMODELO": table(
+                "TVEICULOMODELO",
+                ["CONTROLE", "CODMARCA", "MODELO", "ANOINICIAL", "ANOFINAL", "MOTOR"],
+                "CONTROLE",
+                [ForeignKeyInfo("FK1", ["CODMARCA"], "TMARCAVEICULO", ["CODMARCA"])],
+            ),
+            "TPRODUTOAPLICACAO": table(
+                "TPRODUTOAPLICACAO",
+                ["CONTROLE", "CODPRODUTO", "CODMODELO"],
+                "CONTROLE",
+                [ForeignKeyInfo("FK2", ["CODMODELO"], "TVEICULOMODELO", ["CONTROLE"])],
+            ),
+        }
+    )
+    queries = []
+    rows = [(f"P{i} ", "FORD", "FIESTA", 2010, 2012, "1.6") for i in (1, 1, 1, 2, 3, 3)]
+
+    def handler(sql, params):
+        queries.append(sql)
+        if "CODIGO_PRODUTO" not in sql:
+            return [(1,)]
+        data = rows
+        if "> ?" in sql:
+            data = [r for r in data if r[0] > params[0]]
+        elif "= ?" in sql:
+            data = [r for r in data if r[0] == params[0]]
+        first = re.search(r"FIRST (\d+)", sql)
+        return data[: int(first.group(1))] if first else data
+
+    def client():
+        return fake_client(
+            handler,
+            {"catalog": lambda self, refresh=False: cat},
+            CATALOG_PATH=str(tmp_path / "m.json"),
+        )
+
+    # sem índice no código do produto: um cursor só, sem ORDER BY
+    fb = client()
+    batches = list(fb.iter_vehicle_applications(batch_size=2, fetch_size=1))
+    assert [[a["codigo_produto"] for a in b] for b in batches] == [
+        ["P1", "P1"],
+        ["P1", "P2"],
+        ["P3", "P3"],
+    ]
+    extract = [q for q in queries if "CODIGO_PRODUTO" in q]
+    assert len(extract) == 1 and "ORDER BY" not in extract[0]
+    sql = cat.annotations["applications"]["sql"]
+    assert extract[0] == sql
+    assert (
+        "FROM TPRODUTOAPLICACAO A JOIN TVEICULOMODELO V ON V.CONTROLE = A.CODMODELO"
+        in sql
+    )
+    assert "LEFT JOIN TMARCAVEICULO M ON M.CODMARCA = V.CODMARCA" in sql
+
+    # com índice: páginas por código, resolvidas pelo índice da tabela de ligação
+    cat.tables["TPRODUTOAPLICACAO"].indices.append(
+        IndexInfo("IDX_APLIC_PRODUTO", ["CODPRODUTO"])
+    )
+    queries.clear()
+    fb = client()  # assinatura salva no catálogo
+    batches = []
+    for batch in fb.iter_vehicle_applications(batch_size=2, fetch_size=1):
+        stats = fb.pool_stats()
+        assert stats["idle"] == stats["size"]  # conexão devolvida antes do lote
+        batches.append(batch)
+    # o último código de cada página vem inteiro, sem repetir na seguinte
+    assert [[a["codigo_produto"] for a in b] for b in batches] == [
+        ["P1", "P1", "P1"],
+        ["P2", "P3", "P3"],
+    ]
+    assert batches[0][0] == {
+        "codigo_produto": "P1",
+        "marca": "FORD",
+        "modelo": "FIESTA",
+        "ano_inicio": 2010,
+        "ano_fim": 2012,
+        "motor": "1.6",
+    }
+    assert any("WHERE A.CODPRODUTO > ? ORDER BY A.CODPRODUTO" in q for q in queries)
+    assert all(q.endswith("= ?") or "ORDER BY" in q for q in queries)
+
+
+def test_search_products_loose_raises_when_incomplete():
+    flaky = {"T"}
+
+    def handler(sql, params):
+        if flaky:
+            raise RuntimeError("Pool de conexões Firebird esgotado")
+        return []
+
+    fb = fake_client(
+        handler,
+        {
+            "_discover_product_table": lambda self: (
+                "T",
+                {"codigo": "COD", "descricao": "DESC"},
+            ),
+            "_discover_product_candidates": lambda self, *a, **kw: [],
+        },
+    )
+    # falha transitória sem nada achado: não vira "termo inexistente"
+    with pytest.raises(RuntimeError):
+        fb.search_products_loose(produto="abc")
+    flaky.clear()
+    assert fb.search_products_loose(produto="abc") == []
+
+
+def test_in_chunks_share_the_session_connection():
+    def handler(sql, params):
+        return [
+            (c, f"Item {c}", None, None, None, None, None, None, None) for c in params
+        ]
+
+    fb = fake_client(
+        handler,
+        {
+            "_discover_product_table": lambda self: (
+                "T",
+                {"codigo": "COD", "descricao": "DESC"},
+            ),
+            "_table_columns": lambda self, table: ["COD", "DESC"],
+        },
+        IN_CHUNK_SIZE="2",
+        IN_WORKERS="4",
+    )
+    with fb.read_session():
+        assert len(fb.fetch_full_by_codes([str(i) for i in range(7)])) == 7
+    # blocos em sequência na conexão da sessão: nenhuma conexão extra
+    assert fb.pool_stats()["created"] == 1
@@ -0,0 +1,94 @@
+from hot_catalog import HotCatalog
+from search_service import SearchService
+from sqlite_repo import SqliteRepo
+
+
+def make_repo(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    repo.upsert_products(
+        [
+            {"codigo": "F100", "descricao": "FILTRO DE ÓLEO MOTOR"},
+            {"codigo": "B60", "descricao": "Bateria 60Ah", "barras": "7891234567890"},
+            {"codigo": "F200", "descricao": "Filtro de ar"},
+        ]
+    )
+    return repo
+
+
+def codes(rows):
+    return sorted(r["codigo"] for r in rows)
+
+
+def test_same_answers_as_sqlite_cache(tmp_path):
+    repo = make_repo(tmp_path)
+    catalog = HotCatalog().load(repo)
+    assert len(catalog) == 3
+    for q in ["oleo", "filt", "filt ar", "b60", "456789", "f20", "motor xyz"]:
+        assert codes(catalog.search(q)) == codes(repo.search_products_cache(q)), q
+    assert catalog.search("filtro", limit=1) == [
+        {"codigo": "F100", "descricao": "FILTRO DE ÓLEO MOTOR"}
+    ]
+
+
+def test_upsert_replaces_record(tmp_path):
+    catalog = HotCatalog().load(make_repo(tmp_path))
+    assert catalog.upsert([{"codigo": "F200", "descricao": "Filtro de ar"}]) == 0
+    assert catalog.upsert([{"codigo": "F200", "descricao": "Filtro de cabine"}]) == 1
+    catalog.upsert([{"codigo": "X1", "descricao": "Correia dentada"}])
+    assert catalog.search("ar") == []
+    assert codes(catalog.search("cabi")) == ["F200"]
+    assert codes(catalog.search("corr")) == ["X1"]
+    assert len(catalog) == 4
+    report = catalog.memory_report()
+    assert report["items"] == 4
+    assert report["total"] == sum(
+        report[k] for k in ("records", "code_map", "tokens", "trigrams")
+    )
+
+
+class NoSqlRepo:
+    """Repo que falha se a busca de códigos for ao SQLite."""
+
+    def __init__(self, repo):
+        self.repo = repo
+
+    def search_codes(self, *a, **kw):
+        raise AssertionError("busca deveria sair do catálogo")
+
+    def __getattr__(self, name):
+        return getattr(self.repo, name)
+
+
+class PriceFB:
+    def fetch_stock_price_by_codes(self, codes):
+        return {c: {"estoque": 1.0, "preco": 2.0} for c in codes}
+
+    def fetch_full_by_codes(self, codes):
+        return {c: {"barras": None} for c in codes}
+
+
+def test_search_service_uses_catalog_for_product_only(tmp_path):
+    repo = make_repo(tmp_path)
+    catalog = HotCatalog().load(repo)
+    svc = SearchService(NoSqlRepo(repo), PriceFB(), catalog=catalog)
+    res = svc.search("bateria", "")
+    assert [i["codigo"] for i in res["items"]] == ["B60"]
+
+
+def test_exact_code_and_barcode_survive_limit(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    repo.upsert_products(
+        [{"codigo": f"X123{i}", "descricao": f"Peça {i}"} for i in range(10)]
+        + [
+            {"codigo": "X123", "descricao": "Peça exata"},
+            {"codigo": "Z9", "descricao": "Outra", "barras": "X123"},
+        ]
+    )
+    catalog = HotCatalog().load(repo)
+    assert codes(catalog.search("x123", limit=3)[:2]) == ["X123", "Z9"]
+    assert len(catalog.search("x123", limit=3)) == 3
+    svc = SearchService(repo, PriceFB(), catalog=catalog)
+    res = svc.search("X123", "", limit=2)
+    assert codes(res["items"]) == ["X123", "Z9"]
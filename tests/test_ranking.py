@@ -0,0 +1,45 @@
+from ranking import bm25_scores, top_k
+from search_service import SearchService
+from sqlite_repo import SqliteRepo
+
+
+def test_exact_code_then_prefix_then_bm25():
+    rows = [
+        {"codigo": "X9", "descricao": "Suporte do filtro de oleo e filtro de ar"},
+        {"codigo": "FILTRO", "descricao": "Peça genérica"},
+        {"codigo": "F1", "descricao": "Filtro de combustível"},
+        {"codigo": "Z1", "descricao": "Elemento filtro"},
+        {"codigo": "Z2", "descricao": "Elemento filtrante de cabine reforçado"},
+    ]
+    ranked = [r["codigo"] for r in top_k("filtro", rows, 10)]
+    assert ranked[:2] == ["FILTRO", "F1"]
+    # BM25: descrição curta e mais ocorrências pesam a favor
+    assert ranked[2:] == ["Z1", "X9", "Z2"]
+    assert [r["codigo"] for r in top_k("filtro", rows, 2)] == ["FILTRO", "F1"]
+
+
+def test_bm25_prefers_shorter_documents():
+    short, long = bm25_scores(["oleo"], [["oleo", "motor"], ["oleo"] + ["x"] * 8])
+    assert short > long > 0
+
+
+class CountingFB:
+    def __init__(self):
+        self.priced = []
+
+    def fetch_stock_price_by_codes(self, codes):
+        self.priced.extend(codes)
+        return {c: {"estoque": 1.0, "preco": 2.0} for c in codes}
+
+
+def test_limit_caps_enrichment(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    items = [{"codigo": f"P{i}", "descricao": f"Filtro modelo {i}"} for i in range(30)]
+    items.append({"codigo": "P99", "descricao": "Filtro"})
+    repo.upsert_products(items, snapshot=True)
+    fb = CountingFB()
+    res = SearchService(repo, fb).search("filtro", "", limit=5)
+    assert res["count"] == 5
+    assert res["items"][0]["codigo"] == "P99"
+    assert sorted(fb.priced) == sorted(i["codigo"] for i in res["items"])
@@ -0,0 +1,168 @@
+import configparser
+import time
+
+from result_cache import MissCache, ResultCache, build_miss_cache, build_result_cache
+from search_service import SearchService
+from sqlite_repo import SqliteRepo
+from sync import SyncService
+
+
+def test_key_normalizes_and_lru_evicts():
+    cache = ResultCache(max_entries=2)
+    k1 = cache.key("  Óleo  Filtro", "", "", 10)
+    assert k1 == cache.key("oleo filtro", "", "", 10)
+    cache.put(k1, ["A"], [{"codigo": "A"}])
+    cache.put(cache.key("b", "", "", 10), ["B"], [])
+    assert cache.get(k1)[0] == ["A"]  # k1 passa a ser o mais recente
+    cache.put(cache.key("c", "", "", 10), ["C"], [])
+    assert cache.get(cache.key("b", "", "", 10)) == (None, None)
+    assert cache.get(k1)[1] == [{"codigo": "A"}]
+    st = cache.snapshot()
+    assert st["evictions"] == 1 and st["hits"] == 2 and st["misses"] == 1
+    assert 0 < st["hit_ratio"] < 1
+
+
+def test_separate_ttls_and_memory_cap():
+    cache = ResultCache(items_ttl=0.0)
+    key = cache.key("x", "", "", 10)
+    cache.put(key, ["A"], [{"codigo": "A"}])
+    time.sleep(0.01)
+    assert cache.get(key) == (["A"], None)  # códigos valem, preços venceram
+    assert cache.snapshot()["code_hits"] == 1
+
+    small = ResultCache(max_bytes=2000)
+    for i in range(50):
+        small.put(small.key(str(i), "", "", 10), [f"C{i}"], [{"codigo": f"C{i}"}])
+    st = small.snapshot()
+    assert st["bytes"] <= 2000 and st["entries"] < 50 and st["evictions"] > 0
+
+
+class CountingFB:
+    def __init__(self):
+        self.calls = 0
+
+    def fetch_products_basic(self, limit=200):
+        return [{"codigo": "P1", "descricao": "Bateria 60Ah"}]
+
+    def fetch_stock_price_by_codes(self, codes):
+        self.calls += 1
+        return {c: {"estoque": 1.0, "preco": 2.0} for c in codes}
+
+
+def test_search_service_caches_until_sync(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    fb = CountingFB()
+    config = configparser.ConfigParser()
+    config["app"] = {"snapshot_limit": "10", "result_cache_itens": "8"}
+    service = SearchService(
+        repo, fb, ttls={"preco": -1}, results=build_result_cache(config)
+    )
+    sync = SyncService(config, fb, repo, on_sync=service.invalidate_cache)
+    sync.sync_products_cache()
+
+    first = service.search("bateria", "")
+    assert service.search(" BATERIA ", "") == first
+    assert fb.calls == 1
+    sync.sync_products_cache()
+    service.search("bateria", "")
+    assert fb.calls == 2
+    st = service.cache_stats()
+    assert st["hits"] == 1 and st["invalidations"] == 2
+
+
+def test_search_overlapping_sync_is_not_cached(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    repo.upsert_products([{"codigo": "P1", "descricao": "Bateria 60Ah"}], snapshot=True)
+    fb = CountingFB()
+    service = SearchService(repo, fb, ttls={"preco": -1}, results=ResultCache())
+    fetch = fb.fetch_stock_price_by_codes
+    # o sync termina enquanto a busca relê preços no Firebird
+    fb.fetch_stock_price_by_codes = lambda codes: service.invalidate_cache() or fetch(
+        codes
+    )
+    service.search("bateria", "")
+    assert fb.calls == 1 and service.cache_stats()["entries"] == 0
+    session = service.type_ahead()
+    session.search("bateria", "")
+    assert fb.calls == 2 and service.cache_stats()["entries"] == 0
+
+
+def test_result_cache_disabled_by_config():
+    config = configparser.ConfigParser()
+    config["app"] = {"result_cache_itens": "0"}
+    assert build_result_cache(config) is None
+
+
+def test_miss_cache_prefix_and_ttl():
+    misses = MissCache(ttl=60)
+    misses.add("xyz")
+    assert misses.known_miss("xyz") and misses.known_miss("xyzw")
+    assert misses.known_miss("xyz  12")
+    assert not misses.known_miss("xy") and not misses.known_miss("XYZW")
+    misses.ttl = -1
+    misses.add("abc")
+    assert not misses.known_miss("abcd")
+    misses.invalidate()
+    assert not misses.known_miss("xyzw")
+    assert misses.snapshot()["entries"] == 0
+
+
+class LooseFB(CountingFB):
+    def __init__(self):
+        super().__init__()
+        self.loose = []
+
+    def search_products_loose(self, produto="", limit=200):
+        self.loose.append(produto)
+        return []
+
+
+def test_fallback_misses_skip_firebird_until_sync(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    fb = LooseFB()
+    config = configparser.ConfigParser()
+    config["app"] = {"snapshot_limit": "10"}
+    service = SearchService(repo, fb, misses=build_miss_cache(config))
+    sync = SyncService(config, fb, repo, on_sync=service.invalidate_cache)
+
+    for q in ["zz9", "zz98", "zz987"]:
+        assert service.search(q, "")["items"] == []
+    assert fb.loose == ["zz9"]
+    assert service.cache_stats()["fallback_hits"] == 2
+
+    sync.sync_products_cache()
+    service.search("zz987", "")
+    assert fb.loose == ["zz9", "zz987"]
+
+
+def test_fallback_failures_and_overlapping_sync_not_remembered(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    fb = LooseFB()
+    config = configparser.ConfigParser()
+    config["app"] = {}
+    service = SearchService(repo, fb, misses=build_miss_cache(config))
+
+    # Firebird falhou: não é "sem resultado", a próxima busca tenta de novo
+    def loose_failing(produto="", limit=200):
+        fb.loose.append(produto)
+        raise RuntimeError("lock time-out")
+
+    fb.search_products_loose = loose_failing
+    service.search("zz9", "")
+    service.search("zz98", "")
+    assert fb.loose == ["zz9", "zz98"]
+    assert service.cache_stats()["fallback_entries"] == 0
+
+    # sync no meio da busca: o termo pode ter chegado nele, não guarda o miss
+    def loose_during_sync(produto="", limit=200):
+        fb.loose.append(produto)
+        service.invalidate_cache()
+        return []
+
+    fb.search_products_loose = loose_during_sync
+    service.search("yy1", "")
+    assert service.cache_stats()["fallback_entries"] == 0
@@ -1,5 +1,7 @@
 import asyncio
 import configparser
+import threading
+import time
 
 from search_service import SearchService
 from sqlite_repo import SqliteRepo
@@ -37,3 +39,370 @@ def test_search_and_sync(tmp_path):
     assert item["codigo"] == "P1"
     assert item["estoque"] == 10.0
     assert item["preco"] == 100.0
+
+
+def test_full_sync_streams_batches(tmp_path):
+    class StreamFB:
+        def iter_products(self, batch_size=1000):
+            for start in range(0, 5, batch_size):
+                yield [
+                    {"codigo": f"C{i}", "descricao": f"Peça {i}"}
+                    for i in range(start, min(start + batch_size, 5))
+                ]
+
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    config = configparser.ConfigParser()
+    config["app"] = {"snapshot_limit": "0", "sync_batch_size": "2"}
+    SyncService(config, StreamFB(), repo).sync_products_cache()
+    assert len(repo.get_products_by_codes([f"C{i}" for i in range(5)])) == 5
+
+
+class CountingFB:
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def fetch_products_basic(self, limit=200):
+        return [
+            {"codigo": "P1", "descricao": "Bateria 60Ah", "barras": "789", "preco": 9.0}
+        ]
+
+    def fetch_stock_price_by_codes(self, codes):
+        self.calls.append(("stock", sorted(codes)))
+        if self.fail:
+            raise RuntimeError("offline")
+        return {c: {"estoque": 3.0, "preco": 10.0} for c in codes}
+
+    def fetch_full_by_codes(self, codes):
+        self.calls.append(("full", sorted(codes)))
+        if self.fail:
+            raise RuntimeError("offline")
+        return {c: {"descricao": "Bateria 60Ah", "marca": "Moura"} for c in codes}
+
+
+def test_wide_cache_refreshes_only_stale_fields(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    fb = CountingFB()
+    config = configparser.ConfigParser()
+    config["app"] = {"snapshot_limit": "10"}
+    SyncService(config, fb, repo).sync_products_cache()
+
+    service = SearchService(repo, fb, ttls={"estoque": 3600})
+    res = service.search(produto="Bateria", veiculo="")
+    # cadastro e preço vieram do snapshot; só o estoque (nunca lido) é buscado
+    assert fb.calls == [("stock", ["P1"])]
+    assert res["items"][0]["estoque"] == 3.0 and res["items"][0]["preco"] == 10.0
+
+    fb.calls.clear()
+    service.search(produto="Bateria", veiculo="")
+    assert fb.calls == []  # tudo dentro do TTL: nenhuma ida ao Firebird
+
+    service.ttls.update({f: -1 for f in service.ttls})
+    fb.calls.clear()
+    res = service.search(produto="Bateria", veiculo="")
+    assert fb.calls == [("full", ["P1"])]
+    assert res["items"][0]["marca"] == "Moura"
+
+    fb.fail = True
+    res = service.search(produto="Bateria", veiculo="")
+    assert res["items"][0]["marca"] == "Moura"  # Firebird fora: serve o cache
+
+
+def test_cache_ttls_from_config():
+    from search_service import cache_ttls
+
+    config = configparser.ConfigParser()
+    config["app"] = {"ttl_cadastro": "60", "ttl_preco": "5"}
+    ttls = cache_ttls(config)
+    assert ttls["marca"] == 60 and ttls["preco"] == 5 and ttls["estoque"] == 120
+
+
+def test_sync_imports_erp_applications(tmp_path):
+    class AppsFB(DummyFB):
+        def iter_vehicle_applications(self, batch_size=1000):
+            yield [
+                {
+                    "codigo_produto": "P1",
+                    "marca": "Ford",
+                    "modelo": "Fiesta",
+                    "ano_inicio": 2010,
+                    "ano_fim": 2012,
+                    "motor": "1.6",
+                },
+            ]
+
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    config = configparser.ConfigParser()
+    config["app"] = {"snapshot_limit": "10"}
+    sync = SyncService(config, AppsFB(), repo)
+    sync.sync_products_cache()
+    assert [a["codigo_produto"] for a in repo.search_applications("Fiesta 2011")] == [
+        "P1"
+    ]
+    assert repo.get_meta("last_sync_aplicacoes") is not None
+    assert sync.sync_applications() is None  # dentro do intervalo
+    assert sync.sync_applications(force=True)["applications_new"] == 0
+
+
+def test_incremental_application_sync_keeps_indexes(tmp_path):
+    class AppsFB(DummyFB):
+        rows = []
+
+        def iter_vehicle_applications(self, batch_size=1000):
+            if self.rows:
+                yield self.rows
+
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    repo.bulk_import_applications(
+        [{"codigo": "P0", "marca": "VW", "modelo": "Gol", "ano_inicio": 2010}]
+    )
+    config = configparser.ConfigParser()
+    config["app"] = {}
+    sync = SyncService(config, AppsFB(), repo)
+    dropped = []
+    bulk = repo.bulk_import_applications
+    repo.bulk_import_applications = lambda rows, **kw: dropped.append(
+        kw.get("defer_indexes")
+    ) or bulk(rows, **kw)
+    assert sync.sync_applications(force=True) is None  # nada extraído
+    assert dropped == []
+    AppsFB.rows = [{"codigo_produto": "P1", "marca": "Ford", "modelo": "Ka"}]
+    assert sync.sync_applications(force=True)["applications_new"] == 1
+    assert dropped == [False]
+
+
+class FallbackFB(DummyFB):
+    """Fallback do Firebird controlado por eventos, para testar concorrência."""
+
+    def __init__(self, results):
+        self.results = results
+        self.barrier = threading.Barrier(2, timeout=2)
+        self.release = threading.Event()
+        self.priced = threading.Event()
+        self.mode = "barrier"
+
+    def search_products_loose(self, produto="", limit=200):
+        if self.mode == "barrier":
+            self.barrier.wait()  # só passa se os dois lados rodarem juntos
+        elif self.mode == "wait_price":
+            assert self.priced.wait(2)
+        elif produto in self.results and not self.results[produto]:
+            return []
+        else:
+            self.release.wait(2)
+        return [{"codigo": c, "descricao": f"Item {c}"} for c in self.results[produto]]
+
+    def fetch_stock_price_by_codes(self, codes):
+        self.priced.set()
+        return super().fetch_stock_price_by_codes(codes)
+
+
+def test_fallbacks_run_concurrently_and_async(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    fb = FallbackFB({"xyz": ["A1", "A2"], "abc": ["A2"]})
+    service = SearchService(repo, fb)
+    res = service.search("xyz", "abc")
+    assert [i["codigo"] for i in res["items"]] == ["A2"]
+
+    res = asyncio.run(service.search_async("xyz", "abc"))
+    assert [i["codigo"] for i in res["items"]] == ["A2"]
+
+
+def test_local_hits_enriched_while_fallback_runs(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    repo.upsert_products([{"codigo": "P1", "descricao": "Bateria 60Ah"}], snapshot=True)
+    fb = FallbackFB({"gol": []})
+    fb.mode = "wait_price"
+    res = SearchService(repo, fb).search("bateria", "gol")
+    # veículo sem resultado: vale o lado do produto, já enriquecido
+    assert res["items"][0]["estoque"] == 10.0
+
+
+def test_strict_mode_stops_at_first_empty_side(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    fb = FallbackFB({"xyz": [], "abc": ["A2"]})
+    fb.mode = "events"
+    service = SearchService(repo, fb)
+    t0 = time.monotonic()
+    assert service.search("xyz", "abc", strict=True)["items"] == []
+    assert time.monotonic() - t0 < 1  # não esperou o lado "abc"
+    fb.release.set()
+    res = service.search("xyz", "abc")
+    assert [i["codigo"] for i in res["items"]] == ["A2"]
+
+
+def test_fallback_side_failure_uses_other_side(tmp_path, capsys):
+    class FlakyFB(FallbackFB):
+        def search_products_loose(self, produto="", limit=200):
+            if produto == "abc":
+                raise RuntimeError("pool esgotado")
+            return super().search_products_loose(produto, limit)
+
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    fb = FlakyFB({"xyz": ["A1", "A2"]})
+    fb.mode = "events"
+    fb.release.set()
+    service = SearchService(repo, fb)
+    res = service.search("xyz", "abc", strict=True)
+    assert [i["codigo"] for i in res["items"]] == ["A1", "A2"]
+    assert "Fallback no Firebird falhou" in capsys.readouterr().out
+    service.close()
+
+
+def test_fallback_executor_bounded_by_pool(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    fb = FallbackFB({"xyz": ["A1", "A2"], "abc": ["A2"]})
+    fb.mode = "events"
+    fb.release.set()
+    service = SearchService(repo, fb)
+    for _ in range(5):
+        service.search("xyz", "abc", strict=True)
+        service.invalidate_cache()
+    # um executor só, reaproveitado entre as buscas
+    names = {t.name for t in threading.enumerate() if t.name.startswith("busca")}
+    assert 0 < len(names) <= 3
+    service.close()
+    assert service._fallback_executor is None
+
+    # até metade do pool; pool de 2: os lados vão em sequência na sessão
+    fb.pool_size = 4
+    service.search("xyz", "abc", strict=True)
+    assert service._fallback_executor._max_workers == 2
+    service.close()
+    fb.pool_size = 2
+    caller = threading.current_thread()
+    seen = []
+    fb.search_products_loose = lambda produto="", limit=200: seen.append(
+        threading.current_thread()
+    ) or [{"codigo": "A2", "descricao": "Item A2"}]
+    res = service.search("xyz", "abc")
+    assert [i["codigo"] for i in res["items"]] == ["A2"]
+    assert seen == [caller, caller]
+    assert service._fallback_executor is None
+
+
+def test_progressive_search_returns_cache_first(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    fb = CountingFB()
+    config = configparser.ConfigParser()
+    config["app"] = {"snapshot_limit": "10"}
+    SyncService(config, fb, repo).sync_products_cache()
+    service = SearchService(repo, fb)
+
+    gate = threading.Event()
+    slow_price = fb.fetch_stock_price_by_codes
+    fb.fetch_stock_price_by_codes = lambda codes: gate.wait(2) and slow_price(codes)
+    delivered = []
+    res = service.search("bateria", "", on_enriched=delivered.append)
+    # volta antes do Firebird, com o que o cache tem (preço do snapshot)
+    assert res["items"][0]["preco"] == 9.0 and res["items"][0]["estoque"] is None
+    assert not delivered
+    gate.set()
+    items = res["pending"].result(timeout=2)
+    assert items[0]["estoque"] == 3.0 and delivered == [items]
+
+    # tudo no prazo: nada pendente
+    res = service.search("bateria", "", on_enriched=delivered.append)
+    assert res["pending"] is None and res["items"][0]["estoque"] == 3.0
+    service.close()
+
+
+def test_search_served_from_cache_when_firebird_is_down(tmp_path, capsys):
+    from fakes import fake_client
+    from result_cache import ResultCache
+
+    attempts = []
+
+    def refuse(self):
+        attempts.append(1)
+        raise ConnectionRefusedError("firebird fora do ar")
+
+    fb = fake_client(lambda sql, params: [], {"_new_connection": refuse})
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    repo.upsert_products(
+        [{"codigo": "P1", "descricao": "Filtro de óleo", "preco": 9.0}], snapshot=True
+    )
+    service = SearchService(repo, fb, results=ResultCache())
+    res = service.search("filtro", "")
+    assert [i["codigo"] for i in res["items"]] == ["P1"]
+    assert res["items"][0]["preco"] == 9.0
+    assert "Firebird indisponível, usando dados do cache" in capsys.readouterr().out
+
+    # resposta já no cache de resultados: nem tenta conectar
+    attempts.clear()
+    assert service.search("filtro", "")["items"][0]["codigo"] == "P1"
+    assert attempts == []
+    service.close()
+
+
+def make_scanning_fb(empty=(), tables=8, delay=0.05):
+    """Firebird falso: a busca solta varre `tables` tabelas (termo em `empty`: rápido)."""
+    from fakes import fake_client
+
+    scans = []
+
+    def handler(sql, params):
+        term = next((p for p in params if isinstance(p, str)), "")
+        if term:
+            scans.append(term.strip("%").lower())
+            time.sleep(delay / 5 if scans[-1] in empty else delay)
+        return []
+
+    cands = [(f"T{i}", {"codigo": "COD", "descricao": "DESC"}) for i in range(tables)]
+    fb = fake_client(
+        handler,
+        {
+            "catalog": lambda self, refresh=False: None,
+            "_indexed_conditions": lambda self, *a: ([], []),
+            "_discover_product_table": lambda self: cands[0],
+            "_discover_product_candidates": lambda self, *a, **kw: cands,
+        },
+    )
+    return fb, scans
+
+
+def test_strict_empty_side_stops_running_side(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    fb, scans = make_scanning_fb(empty={"xyz"})
+    service = SearchService(repo, fb)
+    assert service.search("xyz", "abc", strict=True)["items"] == []
+    time.sleep(0.3)  # o lado "abc" para antes da próxima tabela
+    assert 0 < scans.count("abc") < 8
+    stats = fb.pool_stats()
+    assert stats["idle"] == stats["size"]
+    service.close()
+
+
+def test_cancelled_search_async_stops_fallbacks(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "test.db"))
+    repo.init_schema()
+    fb, scans = make_scanning_fb()
+    service = SearchService(repo, fb)
+
+    async def run():
+        task = asyncio.create_task(service.search_async("xyz", "abc"))
+        await asyncio.sleep(0.08)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    seen = len(scans)
+    time.sleep(0.3)
+    assert len(scans) <= seen + 2  # só as consultas que já estavam no servidor
+    assert len(scans) < 2 * 8
+    service.close()
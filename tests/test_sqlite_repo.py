@@ -0,0 +1,128 @@
+import sqlite3
+
+from sqlite_repo import SqliteRepo, fts_prefix_query
+
+
+def make_repo(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    repo.upsert_products(
+        [
+            {"codigo": "F100", "descricao": "FILTRO DE ÓLEO MOTOR"},
+            {"codigo": "B60", "descricao": "Bateria 60Ah"},
+            {"codigo": "F200", "descricao": "Filtro de ar"},
+        ]
+    )
+    return repo
+
+
+def codes(rows):
+    return sorted(r["codigo"] for r in rows)
+
+
+def test_fts_prefix_and_accent_folding(tmp_path):
+    repo = make_repo(tmp_path)
+    assert codes(repo.search_products_cache("oleo")) == ["F100"]
+    assert codes(repo.search_products_cache("filt")) == ["F100", "F200"]
+    assert codes(repo.search_products_cache("filt ar")) == ["F200"]
+    assert codes(repo.search_products_cache("b60")) == ["B60"]
+
+
+def test_fts_follows_upserts(tmp_path):
+    repo = make_repo(tmp_path)
+    repo.upsert_products([{"codigo": "B60", "descricao": "Bateria 70Ah"}])
+    assert repo.search_products_cache("60ah") == []
+    assert codes(repo.search_products_cache("70ah")) == ["B60"]
+
+
+def test_fts_built_for_existing_cache(tmp_path):
+    path = str(tmp_path / "cache.db")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE produtos_cache (codigo TEXT PRIMARY KEY, descricao TEXT)")
+    con.execute("INSERT INTO produtos_cache VALUES ('X1', 'Pastilha de freio')")
+    con.commit()
+    con.close()
+    repo = SqliteRepo(path)
+    repo.init_schema()
+    assert codes(repo.search_products_cache("pastil fre")) == ["X1"]
+
+
+def test_fts_prefix_query_quotes_tokens():
+    assert fts_prefix_query('filtro "ar') == '"filtro"* "ar"*'
+    assert fts_prefix_query("  -- ") is None
+
+
+def test_trigram_finds_code_and_barcode_fragments(tmp_path, capsys):
+    repo = make_repo(tmp_path)
+    repo.upsert_products(
+        [
+            {"codigo": "VW-0281234A", "descricao": "Sensor", "barras": "7891234567895"},
+            {"codigo": "X9", "descricao": "Outro", "barras": "7890000000001"},
+        ]
+    )
+    assert codes(repo.search_codes_substring("1234")) == ["VW-0281234A"]
+    assert codes(repo.search_codes_substring("vw-028")) == ["VW-0281234A"]
+    assert codes(repo.search_codes_substring("45678")) == ["VW-0281234A"]
+    assert codes(repo.search_codes_substring("X9")) == ["X9"]  # < 3: LIKE
+    assert codes(repo.search_products_cache("281234")) == ["VW-0281234A"]
+    # upsert sem barras não apaga o código de barras já conhecido
+    repo.upsert_products([{"codigo": "VW-0281234A", "descricao": "Sensor rotação"}])
+    assert codes(repo.search_codes_substring("4567")) == ["VW-0281234A"]
+    assert "WARN" not in capsys.readouterr().out  # sem cair no LIKE
+
+
+def test_barras_column_added_to_old_cache(tmp_path):
+    path = str(tmp_path / "cache.db")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE produtos_cache (codigo TEXT PRIMARY KEY, descricao TEXT)")
+    con.execute("INSERT INTO produtos_cache VALUES ('ABC123', 'Correia')")
+    con.commit()
+    con.close()
+    repo = SqliteRepo(path)
+    repo.init_schema()
+    assert codes(repo.search_codes_substring("C12")) == ["ABC123"]
+
+
+def test_connections_persist_per_thread_and_close(tmp_path):
+    import threading
+
+    import pytest
+
+    with SqliteRepo(str(tmp_path / "cache.db")) as repo:
+        repo.init_schema()
+        assert repo._conn() is repo._conn()
+        reader = repo._reader()
+        assert reader is not repo._conn()
+        assert reader.execute("PRAGMA query_only").fetchone()[0] == 1
+        assert repo._conn().execute("PRAGMA synchronous").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            reader.execute("DELETE FROM produtos_cache")
+
+        other = []
+        t = threading.Thread(target=lambda: other.append(repo._conn()))
+        t.start()
+        t.join()
+        assert other[0] is not repo._conn()
+        # a thread terminou: a conexão dela foi fechada e saiu da lista
+        assert other[0] not in repo._open
+        with pytest.raises(sqlite3.ProgrammingError):
+            other[0].execute("SELECT 1")
+        assert len(repo._open) == 2
+    with pytest.raises(sqlite3.ProgrammingError):
+        reader.execute("SELECT 1")
+
+
+def test_search_codes_unions_applications_and_intersects(tmp_path, capsys):
+    repo = make_repo(tmp_path)
+    repo.upsert_products([{"codigo": "F300", "descricao": "Filtro de óleo Fiesta"}])
+    vid = repo.upsert_vehicle("Ford", "Fiesta", 2010, 2014, "1.6")
+    repo.add_application("F100", vid)
+
+    assert repo.search_codes("", "fiesta 2012") == (["F100"], False, True)
+    assert sorted(repo.search_codes("", "fiesta")[0]) == ["F100", "F300"]
+    # aplicação (F100) ou descrição (F300), cruzado com "óleo"
+    assert sorted(repo.search_codes("oleo", "fiesta")[0]) == ["F100", "F300"]
+    assert repo.search_codes("ar", "fiesta") == ([], True, True)
+    # lado sem resultado: devolve o outro e avisa
+    assert repo.search_codes("bateria", "gol") == (["B60"], True, False)
+    assert "[WARN]" not in capsys.readouterr().out
@@ -0,0 +1,100 @@
+from search_service import SearchService
+from sqlite_repo import SqliteRepo
+
+
+class SpyRepo:
+    def __init__(self, repo):
+        self.repo = repo
+        self.searches = 0
+
+    def search_codes(self, *a, **kw):
+        self.searches += 1
+        return self.repo.search_codes(*a, **kw)
+
+    def __getattr__(self, name):
+        return getattr(self.repo, name)
+
+
+class PriceFB:
+    def __init__(self):
+        self.priced = []
+
+    def fetch_stock_price_by_codes(self, codes):
+        self.priced.extend(codes)
+        return {c: {"estoque": 1.0, "preco": 2.0} for c in codes}
+
+    def search_products_loose(self, produto="", limit=200):
+        return []
+
+
+def make_service(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    repo.upsert_products(
+        [
+            {"codigo": "F1", "descricao": "Filtro de óleo"},
+            {"codigo": "F2", "descricao": "Filtro de ar"},
+            {"codigo": "F3", "descricao": "Filtrante cabine"},
+            {"codigo": "B1", "descricao": "Bateria 60Ah"},
+        ],
+        snapshot=True,
+    )
+    spy = SpyRepo(repo)
+    fb = PriceFB()
+    return SearchService(spy, fb), spy, fb
+
+
+def codes(res):
+    return [i["codigo"] for i in res["items"]]
+
+
+def test_extensions_filter_previous_candidates(tmp_path):
+    service, spy, fb = make_service(tmp_path)
+    session = service.type_ahead()
+    assert sorted(codes(session.search("fil", ""))) == ["F1", "F2", "F3"]
+    assert spy.searches == 1 and sorted(fb.priced) == ["F1", "F2", "F3"]
+
+    got = [codes(session.search(q, "")) for q in ["filtr", "filtro", "filtro oleo"]]
+    # sem voltar ao índice nem reler preços dos códigos que sobraram
+    assert spy.searches == 1 and len(fb.priced) == 3
+    assert session.stats["refined"] == 3 and session.stats["items_reused"] == 6
+    assert got == [
+        codes(service.search(q, "")) for q in ["filtr", "filtro", "filtro oleo"]
+    ]
+    assert got[-1] == ["F1"]
+
+    session.search("filtro ole", "")  # apagou: volta ao índice
+    session.search("filtro ole", "gol")  # veículo mudou: idem
+    assert session.stats["full"] == 3
+
+
+def test_truncated_or_invalidated_sets_are_not_refined(tmp_path):
+    service, spy, _ = make_service(tmp_path)
+    service.repo.upsert_products(
+        [{"codigo": f"X{i}", "descricao": f"Filtro extra {i}"} for i in range(5)]
+    )
+    session = service.type_ahead()
+    session.search("filt", "", limit=1)  # 8 candidatos > 1 × 5: lista cortada
+    session.search("filtr", "", limit=1)
+    assert session.stats["refined"] == 0 and session.stats["full"] == 2
+
+    session.search("filtrante", "")
+    session.search("filtrante c", "")
+    assert session.stats["refined"] == 1
+    service.invalidate_cache()  # sync mudou o cache
+    session.search("filtrante ca", "")
+    assert session.stats["full"] == 4
+
+
+def test_progressive_session_reuses_enriched_items(tmp_path):
+    service, _, fb = make_service(tmp_path)
+    session = service.type_ahead()
+    got = []
+    res = session.search("fil", "", on_enriched=got.append)
+    assert {i["estoque"] for i in res["items"]} == {None}
+    res["pending"].result(timeout=2)
+    assert {i["estoque"] for i in got[0]} == {1.0}
+
+    res = session.search("filtro", "", on_enriched=got.append)
+    assert res["pending"] is None and {i["estoque"] for i in res["items"]} == {1.0}
+    service.close()
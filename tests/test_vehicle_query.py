@@ -0,0 +1,102 @@
+from sqlite_repo import SqliteRepo
+from vehicle_query import parse_vehicle_query
+
+
+def test_parse_classifies_terms():
+    q = parse_vehicle_query("Fiesta 2011 1,6 Flex")
+    assert q.years == [2011]
+    assert q.displacements == ["1.6"]
+    assert q.tokens == ["Fiesta", "Flex"]
+    assert parse_vehicle_query("  ").empty
+
+
+def make_repo(tmp_path):
+    repo = SqliteRepo(str(tmp_path / "cache.db"))
+    repo.init_schema()
+    fiesta = repo.upsert_vehicle("Ford", "Fiesta", 2010, 2012, "1.6 Flex")
+    ka = repo.upsert_vehicle("Ford", "Ka", 2015, 0, "1.0")
+    p2008 = repo.upsert_vehicle("Peugeot", "2008", 2016, 2020, "1.6")
+    gol = repo.upsert_vehicle("Volkswagen", "Gol", 1995, 2005, "1.0")
+    repo.add_application("P1", fiesta)
+    repo.add_application("P2", ka)
+    repo.add_application("P3", p2008)
+    repo.add_application("P4", gol)
+    return repo
+
+
+def apps(repo, q):
+    return sorted(r["codigo_produto"] for r in repo.search_applications(q))
+
+
+def test_year_range_and_tokens(tmp_path):
+    repo = make_repo(tmp_path)
+    assert apps(repo, "Fiesta 2011") == ["P1"]
+    assert apps(repo, "Fiesta 2013") == []
+    assert apps(repo, "fie") == ["P1"]
+    assert apps(repo, "ford 2024") == ["P2"]  # ano_fim 0 = sem fim
+    assert apps(repo, "1.6") == ["P1", "P3"]
+    assert apps(repo, "1.0 2000") == ["P4"]
+    assert apps(repo, "2008") == ["P3"]  # modelo com nome de ano
+    assert [v["modelo"] for v in repo.suggest_vehicles("ford 2011")] == ["Fiesta"]
+
+
+def test_vehicle_fts_follows_updates(tmp_path):
+    repo = make_repo(tmp_path)
+    with repo._conn() as con:
+        con.execute("UPDATE veiculos SET modelo='New Fiesta' WHERE modelo='Fiesta'")
+    assert apps(repo, "new fiesta 2011") == ["P1"]
+
+
+def test_bulk_import_dedupes_and_keeps_indexes(tmp_path):
+    repo = make_repo(tmp_path)
+    rows = [
+        {
+            "codigo": "P9",
+            "marca": "Ford",
+            "modelo": "Fiesta",
+            "ano_inicio": "2010",
+            "ano_fim": "2012",
+            "motor": "1.6 Flex",
+        },  # veículo já existente
+        {
+            "codigo": "P9",
+            "marca": "Fiat",
+            "modelo": "Uno",
+            "ano_inicio": "2004",
+            "ano_fim": "",
+            "motor": "1.0",
+        },
+        {
+            "codigo_produto": "P9",
+            "marca": "Fiat",
+            "modelo": "Uno",
+            "ano_inicio": 2004,
+            "ano_fim": 0,
+            "motor": "1.0",
+        },  # par repetido
+        {"codigo": "", "marca": "Fiat", "modelo": "Uno"},  # inválida
+    ]
+    seen = []
+    st = repo.bulk_import_applications(rows, batch_size=2, progress=seen.append)
+    assert st["rows"] == 4 and st["skipped"] == 1
+    assert st["vehicles_new"] == 1 and st["applications_new"] == 2
+    assert len(seen) == 2 and st["rows_per_s"] > 0
+    assert apps(repo, "uno 2010") == ["P9"]
+    assert apps(repo, "fiesta 2011") == ["P1", "P9"]
+    with repo._reader() as con:
+        names = {r[0] for r in con.execute("SELECT name FROM sqlite_master")}
+    assert {"idx_apl_veic", "idx_veic_anos", "ux_apl_produto_veiculo"} <= names
+
+
+def test_duplicate_applications_removed_on_migration(tmp_path):
+    repo = make_repo(tmp_path)
+    with repo._conn() as con:
+        con.execute("DROP INDEX ux_apl_produto_veiculo")
+        con.execute(
+            "INSERT INTO aplicacoes(codigo_produto, veiculo_id) VALUES('P1', 1)"
+        )
+    repo.init_schema()
+    repo.add_application("P1", 1)
+    with repo._reader() as con:
+        n = con.execute("SELECT COUNT(*) FROM aplicacoes WHERE codigo_produto='P1'")
+        assert n.fetchone()[0] == 1
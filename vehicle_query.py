@@ -0,0 +1,100 @@
+# vehicle_query.py
+"""
+Interpretação da busca por veículo ("Fiesta 2011 1.6") em filtros indexáveis:
+
+- ano (1900-2099): faixa inteira `ano_inicio <= ano AND ano_fim >= ano`, com
+  0 significando faixa aberta naquele lado;
+- cilindrada ("1.6", "2,0"): termo exato na coluna motor do índice FTS;
+- demais termos (marca, modelo, motor): prefixo no índice FTS de veículos.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+_RE_YEAR = re.compile(r"^(19|20)\d{2}$")
+_RE_DISPLACEMENT = re.compile(r"^(\d)[.,](\d)$")
+_RE_TOKEN = re.compile(r"[\w.]+", re.UNICODE)
+
+
+@dataclass
+class VehicleQuery:
+    years: List[int] = field(default_factory=list)
+    displacements: List[str] = field(default_factory=list)
+    tokens: List[str] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.years or self.displacements or self.tokens)
+
+
+def parse_vehicle_query(q: str) -> VehicleQuery:
+    """Classifica cada termo digitado como ano, cilindrada ou token de texto."""
+    out = VehicleQuery()
+    for raw in q.split():
+        term = raw.strip().strip(",;")
+        if not term:
+            continue
+        if _RE_YEAR.match(term):
+            out.years.append(int(term))
+            continue
+        m = _RE_DISPLACEMENT.match(term)
+        if m:
+            out.displacements.append(f"{m.group(1)}.{m.group(2)}")
+            continue
+        out.tokens.extend(t.strip(".") for t in _RE_TOKEN.findall(term) if t.strip("."))
+    return out
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def fts_match(query: VehicleQuery) -> Optional[str]:
+    """Expressão MATCH para veiculos_fts (None se só houver anos)."""
+    parts = [f"motor : {_quote(d)}" for d in query.displacements]
+    parts.extend(_quote(t) + "*" for t in query.tokens)
+    return " AND ".join(parts) if parts else None
+
+
+def vehicle_where(
+    query: VehicleQuery, alias: str = "v", use_fts: bool = True
+) -> Tuple[str, List[Any]]:
+    """
+    Condição SQL (sobre `veiculos AS alias`) equivalente à busca. Um termo com
+    cara de ano também aceita modelo com esse nome (ex.: Peugeot 2008).
+    """
+    sql: List[str] = []
+    params: List[Any] = []
+    in_fts = (
+        f"{alias}.id IN (SELECT rowid FROM veiculos_fts WHERE veiculos_fts MATCH ?)"
+    )
+    match = fts_match(query)
+    if match and use_fts:
+        sql.append(in_fts)
+        params.append(match)
+    elif match:
+        for d in query.displacements:
+            sql.append(f"IFNULL({alias}.motor, '') LIKE ?")
+            params.append(f"%{d}%")
+        for t in query.tokens:
+            sql.append(
+                f"({alias}.marca LIKE ? OR {alias}.modelo LIKE ? "
+                f"OR IFNULL({alias}.motor, '') LIKE ?)"
+            )
+            params.extend([f"%{t}%"] * 3)
+    for y in query.years:
+        # faixa inteira; ano_fim 0/NULL = ainda em produção
+        cond = (
+            f"({alias}.ano_inicio <= ? "
+            f"AND ({alias}.ano_fim >= ? OR IFNULL({alias}.ano_fim, 0) = 0))"
+        )
+        params.extend([y, y])
+        if use_fts:
+            cond = f"({cond} OR {in_fts})"
+            params.append(f"modelo : {_quote(str(y))}")
+        else:
+            cond = f"({cond} OR {alias}.modelo LIKE ?)"
+            params.append(f"%{y}%")
+        sql.append(cond)
+    return " AND ".join(sql), params